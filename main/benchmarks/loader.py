@@ -0,0 +1,74 @@
+"""Benchmark of serial versus parallel loading of parsed barcode files.
+
+Writes synthetic per-read files to a temporary directory and reports the wall time of reading them one after another,
+with a thread pool and with a process pool, for a growing number of files.
+
+Usage:
+    cd main
+    python -m benchmarks.loader --files 5 20 80 --rows 200000 --workers 4
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from model.cache import FrameCache
+from model.store import read_frame
+
+
+def write_files(directory, n_files, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    species = np.array(['species {}'.format(i) for i in range(500)], dtype=object)
+    paths = []
+
+    for i in range(n_files):
+        df = pd.DataFrame({'barcode': 'barcode{:02d}'.format(i + 1),
+                           'species': rng.choice(species, n_rows),
+                           'read_length': rng.integers(100, 2000, n_rows)})
+        path = Path(directory, 'barcode{:02d}.csv'.format(i + 1))
+        df.to_csv(path, index=False)
+        paths.append(path)
+
+    return paths
+
+
+def time_load(paths, workers, executor):
+    # a fresh cache per run, so every run parses all files
+    cache = FrameCache(read_frame)
+    start = time.perf_counter()
+    frames = cache.get_many(paths, copy=False, workers=workers, executor=executor)
+    pd.concat(frames)
+
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare serial and parallel loading of parsed files.")
+    parser.add_argument('--files', nargs='+', type=int, default=[5, 20, 80], help='Numbers of files to load.')
+    parser.add_argument('--rows', type=int, default=200000, help='Rows per file.')
+    parser.add_argument('--workers', type=int, default=4, help='Size of the pools.')
+
+    args = parser.parse_args()
+
+    print('{:>6} {:>10} {:>10} {:>10} {:>8} {:>8}'.format('files', 'serial', 'thread', 'process',
+                                                          'x thread', 'x proc'))
+    with tempfile.TemporaryDirectory() as directory:
+        for n_files in args.files:
+            paths = write_files(directory, n_files, args.rows)
+
+            serial = time_load(paths, 1, 'thread')
+            thread = time_load(paths, args.workers, 'thread')
+            process = time_load(paths, args.workers, 'process')
+
+            print('{:>6} {:>9.2f}s {:>9.2f}s {:>9.2f}s {:>8.2f} {:>8.2f}'.format(
+                n_files, serial, thread, process, serial / thread, serial / process))
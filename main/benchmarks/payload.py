@@ -0,0 +1,69 @@
+"""Benchmark of the size of the Bokeh documents of the dashboard pages.
+
+Builds every page, renders its pane into a Bokeh document and reports the size of the document JSON, the number of
+ColumnDataSources and the part of the JSON that is taken by their data. The sizes can be saved and compared with a
+later run, e.g. before and after a change of the pages.
+
+Usage:
+    cd main
+    python -m benchmarks.payload --save before.json
+    python -m benchmarks.payload --compare before.json
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+import json
+from pathlib import Path
+
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+
+import dashboard.pages
+
+PAGES = ['SpO2Page', 'SpotsPage', 'MicrobiomePage', 'SpeciesPage', 'AlphaDiversityPage', 'BetaDiversityPage']
+
+
+def measure(page) -> dict:
+    """Returns the size of the document JSON of a page and of the data of its ColumnDataSources."""
+    pane, _ = page.get_contents()
+    doc = Document()
+    doc.add_root(pane.get_root(doc))
+
+    sources = [model for model in doc.select({'type': ColumnDataSource})]
+    data = sum(len(json.dumps(source.to_json(include_defaults=False).get('data', {}), default=str))
+               for source in sources)
+
+    return {'bytes': len(doc.to_json_string()), 'sources': len(sources), 'data': data}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Report the size of the Bokeh documents of the pages.")
+    parser.add_argument('--pages', nargs='+', default=PAGES, help='Page classes of dashboard.pages.')
+    parser.add_argument('--save', help='Write the sizes to a .json file.')
+    parser.add_argument('--compare', help='Compare the sizes with a .json file of an earlier run.')
+
+    args = parser.parse_args()
+
+    before = json.loads(Path(args.compare).read_text()) if args.compare else {}
+    sizes = {}
+
+    print('{:<20} {:>12} {:>8} {:>12} {:>12} {:>8}'.format('page', 'bytes', 'sources', 'data', 'before', 'ratio'))
+    for name in args.pages:
+        if not hasattr(dashboard.pages, name):
+            print('{:<20} {:>12}'.format(name, 'missing'))
+            continue
+
+        sizes[name] = size = measure(getattr(dashboard.pages, name)())
+        previous = before.get(name, {}).get('bytes')
+        print('{:<20} {:>12,} {:>8} {:>12,} {:>12} {:>8}'.format(
+            name, size['bytes'], size['sources'], size['data'],
+            '{:,}'.format(previous) if previous else '-',
+            '{:.2f}'.format(size['bytes'] / previous) if previous else '-'))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(sizes, indent=2))
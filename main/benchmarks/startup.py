@@ -0,0 +1,94 @@
+"""Report of the timing spans of the startup of the dashboard and the build of its pages.
+
+Imports main.py, creates a dashboard and builds every page with SIGMA_TIMING set, then prints the tree of the spans
+with the total and own time of every path, slowest first, see model.timing. The spans can be written as a Chrome
+trace, and the totals can be saved and compared with a later run to catch regressions. The spans of a served
+dashboard are reported with --input, e.g. after:
+
+    SIGMA_TIMING=1 SIGMA_TIMING_FILE=spans-{pid}.json python main.py
+
+Usage:
+    cd main
+    python -m benchmarks.startup --trace startup.trace.json --save before.json
+    python -m benchmarks.startup --compare before.json --fail-above 1.5
+    python -m benchmarks.startup --input spans-*.json
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+SEPARATOR = ' / '
+
+
+def run_startup(keys=None) -> list:
+    """Returns the spans of importing main.py, creating a dashboard and building its pages."""
+    start = time.perf_counter_ns()
+    main = importlib.import_module('main')
+    end = time.perf_counter_ns()
+
+    from model import timing
+    timing.record('import main', start, end)
+
+    with timing.span('create dashboard'):
+        dashboard = main.create_dashboard()
+    with timing.span('build pages'):
+        for key in keys or main.pages:
+            dashboard.get_pane(key)
+
+    return timing.get_spans()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print the timing tree of the startup and the pages.")
+    parser.add_argument('--pages', nargs='+', help='Keys of the pages of main.py to build, defaults to all pages.')
+    parser.add_argument('--input', nargs='+', help='Report the span files of SIGMA_TIMING_FILE instead of a run.')
+    parser.add_argument('--trace', help='Write the spans as a Chrome trace .json file.')
+    parser.add_argument('--save', help='Write the totals to a .json file.')
+    parser.add_argument('--compare', help='Compare the totals with a .json file of an earlier run.')
+    parser.add_argument('--fail-above', type=float, help='Exit with 1 when a top span is slower by this ratio.')
+    parser.add_argument('--min-ms', type=float, default=0.0, help='Leave out spans that took less time.')
+
+    args = parser.parse_args()
+
+    # the spans are only recorded when SIGMA_TIMING is set before the model is imported
+    os.environ['SIGMA_TIMING'] = '1'
+    os.environ.pop('SIGMA_TIMING_FILE', None)
+    # main.py is imported first, so the import of the model is part of the report
+    spans = None if args.input else run_startup(args.pages)
+    from model import timing
+    if args.input:
+        spans = [item for path in args.input for item in timing.load(path)]
+
+    before = {}
+    if args.compare:
+        before = {tuple(path.split(SEPARATOR)): node for path, node in
+                  json.loads(Path(args.compare).read_text()).items()}
+
+    print(timing.format_tree(spans, before, args.min_ms))
+
+    if args.trace:
+        Path(args.trace).write_text(json.dumps(timing.to_chrome_trace(spans)))
+    totals = timing.summarize(spans)
+    if args.save:
+        Path(args.save).write_text(json.dumps({SEPARATOR.join(path): node for path, node in totals.items()},
+                                              indent=2))
+
+    if args.fail_above and before:
+        # short spans are left out, their times are mostly noise
+        slower = [path for path, node in totals.items() if len(path) == 1 and path in before
+                  and before[path]['total'] > max(args.min_ms, 0)
+                  and node['total'] / before[path]['total'] > args.fail_above]
+        for path in slower:
+            print('{} is {:.2f}x slower'.format(path[0], totals[path]['total'] / before[path]['total']))
+        sys.exit(1 if slower else 0)
@@ -12,6 +12,8 @@ __version__ = '0.1'
 
 import panel as pn
 
+from model.timing import span, timed
+
 pn.extension('plotly', loading_spinner='dots', sizing_mode='stretch_width')
 
 
@@ -20,11 +22,13 @@ class Dashboard:
 
     Keyword arguments:
         title -- the title of the dashboard.
-        panes -- a dictionary of panel panes and identifiers.
+        panes -- a dictionary of identifiers and panel panes or factories, e.g. Page classes. A factory returns a
+                 page or a pane and is called on the first visit of its pane, the pane is kept afterwards.
         btns -- a dictionary of panel buttons and identifiers.
         home_pane -- the key of the pane that is shown by default.
     """
 
+    @timed()
     def __init__(self, title: str, panes: dict, modal: dict, btns: dict, home_pane: str) -> None:
         if home_pane not in panes:
             raise ValueError('Home pane must be in panes.')
@@ -41,9 +45,11 @@ class Dashboard:
         self.panes = panes
         self.btns = btns
         self.modals = modal
+        # panes that are built, by key
+        self.built = {}
 
         # create a row and append it to the main panel of the template
-        self.row = pn.Row(self.panes[home_pane])
+        self.row = pn.Row(self.get_pane(home_pane))
         self.base.main.append(
             pn.Column(
                 self.row
@@ -60,36 +66,53 @@ class Dashboard:
         if len(self.modals) > 0:
             self.base.modal.extend([modal for modal in self.modals.values()])
 
+    def get_pane(self, key):
+        """Returns the pane of a key, a factory is called once and its pane is kept."""
+        if key not in self.built:
+            with span('build {}'.format(key)):
+                pane = self.panes[key]
+                if callable(pane) and not isinstance(pane, pn.viewable.Viewable):
+                    pane = pane()
+                if hasattr(pane, 'get_contents'):
+                    pane = pane.get_contents()[0]
+            self.built[key] = pane
+
+        return self.built[key]
+
     def get_callback(self, key):
-        """Callbacks that can alter the dashboard."""
+        """Returns the callback of the button of a key, which opens its modal or shows its pane."""
+
+        def show_pane():
+            try:
+                self.row[0] = self.get_pane(key)
+            finally:
+                self.row.loading = False
 
         def change_pane(event):
-            self.row[0] = self.panes[key]
+            if key in self.built:
+                self.row[0] = self.built[key]
+                return
+
+            # the spinner is sent to the browser before the page is built on the next tick
+            self.row.loading = True
+            doc = pn.state.curdoc
+            if doc is not None and doc.session_context is not None:
+                doc.add_next_tick_callback(show_pane)
+            else:
+                show_pane()
 
         def open_modal(event):
             self.base.open_modal()
 
-        collection = {
-            'welcome': change_pane,
-            'about': change_pane,
-            'introduction': change_pane,
-            'definition': change_pane,
-            'contribution': change_pane,
-            'hypothesis': change_pane,
-            'design': change_pane,
-            'conclusion': change_pane,
-            'paper': change_pane,
-            'biome': change_pane,
-            'spo2': change_pane,
-            'alpha_diversity': change_pane,
-            'acnes': change_pane,
-            'spots': change_pane,
-            'cc': open_modal
-        }
-
-        return collection[key]
+        # a key of a modal opens it, every other key shows its pane
+        return open_modal if key in self.modals else change_pane
+
+    def servable(self):
+        """Marks the template as the page of the current session of panel serve."""
+        return self.base.servable()
 
     def serve(self, port):
+        """Serves this dashboard in a single process for development, see main.py for production."""
         self.base.show(port=port)
 
 
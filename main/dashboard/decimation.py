@@ -0,0 +1,117 @@
+"""This module contains the sources of the plots of long time series, decimated to the visible range.
+
+DecimatedSource is a ColumnDataSource for such a series and link_ranges re-queries its sources after every zoom or
+pan, so the browser receives at most MAX_POINTS points of a series whatever the length of the recording, and more
+detail the further it zooms in. The decimation itself is model.decimation.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from bokeh.events import RangesUpdate, Reset
+from bokeh.models import ColumnDataSource
+
+from model.decimation import MAX_POINTS, decimate, to_numbers
+
+
+class DecimatedSource:
+    """A ColumnDataSource with at most n_out points of every series in the visible range.
+
+    One source can hold several series, the y columns, of several groups, e.g. the periods of a subject. The glyphs of
+    a group select its rows with a view, see dashboard.views, and every group can be decimated for its own visible
+    range.
+
+    Keyword arguments:
+        data -- a DataFrame or a dictionary of columns, the other columns are kept for the tooltips.
+        x -- the column with the x values.
+        y -- the column or the list of columns with the y values.
+        by -- the column with the groups, None for one group. Rows without a group are left out.
+        n_out -- the largest number of points of a series that is sent to the browser.
+    """
+
+    def __init__(self, data, x: str = 'x', y='y', by: Optional[str] = None, n_out: int = MAX_POINTS) -> None:
+        df = pd.DataFrame(data).sort_values(x, kind='mergesort').reset_index(drop=True)
+        self.columns = {column: df[column].to_numpy() for column in df.columns}
+        self.x = to_numbers(df[x])
+        self.ys = [df[column].to_numpy(dtype=np.float64) for column in ([y] if isinstance(y, str) else y)]
+        self.n_out = n_out
+
+        if by is None:
+            self.groups = {None: np.arange(len(df))}
+        else:
+            self.groups = {group: np.sort(rows) for group, rows in
+                           df.groupby(by, sort=False, observed=True).indices.items()}
+        self.selected = {group: self.decimate(group) for group in self.groups}
+
+        self.source = ColumnDataSource(data=self.data())
+
+    def __len__(self) -> int:
+        """Returns the number of points of the longest group."""
+        return max([len(rows) for rows in self.groups.values()], default=0)
+
+    def decimate(self, group=None, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Returns the rows of a group that are kept of at least one of the series between start and end."""
+        rows = self.groups[group]
+        x = self.x[rows]
+        kept = [decimate(x, y[rows], start, end, self.n_out) for y in self.ys]
+
+        return rows[np.unique(np.concatenate(kept))] if kept else rows[:0]
+
+    def data(self) -> dict:
+        """Returns the columns of the rows that are kept of all groups."""
+        rows = np.sort(np.concatenate(list(self.selected.values()))) if self.selected else np.arange(0)
+
+        return {column: values[rows] for column, values in self.columns.items()}
+
+    def select(self, start: Optional[float] = None, end: Optional[float] = None) -> dict:
+        """Returns the columns of the decimated points of all groups between start and end."""
+        rows = [self.decimate(group, start, end) for group in self.groups]
+        rows = np.sort(np.concatenate(rows)) if rows else np.arange(0)
+
+        return {column: values[rows] for column, values in self.columns.items()}
+
+    def update(self, start: Optional[float] = None, end: Optional[float] = None, groups: Optional[list] = None) -> None:
+        """Replaces the points of the groups by their decimated points between start and end.
+
+        Keyword arguments:
+            start -- the start of the visible range, None for the first point.
+            end -- the end of the visible range, None for the last point.
+            groups -- the groups to update, None updates all groups.
+        """
+        for group in self.groups if groups is None else groups:
+            self.selected[group] = self.decimate(group, start, end)
+        self.source.data = self.data()
+
+
+def link_ranges(fig, sources: Iterable[DecimatedSource], group=None) -> None:
+    """Re-queries the sources for the visible x range of a figure after every zoom, pan and reset.
+
+    The callbacks run on the server, so the figure has to be served, e.g. in a Panel pane.
+
+    Keyword arguments:
+        fig -- the figure.
+        sources -- the sources of the glyphs of the figure.
+        group -- the group of the sources that the figure shows, None for all groups.
+    """
+    sources = [source for source in sources if len(source) > source.n_out]
+    if not sources:
+        return
+    groups = None if group is None else [group]
+
+    def on_ranges(event):
+        for source in sources:
+            source.update(event.x0, event.x1, groups)
+
+    def on_reset(event):
+        for source in sources:
+            source.update(groups=groups)
+
+    fig.on_event(RangesUpdate, on_ranges)
+    fig.on_event(Reset, on_reset)
@@ -1,9 +1,9 @@
 from .about import AboutPage
 from .paper import PaperPage
 from .microbiome import MicrobiomePage
-from .spo2 import SpO2Page
-from .diversity import AlphaDiversityPage
-from .acnes import AcnesPage
+from .spo2 import SpO2Page, LiveSpO2Page
+from .diversity import AlphaDiversityPage, BetaDiversityPage
+from .species import SpeciesPage
 from .spots import SpotsPage
 from .introduction import IntroPage, HypothesisPage
 from .conclusion import ConclusionPage
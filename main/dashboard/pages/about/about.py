@@ -18,9 +18,11 @@ logo = Path(Path(__file__).parent, 'masks.jpg')
 
 class AboutPage(Page):
 
+    title = 'About'
+
     def __init__(self):
         self.pane = pn.Row(pn.pane.JPG(logo, width=300, height=300), pn.pane.markup.Markdown(about))
-        self.button = pn.widgets.Button(name='About')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
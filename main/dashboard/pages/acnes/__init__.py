@@ -1 +0,0 @@
-from .acnes import AcnesPage
\ No newline at end of file
@@ -16,9 +16,11 @@ file = file_path.read_text(encoding='utf8')
 
 class ContributionPage(Page):
 
+    title = 'Contribution'
+
     def __init__(self):
         self.pane = pn.pane.Markdown(file)
-        self.button = pn.widgets.Button(name='Contribution')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
@@ -1 +1,2 @@
 from .alpha import AlphaDiversityPage
+from .beta import BetaDiversityPage
@@ -7,34 +7,30 @@ __copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai L
 __license__ = 'Apache 2.0'
 __version__ = '0.1'
 
-from typing import Callable
-
 import panel as pn
 import numpy as np
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
-from skbio.diversity.alpha import simpson, shannon
-
-from model import get_column_barcodes_baseline, get_column_barcodes_intervention
+from model import get_count_index, get_barcodes, alpha_diversity, METRICS, METRIC_NAMES, get_loader_settings, \
+    rarefaction, rarefied_diversity, get_depths, bootstrap_delta, compare
 from model.abstract import Page
+from dashboard.state import shared
 
+# rarefaction settings, the seed makes the subsamples reproducible
+RAREFACTION_METRICS = ['observed', 'shannon']
+RAREFACTION_DRAWS = 20
+RAREFACTION_STEPS = 10
+RAREFACTION_SEED = 2021
 
-def get_statistic(statistic: str) -> Callable:
-    """Returns the function of the statistic.
+# bootstrap settings of the confidence intervals of the deltas
+BOOTSTRAP_DRAWS = 1000
+BOOTSTRAP_SEED = 2021
+BOOTSTRAP_CONFIDENCE = 0.95
 
-    Keyword arguments:
-        statistic -- the name of the statistical function to use.
-    """
-    if statistic not in ['simpson', 'shannon']:
-        raise ValueError('Expects one of the values: "simpson", "shannon"')
-
-    stats = {
-        'simpson': simpson,
-        'shannon': shannon
-    }
-
-    return stats[statistic]
+# number of rows of a species table that is sent to the browser at once
+PAGE_SIZE = 20
 
 
 def get_statistic_name(statistic: str) -> str:
@@ -44,15 +40,10 @@ def get_statistic_name(statistic: str) -> str:
         statistic -- the abbrevation of the statistical function.
     """
 
-    if statistic not in ['simpson', 'shannon']:
-        raise ValueError('Expects one of the values: "simpson", "shannon"')
-
-    names = {
-        'simpson': 'Simpsons Diversity Index',
-        'shannon': 'Shannon Diversity Index'
-    }
+    if statistic not in METRICS:
+        raise ValueError('Expects one of the values: {}'.format(', '.join(METRICS)))
 
-    return names[statistic]
+    return METRIC_NAMES[statistic]
 
 
 def get_simpson_description() -> pn.pane.Markdown:
@@ -83,6 +74,71 @@ def get_shannon_description() -> pn.pane.Markdown:
     return pane
 
 
+def get_metrics_description() -> pn.pane.Markdown:
+    """Returns a Markdown pane containing a description of the other diversity metrics."""
+
+    pane = pn.pane.Markdown("""
+    # Other Diversity Metrics
+    Select a metric to compare the baseline and experimental data:
+
+    - **Observed Richness**: the number of different species in a sample.
+    - **Chao1**: an estimate of the total number of species, based on the species that were seen once or twice.
+    - **Pielou Evenness**: how evenly the reads are divided over the species, between 0 and 1.
+    - **Good's Coverage**: the fraction of the reads that belongs to species that were seen more than once.
+
+    The table below the chart tests for every metric whether the experiment differs from the baseline, with a paired
+    t-test over the subjects. The p-values are corrected for the number of metrics with the Benjamini-Hochberg method.
+    """)
+
+    return pane
+
+
+def get_rarefaction_description(depth: int) -> pn.pane.Markdown:
+    """Returns a Markdown pane containing a description of the rarefaction."""
+
+    pane = pn.pane.Markdown("""
+    # Rarefaction
+    The baseline and experiment samples were not sequenced to the same depth. A sample with more reads shows more
+    species, which makes its diversity look higher.
+
+    The rarefaction curves show how the diversity grows with the number of reads, using {} random subsamples per depth.
+    A curve that flattens means that the sample was sequenced deep enough.
+
+    The tables show the Simpson and Shannon Diversity Index after subsampling every sample to the same depth of
+    {} reads, the lowest depth of all samples.
+    """.format(RAREFACTION_DRAWS, depth))
+
+    return pane
+
+
+def get_delta_chart(df: pd.DataFrame, title: str) -> go.Figure:
+    """Returns a grouped bar chart of the baseline, experiment and delta of every subject.
+
+    The delta bars get error bars when the DataFrame has the columns 'Delta lower' and 'Delta upper'. An interval
+    that does not contain the delta gets no error bar on the side of the delta.
+
+    Keyword arguments:
+        df -- a DataFrame from AlphaDiversity.get_stats_table.
+        title -- the title of the chart.
+    """
+    subjects = df.index.astype(str)
+
+    fig = go.Figure()
+    for column in df.columns[:2]:
+        fig.add_bar(x=subjects, y=df[column], name=column)
+
+    error_y = None
+    if 'Delta lower' in df.columns:
+        error_y = dict(type='data', symmetric=False, array=(df['Delta upper'] - df['Delta']).clip(lower=0),
+                       arrayminus=(df['Delta'] - df['Delta lower']).clip(lower=0))
+        title = '{}<br><sup>Error bars: {:.0%} basic bootstrap interval of the delta, {} replicates</sup>'.format(
+            title, BOOTSTRAP_CONFIDENCE, BOOTSTRAP_DRAWS)
+    fig.add_bar(x=subjects, y=df['Delta'], name='Delta', error_y=error_y)
+    fig.update_layout(title=title, barmode='group', xaxis_title='Subject')
+
+    return fig
+
+
 def get_references() -> pn.pane.Markdown:
     """Returns a Markdown pane containing the references for the Simpson and Shannon description."""
 
@@ -104,6 +160,7 @@ def get_table_description() -> pn.pane.Markdown:
     pane = pn.pane.Markdown("""
     ## Table
     This table describes show the amount of bacteria, ordered from most prevalent to least prevalent.
+    The number of species can be changed, the columns can be sorted by clicking on their header.
     
     The Simpson and Shannon diversity indices use these data.
     """)
@@ -115,17 +172,22 @@ class AlphaDiversity:
     """Calculates the Alpha Diversity using several metrics and can be integrated with Panel.
 
     Be aware that this class expects subjects with baseline data and experimental data.
-    It expects that both datasets contain a 'species' column.
+    The species counts are read from the count index of both periods.
 
-    n_subjects is the number of subjects that have a baseline and experimental dataset.
+    subjects are the numbers of the subjects that have a baseline and experimental dataset.
     """
 
-    def __init__(self, n_subjects) -> None:
-        # Number of subjects
-        self.n_subjects = n_subjects
+    def __init__(self, subjects: list) -> None:
+        self.n_subjects = len(subjects)
 
-        self.subjects = {k: [] for k in np.arange(1, self.n_subjects + 1, 1)}
-        self.simpson_index = {k: [] for k in np.arange(1, self.n_subjects + 1, 1)}
+        # number of classified reads of the baseline and experiment of every subject
+        self.subjects = {k: [] for k in subjects}
+        self.simpson_index = {k: [] for k in subjects}
+        # count indexes and DataFrames with one row per subject and one column per metric, baseline and experiment
+        self.indexes = []
+        self.diversity = []
+        # DataFrame with the bootstrap confidence interval of the delta of every subject and metric
+        self.intervals = None
 
         self.populate()
 
@@ -135,19 +197,96 @@ class AlphaDiversity:
         simpson_stat = self.get_stats_table('simpson')
         shannon_stat = self.get_stats_table('shannon')
 
-        simpson_bar = px.bar(simpson_stat.value, title='Simpson Diversity Index')
-        shannon_bar = px.bar(shannon_stat.value, title='Shannon Diversity Index')
+        simpson_bar = get_delta_chart(simpson_stat.value, title='Simpson Diversity Index')
+        shannon_bar = get_delta_chart(shannon_stat.value, title='Shannon Diversity Index')
 
         simpson_descr = get_simpson_description()
         shannon_descr = get_shannon_description()
         table_descr = get_table_description()
         references = get_references()
+        metrics = self.get_metric_explorer()
+        rarefaction_plot = self.get_rarefaction_plot()
 
         return pn.Column(simpson_descr, simpson_bar, simpson_stat,
                          shannon_descr, shannon_bar, shannon_stat,
+                         pn.layout.Divider(), metrics,
+                         pn.layout.Divider(), rarefaction_plot,
                          pn.layout.Divider(), table_descr, tables,
                          pn.layout.Divider(), references)
 
+    def get_metric_explorer(self) -> pn.Column:
+        """Returns a metric selector with the bar chart and table of the selected metric."""
+        select = pn.widgets.Select(name='Metric', options={METRIC_NAMES[m]: m for m in METRICS}, value='observed')
+
+        @pn.depends(select.param.value)
+        def view(statistic):
+            stat = self.get_stats_table(statistic)
+            bar = get_delta_chart(stat.value, title=get_statistic_name(statistic))
+
+            return pn.Column(bar, stat)
+
+        return pn.Column(get_metrics_description(), select, view, self.get_tests_table())
+
+    def get_tests(self) -> pd.DataFrame:
+        """Returns a paired t-test between the experiment and the baseline of every metric over all subjects."""
+        periods = {'baseline': self.diversity[0], 'experiment': self.diversity[1]}
+        df = pd.concat(periods, names=['period', 'subject']).reset_index()
+        df = df.melt(id_vars=['period', 'subject'], value_vars=METRICS, var_name='metric')
+
+        return compare(df, 'value', 'period', 'experiment', 'baseline', by=['metric'], pair='subject', test='paired')
+
+    def get_tests_table(self) -> pn.widgets.DataFrame:
+        tests = self.get_tests().set_index('metric').reindex(METRICS)
+        tests = tests.rename(index=METRIC_NAMES)[['mean_a', 'mean_b', 'statistic', 'p_value', 'p_adjusted', 'reject']]
+        tests = tests.rename(columns={'mean_a': 'experiment', 'mean_b': 'baseline', 'statistic': 't'})
+
+        return pn.widgets.DataFrame(tests.round(decimals=3))
+
+    def get_even_depth(self) -> int:
+        """Returns the lowest number of reads of all baseline and experiment samples."""
+        return int(min(min(data) for data in self.subjects.values()))
+
+    def get_rarefaction(self) -> tuple:
+        """Returns the Simpson and Shannon diversity at an even depth and the rarefaction curves.
+
+        They are computed once per process by the first session that asks for them, see dashboard.state.
+        """
+        return shared('alpha_rarefaction', self.compute_rarefaction)
+
+    def compute_rarefaction(self) -> tuple:
+        """Returns the Simpson and Shannon diversity at an even depth and the rarefaction curves."""
+        subjects = list(self.subjects.keys())
+        workers = get_loader_settings()['workers']
+        depth = self.get_even_depth()
+
+        rarefied = [rarefied_diversity(index.rows(subjects), depth, ['simpson', 'shannon'], RAREFACTION_DRAWS,
+                                       RAREFACTION_SEED, subjects, workers) for index in self.indexes]
+
+        max_depth = int(max(max(data) for data in self.subjects.values()))
+        curves = []
+        for period, index in zip(['baseline', 'experiment'], self.indexes):
+            labels = ['Subject {} {}'.format(subject, period) for subject in subjects]
+            curves.append(rarefaction(index.rows(subjects), get_depths(max_depth, RAREFACTION_STEPS),
+                                      RAREFACTION_METRICS, RAREFACTION_DRAWS, RAREFACTION_SEED, labels, workers))
+
+        return rarefied, pd.concat(curves)
+
+    def get_rarefaction_plot(self) -> pn.Column:
+        """Returns the rarefaction curves and the Simpson and Shannon tables at an even depth."""
+        depth = self.get_even_depth()
+        rarefied, curves = self.get_rarefaction()
+        simpson_stat = self.get_stats_table('simpson', rarefied)
+        shannon_stat = self.get_stats_table('shannon', rarefied)
+
+        plots = []
+        for metric in RAREFACTION_METRICS:
+            data = curves[curves['metric'] == metric].dropna()
+            plots.append(px.line(data, x='depth', y='mean', error_y='std', color='sample',
+                                 labels={'depth': 'Number of reads', 'mean': get_statistic_name(metric)},
+                                 title='Rarefaction curve of the {}'.format(get_statistic_name(metric))))
+
+        return pn.Column(get_rarefaction_description(depth), *plots, simpson_stat, shannon_stat)
+
     def get_bar_chart(self, df, title):
         data = df.copy(deep=True)
         data = data.reset_index()
@@ -157,57 +296,68 @@ class AlphaDiversity:
         return pn.pane.Plotly(fig)
 
     def populate(self) -> None:
-        """Populate all subjects with their corresponding baseline and experiment data."""
-        for subject in self.subjects.keys():
-            baseline = get_column_barcodes_baseline(subject, ['species'])
-            experiment = get_column_barcodes_intervention(subject, ['species'])
+        """Populate all subjects with the number of reads of their baseline and experiment data."""
+        baseline_index = get_count_index('baseline')
+        experiment_index = get_count_index('intervention')
+        self.indexes = [baseline_index, experiment_index]
+
+        subjects = list(self.subjects.keys())
+        totals = [np.asarray(index.rows(subjects).sum(axis=1)).ravel() for index in self.indexes]
+        for subject, baseline, experiment in zip(subjects, *totals):
+            self.subjects[subject].extend([int(baseline), int(experiment)])
 
-            self.subjects[subject].extend([baseline, experiment])
+        self.diversity = [alpha_diversity(index.rows(subjects), index=subjects)
+                          for index in [baseline_index, experiment_index]]
+        self.intervals = bootstrap_delta(baseline_index.rows(subjects), experiment_index.rows(subjects), METRICS,
+                                         BOOTSTRAP_DRAWS, BOOTSTRAP_SEED, BOOTSTRAP_CONFIDENCE, subjects,
+                                         get_loader_settings()['workers'])
 
-    def get_tables(self) -> pn.Tabs:
-        """Return the tables containing microbiome data in tabs per user."""
-        tables = []
-        for subj in np.arange(1, self.n_subjects + 1, 1):
-            tables.append((f'Subject {str(subj)}', self.get_df_table(subj)))
-        tabs = pn.Tabs(objects=tables)
+    def get_tables(self) -> pn.Column:
+        """Return the tables containing microbiome data in tabs per user, with a widget for the number of species."""
+        n = pn.widgets.IntInput(name='Number of species', value=20, start=1, step=10)
 
-        return tabs
+        @pn.depends(n.param.value)
+        def view(n):
+            tables = []
+            for subj in self.subjects.keys():
+                tables.append((f'Subject {str(subj)}', self.get_df_table(subj, n)))
 
-    def get_df_table(self, subject_number: int, n: int = 20) -> pn.widgets.DataFrame:
-        """Returns a DataFrame widget containing the microbiome datasets of a subject.
+            return pn.Tabs(objects=tables)
+
+        return pn.Column(n, view)
+
+    def get_df_table(self, subject_number: int, n: int = 20) -> pn.widgets.Tabulator:
+        """Returns a paginated table containing the n most prevalent species of a subject.
 
         Keyword arguments:
             subject_number -- the number of the subject
             n -- the amount of rows to show.
         """
-        if subject_number not in np.arange(1, self.n_subjects + 1, 1):
-            raise KeyError('Subject number must be between 1 and {}'.format(self.n_subjects))
-
-        rank = np.arange(1, n + 1, 1)
-        data = self.subjects[subject_number]
+        if subject_number not in self.subjects:
+            raise KeyError('Subject {} has no baseline and experiment data.'.format(subject_number))
 
-        counts_baseline = data[0]['species'].value_counts()[:n]
-        counts_experiment = data[1]['species'].value_counts()[:n]
+        counts_baseline, counts_experiment = [index.top(subject_number, n) for index in self.indexes]
 
-        if len(counts_experiment) != len(counts_baseline):
-            raise ValueError('Experiment and baseline counts should be of same length.')
+        # the periods can have fewer than n species, the missing ranks stay empty
+        df = pd.DataFrame(data={'baseline species': pd.Series(counts_baseline.index),
+                                'baseline counts': pd.Series(counts_baseline.values, dtype='Int64'),
+                                'experiment species': pd.Series(counts_experiment.index),
+                                'experiment counts': pd.Series(counts_experiment.values, dtype='Int64')})
+        df.index = pd.RangeIndex(1, len(df) + 1, name='rank')
 
-        df = pd.DataFrame(data={'rank': rank,
-                                'baseline species': counts_baseline.index,
-                                'baseline counts': counts_baseline.tolist(),
-                                'experiment species': counts_experiment.index,
-                                'experiment counts': counts_experiment.tolist()})
-        df = df.set_index('rank')
+        # only the visible page is sent to the browser
+        return pn.widgets.Tabulator(df, pagination='remote', page_size=PAGE_SIZE, disabled=True)
 
-        return pn.widgets.DataFrame(df)
-
-    def get_stats_table(self, statistic: str) -> pn.widgets.DataFrame:
+    def get_stats_table(self, statistic: str, diversity: list = None) -> pn.widgets.DataFrame:
         """Calculates the statistical function and returns a DataFrame widget.
 
+        The unrarefied data gets the bootstrap confidence interval of the delta.
+
         Keyword arguments:
             statistic: the name of the statistic
+            diversity: the baseline and experiment DataFrames to use, defaults to the unrarefied data
         """
-        data = self.calculate_statistic(statistic)
+        data = self.calculate_statistic(statistic, diversity)
         stat_name = get_statistic_name(statistic)
 
         subjects = []
@@ -226,24 +376,33 @@ class AlphaDiversity:
 
         df = df.set_index('Subject')
 
+        if diversity is None and self.intervals is not None:
+            intervals = self.intervals[self.intervals['metric'] == statistic].set_index('sample')
+            df['Delta lower'] = intervals['lower'].reindex(df.index).round(decimals=3)
+            df['Delta upper'] = intervals['upper'].reindex(df.index).round(decimals=3)
+
         return pn.widgets.DataFrame(df)
 
-    def calculate_statistic(self, statistic: str) -> dict:
+    def calculate_statistic(self, statistic: str, diversity: list = None) -> dict:
         """Calculates a statistical function and returns a dictionary with data.
 
         Keyword arguments:
             statistic -- the name of the statistic
+            diversity -- the baseline and experiment DataFrames to use, defaults to the unrarefied data
         """
 
-        data = {k: [] for k in np.arange(1, self.n_subjects + 1, 1)}
-        f = get_statistic(statistic)
+        if statistic not in METRICS:
+            raise ValueError('Expects one of the values: {}'.format(', '.join(METRICS)))
+
+        diversity = self.diversity if diversity is None else diversity
 
-        for subject, dfs in self.subjects.items():
-            species_baseline = dfs[0]['species'].value_counts()
-            species_experiment = dfs[1]['species'].value_counts()
+        data = {k: [] for k in self.subjects.keys()}
+        baseline = diversity[0][statistic]
+        experiment = diversity[1][statistic]
 
-            stat_baseline = np.round(f(species_baseline.tolist()), decimals=3)
-            stat_experiment = np.round(f(species_experiment.tolist()), decimals=3)
+        for subject in data.keys():
+            stat_baseline = np.round(baseline[subject], decimals=3)
+            stat_experiment = np.round(experiment[subject], decimals=3)
 
             data[subject].extend([stat_baseline, stat_experiment])
 
@@ -253,10 +412,16 @@ class AlphaDiversity:
 class AlphaDiversityPage(Page):
     """Creates the page for the Alpha Diversity."""
 
+    title = 'Alpha Diversity'
+    data = ['barcodes']
+    # the species tables are paginated on the server and the number of species is unbounded
+    prerender = False
+
     def __init__(self):
-        alpha_diversity = AlphaDiversity(n_subjects=5)
-        self.pane = alpha_diversity.get_plot()
-        self.button = pn.widgets.Button(name='Alpha Diversity')
+        # the diversity is computed once per process, every session builds its own plots of it
+        diversity = shared('alpha_diversity', AlphaDiversity, subjects=get_barcodes())
+        self.pane = diversity.get_plot()
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
@@ -0,0 +1,122 @@
+"""
+This module contains the page that shows the beta diversity.
+"""
+
+__author__ = ['Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import panel as pn
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from scipy.spatial.distance import squareform
+
+from model import get_barcodes, get_beta_diversity, condensed_index, BETA_METRICS, BETA_METRIC_NAMES
+from model.abstract import Page
+from dashboard.state import shared
+
+# above this number of samples the heatmap is sent as an image instead of separate cells
+MAX_HEATMAP_CELLS = 200
+
+
+def get_description() -> pn.pane.Markdown:
+    """Returns a Markdown pane containing a description of the beta diversity metrics."""
+
+    pane = pn.pane.Markdown("""
+    # Beta Diversity
+    The beta diversity is a measure of how different the microbiomes of two samples are.
+    A distance of 0 means that both samples are identical, a larger distance means that they are more different.
+
+    - **Bray-Curtis Dissimilarity**: compares the number of reads per species, between 0 and 1.
+    - **Jaccard Distance**: compares which species are present, between 0 and 1.
+    - **Aitchison Distance**: compares the relative abundances on a log scale, which is suited for compositional data.
+
+    The heatmap shows the distance between all baseline and experimental samples.
+    The bar chart shows, per subject, the distance between the baseline and the experiment.
+    """)
+
+    return pane
+
+
+def get_sample_labels(samples: pd.DataFrame) -> list:
+    return ['Subject {} {}'.format(barcode, period) for barcode, period in zip(samples['barcode'], samples['period'])]
+
+
+def get_paired_distances(samples: pd.DataFrame, condensed: np.ndarray) -> pd.DataFrame:
+    """Returns a DataFrame with the distance between the baseline and the experiment of every subject.
+
+    Keyword arguments:
+        samples -- the barcode and period of every sample.
+        condensed -- the condensed distance matrix between the samples.
+    """
+    positions = pd.Series(np.arange(len(samples)), index=pd.MultiIndex.from_frame(samples))
+    barcodes = samples.loc[samples['period'] == 'baseline', 'barcode'].tolist()
+
+    baseline = positions.loc[[(barcode, 'baseline') for barcode in barcodes]].to_numpy()
+    experiment = positions.loc[[(barcode, 'intervention') for barcode in barcodes]].to_numpy()
+    distances = np.asarray(condensed)[condensed_index(len(samples), baseline, experiment)]
+
+    df = pd.DataFrame(data={'Subject': barcodes, 'Distance': distances})
+
+    return df.set_index('Subject')
+
+
+class BetaDiversity:
+    """Calculates the Beta Diversity between the baseline and experimental samples and can be integrated with Panel.
+
+    barcodes are the numbers of the subjects that have a baseline and experimental dataset.
+    """
+
+    def __init__(self, barcodes: list) -> None:
+        self.barcodes = barcodes
+
+    def get_distances(self, metric: str) -> tuple:
+        """Returns the samples and the condensed distance matrix of a metric, computed once per process and metric."""
+        return shared('beta_distances_{}'.format(metric), get_beta_diversity, metric, self.barcodes)
+
+    def get_heatmap(self, metric: str) -> pn.pane.Plotly:
+        samples, condensed = self.get_distances(metric)
+        labels = get_sample_labels(samples)
+
+        fig = px.imshow(squareform(condensed), x=labels, y=labels, color_continuous_scale='viridis',
+                        binary_string=len(labels) > MAX_HEATMAP_CELLS,
+                        title='{} between all samples'.format(BETA_METRIC_NAMES[metric]))
+
+        return pn.pane.Plotly(fig, height=700)
+
+    def get_paired_plot(self, metric: str) -> pn.Column:
+        samples, condensed = self.get_distances(metric)
+        df = get_paired_distances(samples, condensed).round(decimals=3)
+
+        fig = px.bar(df, title='{} between baseline and experiment'.format(BETA_METRIC_NAMES[metric]))
+
+        return pn.Column(pn.pane.Plotly(fig), pn.widgets.DataFrame(df))
+
+    def get_plot(self) -> pn.Column:
+        """Returns a formatted Column containing a metric selector, the heatmap and the paired distances."""
+        select = pn.widgets.Select(name='Metric', options={BETA_METRIC_NAMES[m]: m for m in BETA_METRICS},
+                                   value='braycurtis')
+
+        @pn.depends(select.param.value)
+        def view(metric):
+            return pn.Column(self.get_heatmap(metric), pn.layout.Divider(), self.get_paired_plot(metric))
+
+        return pn.Column(get_description(), select, view)
+
+
+class BetaDiversityPage(Page):
+    """Creates the page for the Beta Diversity."""
+
+    title = 'Beta Diversity'
+    data = ['barcodes']
+
+    def __init__(self):
+        # the distances are computed once per process and metric, every session builds its own plots of them
+        diversity = shared('beta_diversity', BetaDiversity, barcodes=get_barcodes())
+        self.pane = diversity.get_plot()
+        self.button = pn.widgets.Button(name=self.title)
+
+    def get_contents(self):
+        return self.pane, self.button
@@ -18,9 +18,11 @@ hyp = hyp_path.read_text(encoding='utf8')
 
 class IntroPage(Page):
 
+    title = 'Introduction'
+
     def __init__(self):
         self.pane = pn.pane.Markdown(intro)
-        self.button = pn.widgets.Button(name='Introduction')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
@@ -28,9 +30,11 @@ class IntroPage(Page):
 
 class HypothesisPage(Page):
 
+    title = 'Hypothesis'
+
     def __init__(self):
         self.pane = pn.pane.Markdown(hyp)
-        self.button = pn.widgets.Button(name='Hypothesis')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
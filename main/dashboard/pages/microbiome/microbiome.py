@@ -18,42 +18,51 @@ from pathlib import Path
 import panel as pn
 import pandas as pd
 from bokeh.plotting import figure
-from model import get_dataset
+from model import get_count_index, get_barcodes
 from bokeh.models.widgets import Tabs, Panel
-from bokeh.models import Legend
+from bokeh.models import ColumnDataSource, Legend
 
 from model.abstract import Page
+from dashboard.state import shared
+from dashboard.views import group_view
 
 color_map_path = Path(Path(__file__).parent, 'color_map.json')
 swabbing_setup_path = Path(Path(__file__).parent, 'swabbing_setup.png')
 
 
-def get_species(choosetype="baseline", choosesubject=6):
+def get_subject_label(choosesubject):
+    """
+    to get the name of a subject.
+    choosesubject: int, the subject. None for all subjects.
+    """
+    if choosesubject is None:
+        return "Total"
+
+    return "Subject {}".format(choosesubject)
+
+
+def get_species(choosetype="baseline", choosesubject=None):
     """
     to get species data.
     if choosetype = str, intervention return intervention species; baseline return baseline species
-       choosesubject: int, for choosing subject you want. 6 for all subject.
+       choosesubject: int, for choosing subject you want. None for all subjects.
     """
 
-    get_data = get_dataset(choosetype)
-    barcode_list = ['barcode01', 'barcode02', 'barcode03', 'barcode04', 'barcode05']
-    if choosesubject == 6:
-        get_data = get_data[(get_data.barcode == 'barcode01') | (get_data.barcode == 'barcode02')
-                            | (get_data.barcode == 'barcode03') | (get_data.barcode == 'barcode04')
-                            | (get_data.barcode == 'barcode05')]
-    elif choosesubject < 6:
-        get_data = get_data[(get_data.barcode == barcode_list[choosesubject - 1])]
-    species_data = get_data.species.value_counts(normalize=True)
+    index = get_count_index(choosetype)
+    if choosesubject is None:
+        counts = index.counts()
+    else:
+        counts = index.counts(choosesubject)
+    species_data = counts / counts.sum()
     return species_data
 
 
-def choose_seq_df(get_top=5, choosesubject=1, choosetype="baseline",
-                  subject_list=['Subject 1', 'Subject 2', 'Subject 3', 'Subject 4', 'Subject 5', "Total"]):
+def choose_seq_df(get_top=5, choosesubject=1, choosetype="baseline"):
     """
     to get species sequence df.
     get_top : int, to choose how many species you want to show
     choosetype : str, intervention return intervention species , baseline return baseline species
-    choosesubject: int, for choosing subject you want. 6 for all subject.
+    choosesubject: int, for choosing subject you want. None for all subjects.
     return df
     """
     species_data = get_species(choosetype, choosesubject)
@@ -61,7 +70,7 @@ def choose_seq_df(get_top=5, choosesubject=1, choosetype="baseline",
     sizes = species_data.values[:get_top].round(decimals=2).tolist() + [
         (1 - sum(species_data.values[:get_top].round(decimals=2)))]
     sizes = [element * 100 for element in sizes]
-    data = {subject_list[choosesubject - 1] + " " + choosetype: sizes}
+    data = {get_subject_label(choosesubject) + " " + choosetype: sizes}
     df = pd.DataFrame(data)
     df.index = species
     return df
@@ -71,7 +80,7 @@ def compare_seq_df(get_top=5, choosesubject=1):
     """
     to get comparism species sequence df (baseline and intervention).
     get_top : int, to choose how many species you want to show
-    choosesubject: int, for choosing subject you want. 6 for all subject.
+    choosesubject: int, for choosing subject you want. None for all subjects.
     return df
     """
     frames = []
@@ -99,32 +108,45 @@ def load_color_map():
     return data
 
 
-def make_compare_bar_chart(get_top=5, choosesubject=1,
-                           subject_list=['Subject 1', 'Subject 2', 'Subject 3', 'Subject 4', 'Subject 5', "Total"]):
+def get_samples_source(frames):
+    """
+    to get one source of the samples of all subjects, so every value is sent to the browser once.
+    frames: dict, the subject and its df of compare_seq_df
+    return ColumnDataSource, a row per sample with the columns sample, subject and one column per species
+    """
+    samples = pd.concat([df.T.assign(subject=get_subject_label(subject)) for subject, df in frames.items()])
+    samples = samples.fillna(0)
+    samples.index.name = 'sample'
+    return ColumnDataSource(samples.reset_index())
+
+
+def make_compare_bar_chart(get_top=5, choosesubject=1, df=None, source=None):
     """
     to make a compare bar chart.
     get_top : int, to choose how many species you want to show
-    choosesubject: int, for choosing subject you want. 6 for all subject.
+    choosesubject: int, for choosing subject you want. None for all subjects.
+    df: the compare_seq_df of the subject, None to get it.
+    source: the source of get_samples_source that contains the subject, None for a source of this subject.
     return graph object. please put it into show
     """
     # load colors
     color_map = load_color_map()
 
-    df = compare_seq_df(get_top, choosesubject)
+    if df is None:
+        df = compare_seq_df(get_top, choosesubject)
+    if source is None:
+        source = get_samples_source({choosesubject: df})
     sample = df.columns.tolist()
     species = df.index.tolist()
-    data = {'sample': sample}
-
-    for i in range(len(species)):
-        data[species[i]] = df.iloc[i].tolist()
 
     colors = [color_map[bact] for bact in species]
 
     p = figure(x_range=sample, height=450, width=800,
-               title='{} microbiome species'.format(subject_list[choosesubject - 1]),
+               title='{} microbiome species'.format(get_subject_label(choosesubject)),
                y_axis_label="Relative abundance (% of total sequence reads)",
                toolbar_location=None, tools='hover', tooltips="$name :@$name %")
-    v = p.vbar_stack(species, x='sample', width=0.9, color=colors, source=data, )
+    view = group_view(source, 'subject', get_subject_label(choosesubject))
+    v = p.vbar_stack(species, x='sample', width=0.9, color=colors, source=source, view=view)
     legend = Legend(items=[(b.name, [b]) for b in v], location='center')
     p.add_layout(legend, 'right')
     p.y_range.start = 0
@@ -137,22 +159,20 @@ def make_compare_bar_chart(get_top=5, choosesubject=1,
 
 def get_plot():
     get_top = 10
-    plot_1 = make_compare_bar_chart(get_top, choosesubject=1)
-    plot_2 = make_compare_bar_chart(get_top, choosesubject=2)
-    plot_3 = make_compare_bar_chart(get_top, choosesubject=3)
-    plot_4 = make_compare_bar_chart(get_top, choosesubject=4)
-    plot_5 = make_compare_bar_chart(get_top, choosesubject=5)
-    plot_6 = make_compare_bar_chart(get_top, choosesubject=6)
 
     # tab_png = Panel(child=swabbing_png, title='Swabbing Setup')
-    tab_subj1 = Panel(child=plot_1, title="Subject 1")
-    tab_subj2 = Panel(child=plot_2, title="Subject 2")
-    tab_subj3 = Panel(child=plot_3, title="Subject 3")
-    tab_subj4 = Panel(child=plot_4, title="Subject 4")
-    tab_subj5 = Panel(child=plot_5, title="Subject 5")
-    tab_subj6 = Panel(child=plot_6, title="Total")
+    subjects = get_barcodes() + [None]
+    # the frames are computed once per process, every session builds its own source and plots of them
+    frames = shared('microbiome_frames', lambda: {subject: compare_seq_df(get_top, subject) for subject in subjects})
+    # the tabs share one source, every tab is a view of its subject
+    source = get_samples_source(frames)
+
+    tabs = []
+    for subject in subjects:
+        plot = make_compare_bar_chart(get_top, choosesubject=subject, df=frames[subject], source=source)
+        tabs.append(Panel(child=plot, title=get_subject_label(subject)))
 
-    tabs = Tabs(tabs=[tab_subj1, tab_subj2, tab_subj3, tab_subj4, tab_subj5, tab_subj6])
+    tabs = Tabs(tabs=tabs)
 
     description = get_description()
     heading = get_heading()
@@ -201,9 +221,12 @@ def get_description():
 
 class MicrobiomePage(Page):
 
+    title = 'Microbiome'
+    data = ['barcodes']
+
     def __init__(self):
         self.pane = get_plot()
-        self.button = pn.widgets.Button(name='Microbiome')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
@@ -20,9 +20,11 @@ about = about_path.read_text(encoding='utf8')
 
 class PaperPage(Page):
 
+    title = 'Paper'
+
     def __init__(self):
         self.pane = pn.pane.Markdown(about)
-        self.button = pn.widgets.Button(name='Paper')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
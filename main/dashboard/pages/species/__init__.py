@@ -0,0 +1 @@
+from .species import SpeciesPage
@@ -0,0 +1,147 @@
+"""
+This module contains the page that compares the prevalence of a species between the baseline and the experiment.
+
+The species are searched in the species catalog of the count indexes. Switching species reads one column of each
+index, the files are not read again.
+
+Azadeh Pirzadeh:
+- Created all plots.
+
+Djakim Latumalea:
+- Formatting such as rearranging plots.
+"""
+
+__author__ = ['Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import numpy as np
+import panel as pn
+from bokeh.models import ColumnDataSource, HoverTool, NumeralTickFormatter
+from bokeh.plotting import figure
+from bokeh.transform import dodge
+
+from model import get_species_catalog, SpeciesCatalog
+from model.abstract import Page
+
+DEFAULT_SPECIES = 'Cutibacterium acnes'
+# largest number of species in the selector
+SEARCH_LIMIT = 100
+
+
+def get_description() -> pn.pane.Markdown:
+    pane = pn.pane.Markdown("""
+    #Species prevalence
+
+    Here we describe the change in the percentage of the reads of a species between the baseline and the experiment.
+    Search a species by a part of its name, the most prevalent species are listed first.
+    *Cutibacterium acnes* is one of the bacteria that can cause acne.
+    """)
+
+    return pane
+
+
+def get_data(catalog: SpeciesCatalog, species: str) -> dict:
+    """Returns the columns of the bar chart, the prevalence per subject without and with a surgical mask."""
+    df = catalog.prevalence(species).pivot(index='barcode', columns='period', values='prevalence')
+    df = df.reindex(columns=['baseline', 'intervention'])
+
+    return {'subject': ['subject{}'.format(barcode) for barcode in df.index],
+            'No Mask': df['baseline'].to_numpy(), 'surgical Mask': df['intervention'].to_numpy()}
+
+
+def get_summary(data: dict, species: str) -> str:
+    """Returns the change in the prevalence of the species for every subject as Markdown."""
+    lines = []
+    for subject, before, after in zip(data['subject'], data['No Mask'], data['surgical Mask']):
+        if np.isnan(before) or np.isnan(after):
+            continue
+        change = 'increased' if after > before else 'decreased' if after < before else 'did not change'
+        by = ' by **{:.2%}**'.format(abs(after - before)) if after != before else ''
+        lines.append('The amount **{}**{} for {}.<br>'.format(change, by, subject.replace('subject', 'subject ')))
+
+    return '### *{}*\n\n{}'.format(species, '\n'.join(lines))
+
+
+def get_plot():
+    catalog = get_species_catalog()
+    options = catalog.search('', SEARCH_LIMIT)
+    species = DEFAULT_SPECIES if DEFAULT_SPECIES in catalog else options[0] if options else ''
+    if species and species not in options:
+        options = [species] + options[:-1]
+
+    search = pn.widgets.TextInput(name='Search species', placeholder='e.g. acnes')
+    selector = pn.widgets.Select(name='Species', options=options, value=species, size=10)
+
+    source = ColumnDataSource(data=get_data(catalog, species))
+    summary = pn.pane.Markdown(get_summary(source.data, species))
+
+    TOOLS = "pan,wheel_zoom,box_zoom,reset,save"
+
+    p = figure(x_range=source.data['subject'], y_range=[0, 1], tools=TOOLS, width=600, height=600)
+    p.vbar(x=dodge('subject', -0.1, range=p.x_range), top='No Mask', width=0.2, source=source, color="orange",
+           legend_label='No Mask')
+    p.vbar(x=dodge('subject', 0.1, range=p.x_range), top='surgical Mask', width=0.2, source=source, color="blue",
+           legend_label='Surgical mask')
+
+    hover = HoverTool()
+    hover.tooltips = """
+      <div>
+
+      <div><strong>subject: </strong>@subject</div>
+      <div><strong>No Mask: </strong>@{No Mask}{0.00 %}</div>
+      <div><strong>surgical Mask: </strong>@{surgical Mask}{0.00 %}</div>
+
+      </div>
+      """
+
+    p.add_tools(hover)
+
+    p.title.text = species
+    p.xgrid[0].grid_line_color = None
+    p.ygrid[0].grid_line_alpha = 0.5
+    p.xaxis.axis_label = 'Subject_number'
+    p.yaxis.axis_label = 'Percentage of the reads'
+    p.yaxis.formatter = NumeralTickFormatter(format='0 %')
+
+    def on_search(event):
+        matches = catalog.search(event.new, SEARCH_LIMIT)
+        # keep the shown species selected while it matches
+        selector.options = matches
+        if selector.value not in matches and matches:
+            selector.value = matches[0]
+
+    def on_select(event):
+        if not event.new:
+            return
+        source.data = get_data(catalog, event.new)
+        summary.object = get_summary(source.data, event.new)
+        p.title.text = event.new
+
+    search.param.watch(on_search, 'value_input')
+    selector.param.watch(on_select, 'value')
+
+    return pn.Row(pn.Column(get_description(), search, selector, summary), pn.pane.Bokeh(p))
+
+
+class SpeciesPage(Page):
+
+    title = 'Species'
+    data = ['barcodes']
+    # the search runs on the server
+    prerender = False
+
+    def __init__(self):
+        self.pane = get_plot()
+        self.button = pn.widgets.Button(name=self.title)
+
+    def get_contents(self):
+        return self.pane, self.button
+
+
+if __name__ == '__main__':
+    species = SpeciesPage()
+    species_pane, species_btn = species.get_contents()
+
+    species_pane.show(port=50003)
@@ -1 +1,2 @@
-from .oxygensat import SpO2Page
\ No newline at end of file
+from .oxygensat import SpO2Page
+from .live import LiveSpO2Page
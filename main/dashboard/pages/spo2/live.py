@@ -0,0 +1,190 @@
+"""
+This module contains the page that shows live SpO2 readings during a study day.
+
+The readings come from the stream in config.yaml. New readings are streamed into the plots, the figures are
+not rebuilt, and the mask versus no-mask statistics are updated with the new readings only.
+
+The sources of the stream are started once per process, see dashboard.state, every session subscribes to them and
+stops its updates and subscription when it is closed.
+"""
+
+__author__ = ['Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import numpy as np
+import panel as pn
+from bokeh.models import ColumnDataSource, NumeralTickFormatter, DatetimeTickFormatter
+from bokeh.plotting import figure
+from bokeh.transform import factor_cmap
+
+from dashboard.state import shared
+from model import get_spo2_cohort, get_ingestor, RunningStats, running_ttest, Subscription, SpO2Cohort
+from model.abstract import Page
+
+# number of readings that is kept in the browser
+ROLLOVER = 5000
+# milliseconds between two updates
+UPDATE_PERIOD = 1000
+
+MASKTYPES = ['surgical', 'None']
+COLORS = ['#ffff00', '#66ffff']
+
+
+def get_description() -> pn.pane.Markdown:
+    """Returns a Markdown pane containing a description of the live SpO2 page."""
+
+    pane = pn.pane.Markdown("""
+    # Live SpO2
+    This page shows the SpO2 readings of the pulse oximeters while they are measured.
+    The bar chart shows the mean SpO2 of all live readings with and without a surgical mask.
+    """)
+
+    return pane
+
+
+def get_no_stream_description() -> pn.pane.Markdown:
+    """Returns a Markdown pane that explains how a stream is configured."""
+
+    pane = pn.pane.Markdown("""
+    # Live SpO2
+    No stream of live SpO2 readings is configured. Set the **stream** of config.yaml to a file, a socket
+    or the simulator to follow the readings of a study day.
+    """)
+
+    return pane
+
+
+def get_p_value_text(p_value: float) -> str:
+    if np.isnan(p_value):
+        return 'Not enough readings to test whether the SpO2 is lower with a mask.'
+
+    return 'Welch t-test, the SpO2 is lower with a mask: p-value {:.3f}'.format(p_value)
+
+
+class LiveSpO2:
+    """Follows the live SpO2 readings and updates the plots and statistics with every batch of readings.
+
+    Keyword arguments:
+        cohort -- the cohort that the readings are appended to.
+        subscription -- the subscription of this session to the readings.
+    """
+
+    def __init__(self, cohort: SpO2Cohort, subscription: Subscription) -> None:
+        self.cohort = cohort
+        self.subscription = subscription
+
+        # typed columns, so streamed arrays can be appended
+        self.readings = ColumnDataSource(data={'time': np.array([], dtype='datetime64[ns]'),
+                                               'spo2': np.array([], dtype=np.float64),
+                                               'subject': np.array([], dtype=object),
+                                               'masktype': np.array([], dtype=object)})
+        self.means = ColumnDataSource(data={'masktype': MASKTYPES, 'mean': [np.nan, np.nan], 'n': [0, 0]})
+        self.stats = {masktype: RunningStats() for masktype in MASKTYPES}
+        self.p_value = pn.pane.Markdown(get_p_value_text(np.nan))
+
+        self.callback = None
+
+    def update(self) -> None:
+        """Appends the readings that arrived since the last update and streams them to the plots."""
+        df = self.subscription.drain()
+        if len(df) == 0:
+            return
+
+        self.cohort.append(df)
+
+        masktype = df['masktype'].where(df['masktype'] == 'None', 'surgical')
+        self.readings.stream({'time': df['time'].to_numpy(), 'spo2': df['spo2'].to_numpy(),
+                              'subject': df['subject'].astype(str).to_numpy(), 'masktype': masktype.to_numpy()},
+                             rollover=ROLLOVER)
+
+        patches = {'mean': [], 'n': []}
+        for i, name in enumerate(MASKTYPES):
+            stats = self.stats[name]
+            stats.update(df.loc[masktype == name, 'spo2'])
+            patches['mean'].append((i, stats.mean))
+            patches['n'].append((i, stats.n))
+        self.means.patch(patches)
+
+        self.p_value.object = get_p_value_text(running_ttest(self.stats['surgical'], self.stats['None']))
+
+    def get_readings_plot(self) -> figure:
+        fig = figure(x_axis_type='datetime', height=400, y_range=[0.9, 1], tools='pan,wheel_zoom,box_zoom,reset,save',
+                     tooltips=[('subject', '@subject'), ('SpO2', '@spo2{0.0 %}')])
+        fig.circle('time', 'spo2', source=self.readings, size=6, alpha=0.8, legend_field='masktype',
+                   color=factor_cmap('masktype', COLORS, MASKTYPES))
+
+        fig.title.text = 'Live SpO2 readings'
+        fig.xaxis.formatter = DatetimeTickFormatter(minutes=['%H:%M'], hours=['%H:%M'])
+        fig.xaxis.axis_label = 'Time'
+        fig.yaxis.axis_label = 'SpO2'
+        fig.yaxis.formatter = NumeralTickFormatter(format='0 %')
+        fig.legend.location = 'bottom_left'
+
+        return fig
+
+    def get_means_plot(self) -> figure:
+        fig = figure(x_range=MASKTYPES, y_range=[0.95, 1], width=300, height=400,
+                     tooltips=[('mean', '@mean{0.00 %}'), ('readings', '@n')])
+        fig.vbar(x='masktype', top='mean', width=0.5, source=self.means,
+                 color=factor_cmap('masktype', COLORS, MASKTYPES))
+
+        fig.title.text = 'Mean SpO2 of the live readings'
+        fig.xaxis.axis_label = 'Mask type'
+        fig.yaxis.formatter = NumeralTickFormatter(format='0 %')
+
+        return fig
+
+    def get_plot(self) -> pn.Column:
+        """Returns the plots and starts the updates, the toggle pauses the updates."""
+        self.callback = pn.state.add_periodic_callback(self.update, period=UPDATE_PERIOD)
+        pn.state.on_session_destroyed(lambda session_context: self.close())
+
+        pause = pn.widgets.Toggle(name='Pause', value=False)
+
+        def on_pause(event):
+            if event.new:
+                self.callback.stop()
+            else:
+                self.callback.start()
+
+        pause.param.watch(on_pause, 'value')
+
+        return pn.Column(get_description(), pause,
+                         pn.Row(pn.pane.Bokeh(self.get_readings_plot()), pn.pane.Bokeh(self.get_means_plot())),
+                         self.p_value)
+
+    def close(self) -> None:
+        """Stops the updates and the subscription, when the session is destroyed."""
+        if self.callback is not None:
+            self.callback.stop()
+        self.subscription.close()
+
+
+class LiveSpO2Page(Page):
+    """Creates the page with the live SpO2 readings, or a description of the stream when none is configured."""
+
+    title = 'Live SpO2'
+    data = ['diaries']
+    # the readings are pushed by the server
+    prerender = False
+
+    def __init__(self):
+        # a socket can only be bound once, so all sessions share the ingestor
+        ingestor = shared('ingestor', get_ingestor)
+        if ingestor is None:
+            self.pane = pn.Column(get_no_stream_description())
+        else:
+            self.pane = LiveSpO2(get_spo2_cohort(), ingestor.subscribe()).get_plot()
+        self.button = pn.widgets.Button(name=self.title)
+
+    def get_contents(self):
+        return self.pane, self.button
+
+
+if __name__ == '__main__':
+    live = LiveSpO2Page()
+    live_pane, live_btn = live.get_contents()
+
+    live_pane.show(port=50002)
@@ -15,110 +15,91 @@ Djakim Latumalea:
 import pandas as pd
 import panel as pn
 import numpy as np
-from bokeh.models import DatetimeTickFormatter, NumeralTickFormatter, HoverTool
+from bokeh.models import ColumnDataSource, DatetimeTickFormatter, NumeralTickFormatter, HoverTool
 from bokeh.models.widgets import Tabs, Panel
 from bokeh.plotting import figure
-from bokeh.transform import dodge
+from bokeh.transform import dodge, transform
 
-from scipy.stats import ttest_ind
-from scipy.stats import norm
-
-from model import get_column
+from dashboard.decimation import DecimatedSource, link_ranges
+from dashboard.views import group_view, group_values
+from model import get_spo2_cohort, get_stats_settings, SpO2Cohort, compare
 from model.abstract import Page
+from dashboard.state import shared
 
+MEASUREMENTS = ['spo2_m1_mean', 'spo2_m2_mean', 'spo2_m3_mean']
 
-def create_df(subject_number: int) -> pd.DataFrame:
-    """Returns a dataframe from the data of the given subject.
-
-    It also adds the mean of the measurements that are taken concerning the SpO2 levels.
-    """
-    df = pd.DataFrame(get_column(subject_number,
-                                 ['date', 'masktype', 'spo2_m1_r', 'spo2_m1_l', 'spo2_m2_r',
-                                  'spo2_m2_l', 'spo2_m3_r', 'spo2_m3_l']))
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.set_index('date')
-
-    # if masktype medical change it to surgical
-    def mask(x):
-        if x == 'Medical':
-            return 'surgical'
 
-        return x
+def get_spo2_tests(cohort: SpO2Cohort) -> pd.DataFrame:
+    """Returns the t-tests of all subjects and of the whole cohort as one tidy table.
 
-    df['masktype'] = df['masktype'].apply(mask)
+    The column hypothesis is "hands" for the right versus the left index finger and "mask" for the days of the
+    intervention versus the baseline, a mask is worn during the intervention. The p-values of the subjects are
+    corrected with the Benjamini-Hochberg method per hypothesis. The mask tests use the test engine of config.yaml, a
+    permutation test does not assume normal SpO2 values.
+    """
+    settings = get_stats_settings()
+    days = cohort.days.reset_index()
+    hands = days.melt(id_vars=['subject', 'day'], value_vars=['spo2_r_mean', 'spo2_l_mean'], var_name='hand')
 
-    # round to two decimals
-    df['spo2_m1_r'] = df['spo2_m1_r'].round(decimals=2)
-    df['spo2_m1_l'] = df['spo2_m1_l'].round(decimals=2)
-    df['spo2_m2_r'] = df['spo2_m2_r'].round(decimals=2)
-    df['spo2_m2_l'] = df['spo2_m2_l'].round(decimals=2)
-    df['spo2_m3_r'] = df['spo2_m3_r'].round(decimals=2)
-    df['spo2_m3_l'] = df['spo2_m3_l'].round(decimals=2)
+    tests = [
+        compare(hands, 'value', 'hand', 'spo2_r_mean', 'spo2_l_mean', by=['subject'], test='student')
+        .assign(hypothesis='hands'),
+        compare(days, 'mean', 'period', 'intervention', 'baseline', by=['subject'], test='student',
+                alternative='less', **settings).assign(hypothesis='mask'),
+        compare(days, 'mean', 'period', 'intervention', 'baseline', test='student', alternative='less', **settings)
+        .assign(hypothesis='mask', subject='all')
+    ]
 
-    # get the mean of spo2 moment 1, 2 and 3 (left and right) of the subject
-    df['spo2_m1_mean'] = np.mean([df['spo2_m1_r'], df['spo2_m1_l']], axis=0)
-    df['spo2_m2_mean'] = np.mean([df['spo2_m2_r'], df['spo2_m2_l']], axis=0)
-    df['spo2_m3_mean'] = np.mean([df['spo2_m3_r'], df['spo2_m3_l']], axis=0)
+    return pd.concat(tests, ignore_index=True)
 
-    # get the mean of all moment 1, 2 and 3 in total
-    df['mean'] = np.mean([df['spo2_m1_mean'], df['spo2_m2_mean'], df['spo2_m3_mean']], axis=0)
 
-    # get the mean of the right hand and the left hand
-    df['spo2_r_mean'] = np.mean([df['spo2_m1_r'], df['spo2_m2_r'], df['spo2_m3_r']], axis=0)
-    df['spo2_l_mean'] = np.mean([df['spo2_m1_l'], df['spo2_m2_l'], df['spo2_m3_l']], axis=0)
+def get_test(tests: pd.DataFrame, hypothesis: str, subject) -> pd.Series:
+    """Returns the row of a hypothesis and subject from the table of get_spo2_tests."""
+    rows = tests[(tests['hypothesis'] == hypothesis) & (tests['subject'] == subject)]
 
-    return df
+    return rows.iloc[0]
 
 
-def generate_plot(df, subject_number):
+def generate_plot(df, subject_number, tests):
     """Returns a plot with a graph of the SpO2 values and tests the hypothesis.
     """
     xlabel = 'Date'
     ylabel = 'SpO2 average of right and left hand'
     legend_label = 'Click on legend entries to hide the correspnding lines'
 
-    # Divide the DataFrame into a DataFrame containing data from the surgical mask and one containing data without wearing a mask.
-    df_surgical = df[df['masktype'] != 'None']
-    df_none = df[df['masktype'] == 'None']
+    # One source of the subject for both plots, long recordings are decimated to the visible range of each period.
+    days = df.reset_index()[['date', 'period'] + MEASUREMENTS].astype({'period': object})
+    source = DecimatedSource(days, 'date', MEASUREMENTS, by='period')
 
-    # create a plot for surgical mask data
-    fig_s = child_plot(df_surgical, subject_number, xlabel, ylabel, legend_label)
+    # create a plot for the days of the intervention, with a surgical mask
+    fig_s = child_plot(source, 'intervention', subject_number, xlabel, ylabel, legend_label)
 
-    # create a plot for no-mask data
-    fig_n = child_plot(df_none, subject_number, xlabel, ylabel, legend_label)
+    # create a plot for the days of the baseline, without a mask
+    fig_n = child_plot(source, 'baseline', subject_number, xlabel, ylabel, legend_label)
 
     # Add the plots to tabs
     children = [fig_s, fig_n]
     titles = ['Surgical Mask', 'No Mask']
     tabs = fill_tabs(children, titles)
 
-    # Calculate statistical test
-    statistics = get_statistical_plots(df, df_surgical, df_none)
+    # Show the statistical tests of the subject
+    statistics = get_statistical_plots(tests, subject_number)
 
     return pn.Column(pn.Row(statistics, tabs), pn.pane.HTML("""<br><br><br><br>"""),
-                     pn.Row(pn.layout.Divider()), pn.Row(get_df(subject_number)))
+                     pn.Row(pn.layout.Divider()), pn.Row(get_df(df)))
 
 
-def generate_vbar():
-    subjects = ['subject1', 'subject2', 'subject3', 'subject4', 'subject5']
+def generate_vbar(cohort: SpO2Cohort, tests: pd.DataFrame):
+    means = cohort.period_means().pivot(index='subject', columns='period', values='mean')
+    means = means.reindex(columns=['intervention', 'baseline'])
+    subjects = ['subject{}'.format(i) for i in means.index]
 
-    sub = {
+    # one source for both bars
+    sub = ColumnDataSource(data={
         'subjects': subjects,
-        'Surgical Mask': [
-            np.mean(create_df(1).loc[create_df(1)['masktype'] != 'None']['mean']),
-            np.mean(create_df(2).loc[create_df(2)['masktype'] != 'None']['mean']),
-            np.mean(create_df(3).loc[create_df(3)['masktype'] != 'None']['mean']),
-            np.mean(create_df(4).loc[create_df(4)['masktype'] != 'None']['mean']),
-            np.mean(create_df(5).loc[create_df(5)['masktype'] != 'None']['mean']),
-        ],
-        'No Mask': [
-            np.mean(create_df(1).loc[create_df(1)['masktype'] == 'None']['mean']),
-            np.mean(create_df(2).loc[create_df(2)['masktype'] == 'None']['mean']),
-            np.mean(create_df(3).loc[create_df(3)['masktype'] == 'None']['mean']),
-            np.mean(create_df(4).loc[create_df(4)['masktype'] == 'None']['mean']),
-            np.mean(create_df(5).loc[create_df(5)['masktype'] == 'None']['mean']),
-        ]
-    }
+        'Surgical Mask': means['intervention'].tolist(),
+        'No Mask': means['baseline'].tolist()
+    })
 
     TOOLS = "pan,wheel_zoom,box_zoom,reset,save,hover"
 
@@ -148,39 +129,27 @@ def generate_vbar():
 
     p.add_tools(hover)
 
-    description = get_description_vbar()
+    description = get_description_vbar(tests)
 
     return pn.Row(p, description)
 
 
-def get_stats_vbar():
+def get_stats_vbar(tests: pd.DataFrame):
     """@Azadeh Pirzadeh"""
-    Y1 = []
-    Y2 = []
-    for i in range(5):
-        Y1.extend(create_df(i + 1).loc[create_df(i + 1)['masktype'] != 'None']['mean'])
-        Y2.extend(create_df(i + 1).loc[create_df(i + 1)['masktype'] == 'None']['mean'])
-
-    y1 = np.array(Y1)
-    y2 = np.array(Y2)
+    return get_test(tests, 'mask', 'all')
 
-    _, p_value = ttest_ind(y1, y2, alternative='less')
 
-    return p_value
-
-
-def get_description_vbar():
-    p_value = get_stats_vbar()
+def get_description_vbar(tests: pd.DataFrame):
+    result = get_stats_vbar(tests)
     question = "Is the blood oxygen saturation significantly lower when wearing a KN95 mask than wearing no mask?"
     h0 = "The blood oxygen saturation is not significantly lower when wearing a KN95 mask."
     h1 = "The blood oxygen saturation is significantly lower when wearing a KN95 mask."
-    pane = get_statistical_plot(1, question, h0, h1, p_value)
+    pane = get_statistical_plot(1, question, h0, h1, result)
 
     return pane
 
 
-def get_df(subject_number):
-    df = create_df(subject_number)
+def get_df(df):
     return pn.pane.markup.DataFrame(df)
 
 
@@ -192,21 +161,26 @@ def fill_tabs(children, titles):
     return pn.pane.Bokeh(Tabs(tabs=tabs))
 
 
-def child_plot(df: pd.DataFrame, subject_number, xlabel, ylabel, legend_label):
-    """Generate a child plot that can be used with a container"""
+def child_plot(source: DecimatedSource, period: str, subject_number, xlabel, ylabel, legend_label):
+    """Generate a child plot of the days of a period that can be used with a container"""
 
     TOOLS = 'pan, wheel_zoom, box_zoom, reset, save, hover'
 
     # Data contains only values between 0.94 and 1
-    fig = figure(tools=TOOLS, x_axis_type='datetime', width=600, height=600, y_range=[0.94, 1], tooltips='value, @y')
+    fig = figure(tools=TOOLS, x_axis_type='datetime', width=600, height=600, y_range=[0.94, 1],
+                 tooltips='value, @$name')
     fig.xaxis.formatter = DatetimeTickFormatter(months=['$d,%m'])
     fig.title.text = 'SpO2 chart of subject {}'.format(subject_number)
 
-    index = df.index
-
-    fig = add_measurement(fig, df['spo2_m1_mean'], index, 'First Measurement', 'red')
-    fig = add_measurement(fig, df['spo2_m2_mean'], index, 'Second Measurement', 'green')
-    fig = add_measurement(fig, df['spo2_m3_mean'], index, 'Third Measurement', 'yellow')
+    # the days of the period are a view of the source of the subject
+    view = group_view(source.source, 'period', period)
+    values = group_values(source.source, 'period', period)
+    circles = [add_measurement(fig, source, view, values, 'spo2_m1_mean', 'First Measurement', 'red'),
+               add_measurement(fig, source, view, values, 'spo2_m2_mean', 'Second Measurement', 'green'),
+               add_measurement(fig, source, view, values, 'spo2_m3_mean', 'Third Measurement', 'yellow')]
+    # the lines span the days of all periods, so only the circles set the date range
+    fig.x_range.renderers = circles
+    link_ranges(fig, [source], period)
 
     fig.ygrid[0].grid_line_alpha = 0.5
     fig.xgrid[0].grid_line_alpha = 0.5
@@ -222,37 +196,36 @@ def child_plot(df: pd.DataFrame, subject_number, xlabel, ylabel, legend_label):
     return fig
 
 
-def add_measurement(fig: figure, data_series: pd.Series, index: list, label: str, color: str):
-    fig.line(index, data_series, line_width=2, color=color, alpha=0.8, legend_label=label)
-    fig.circle(index, data_series, fill_color=color, size=8)
+def add_measurement(fig: figure, source: DecimatedSource, view, values, column: str, label: str, color: str):
+    """Adds the line and circles of a measurement in a period and returns the circles.
 
-    return fig
+    The circles show the view of the period and the line the values of the period, see dashboard.views.
+    """
+    fig.line('date', transform(column, values), source=source.source, name=column,
+             line_width=2, color=color, alpha=0.8, legend_label=label)
 
+    return fig.circle('date', column, source=source.source, view=view, name=column, fill_color=color, size=8,
+                      legend_label=label)
 
-def get_statistical_plots(df, df_surgical, df_none):
-    # Calculate statistical test
+
+def get_statistical_plots(tests, subject_number):
     ## index fingers
-    right_index_mean = df['spo2_r_mean']
-    left_index_mean = df['spo2_l_mean']
     question = "Is there a significant difference between the oxygen saturation of the left and right index finger?"
     h0 = "There is no significant difference in blood oxygen saturation between the right and left index finger."
     h1 = "There is a significant difference in blood oxygen saturation between the right and left index finger."
-    _, p_val = ttest_ind(right_index_mean, left_index_mean, alternative='two-sided')
-    stat_plot_fingers = get_statistical_plot(1, question, h0, h1, p_val)
+    stat_plot_fingers = get_statistical_plot(1, question, h0, h1, get_test(tests, 'hands', subject_number))
 
     ## Difference between wearing a mask and not wearing a mask
-    y1 = df_surgical['mean']
-    y2 = df_none['mean']
-    _, p_val = ttest_ind(y1, y2, alternative='less')
     question = "Is the blood oxygen saturation significantly lower when wearing a KN95 mask than wearing no mask?"
     h0 = "The blood oxygen saturation is not significantly lower when wearing a KN95 mask."
     h1 = "The blood oxygen saturation is significantly lower when wearing a KN95 mask."
-    stat_plot_spo2 = get_statistical_plot(2, question, h0, h1, p_val)
+    stat_plot_spo2 = get_statistical_plot(2, question, h0, h1, get_test(tests, 'mask', subject_number))
 
     return pn.Column(stat_plot_fingers, pn.layout.Divider(), stat_plot_spo2)
 
 
-def get_statistical_plot(i, question, h0, h1, p_val):
+def get_statistical_plot(i, question, h0, h1, result):
+    """Returns the research question and the conclusion of a test, result is a row of get_spo2_tests."""
     heading = pn.pane.Markdown("""
     # Research Question {} 
     **{}** 
@@ -261,66 +234,38 @@ def get_statistical_plot(i, question, h0, h1, p_val):
     **H<sub>1</sub>**: {}<br>\
     """.format(i, question, h0, h1))
 
-    h_accepted = pn.pane.Markdown("We accept **H<sub>1</sub>** because the p-value {:.3f} < 0.05.<br>".format(p_val))
+    test = 'permutation test' if result['engine'] == 'permutation' else 't-test'
+    p_val = "the adjusted p-value {:.3f} (p-value {:.3f}) of the {}".format(result['p_adjusted'], result['p_value'],
+                                                                           test)
+
+    h_accepted = pn.pane.Markdown("We accept **H<sub>1</sub>** because {} < 0.05.<br>".format(p_val))
     conclusion_accepted = pn.pane.Markdown("**Conclusion: {}**".format(h1[0].lower() + h1[1:]),
                                            style={'color': 'whitesmoke', 'font-size': '16px'})
 
-    h_rejected = pn.pane.Markdown("We reject **H<sub>1</sub>** because the p-value {:.3f} > 0.05.<br>".format(p_val))
+    h_rejected = pn.pane.Markdown("We reject **H<sub>1</sub>** because {} > 0.05.<br>".format(p_val))
     conclusion_rejected = pn.pane.Markdown("**Conclusion: {}**".format(h0[0].lower() + h0[1:]),
                                            style={'color': 'whitesmoke', 'font-size': '16px'})
 
-    if p_val < 0.05:
+    if result['reject']:
         return pn.Column(heading, h_accepted, conclusion_accepted)
     else:
         return pn.Column(heading, h_rejected, conclusion_rejected)
 
 
-def ttest(right, left):
-    t_samp, p_val = ttest_ind(right, left, equal_var=False)
-
-    return t_samp, p_val
-
-
-def stats_test(y1, y2):
-    n_1 = len(y1)
-    n_2 = len(y2)
-    p_ML_1 = np.mean(y1)
-    p_ML_2 = np.mean(y2)
-    O_1 = np.sum(y1)
-    O_2 = np.sum(y2)
-    pi_p = (O_1 + O_2) / (n_1 + n_2)
-    z = (p_ML_1 - p_ML_2) / np.sqrt(pi_p * (1 - pi_p) * (1 / n_1 + 1 / n_2))
-
-    p_value = norm.cdf(z)
-
-    return p_value
-
-
 class SpO2Page(Page):
 
+    title = 'SpO2'
+    data = ['diaries']
+
     def __init__(self):
-        subj_1 = create_df(1)
-        subj_2 = create_df(2)
-        subj_3 = create_df(3)
-        subj_4 = create_df(4)
-        subj_5 = create_df(5)
-
-        plot_1 = generate_plot(subj_1, 1)
-        plot_2 = generate_plot(subj_2, 2)
-        plot_3 = generate_plot(subj_3, 3)
-        plot_4 = generate_plot(subj_4, 4)
-        plot_5 = generate_plot(subj_5, 5)
-
-        comparison_plot = generate_vbar()
-
-        self.pane = pn.Tabs(("Subject 1", plot_1),
-                            ("Subject 2", plot_2),
-                            ("Subject 3", plot_3),
-                            ("Subject 4", plot_4),
-                            ("Subject 5", plot_5),
-                            ("Comparison", comparison_plot)
-                            )
-        self.button = pn.widgets.Button(name='SpO2')
+        # the diaries are read once per process, all plots and tests of every session are views over the cohort
+        cohort = shared('spo2_cohort', get_spo2_cohort)
+        tests = shared('spo2_tests', get_spo2_tests, cohort)
+        plots = [("Subject {}".format(i), generate_plot(cohort.frame(i), i, tests)) for i in cohort.subjects]
+        comparison_plot = generate_vbar(cohort, tests)
+
+        self.pane = pn.Tabs(*plots, ("Comparison", comparison_plot))
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
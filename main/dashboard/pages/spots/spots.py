@@ -21,98 +21,114 @@ import panel as pn
 import pandas as pd
 from bokeh.plotting import figure
 from bokeh.models import DatetimeTickFormatter, HoverTool
+from bokeh.transform import transform
 from bokeh.models.widgets import Tabs, Panel
 
-from model import get_column
+from dashboard.decimation import DecimatedSource, link_ranges
+from dashboard.views import group_view, group_values
+from model import get_column, get_columns, get_subjects, get_stats_settings, get_periods, compare
 from model.abstract import Page
+from dashboard.state import shared
 
 
-# create a dataframe of subjects using model:
-def create_df(subject_number):
-    df = pd.DataFrame(get_column(subject_number, ['date', 'masktype', 'acne']))
+columns = ['date', 'masktype', 'acne']
+
+
+def prepare_df(df):
+    df = pd.DataFrame(df)
     df['date'] = pd.to_datetime(df['date'])
     return df
 
 
-def get_average_acne_number(choose_type="baseline"):
+# create a dataframe of subjects using model:
+def create_df(subject_number):
+    return prepare_df(get_column(subject_number, columns))
+
+
+def create_dfs():
+    """
+    to get the dataframes of all subjects, the files are read in parallel.
+    return: dict, subject number and dataframe
+    """
+    return {subject: prepare_df(df) for subject, df in get_columns(get_subjects(), columns).items()}
+
+
+def create_diaries():
+    """
+    to get the diaries of all subjects in one dataframe, every day is labelled with its period of the study design.
+    return: DataFrame, the columns subject, date, masktype, acne and period
+    """
+    diaries = pd.concat(create_dfs(), names=['subject', 'row']).reset_index(level='subject').reset_index(drop=True)
+    diaries['period'] = get_periods(diaries)
+    return diaries
+
+
+def get_average_acne_numbers(diaries):
     """
-    to get average of acne number for each subject.
-    choose_type: str, "baseline" or "intervention" to return average of acne number for each subject.
-    return:list, average of acne number for each subject
+    to get average of acne number for each subject and period.
+    return: DataFrame, the columns subject, period and acne
     """
-    df_subj_1 = create_df(subject_number=1)['acne']
-    df_subj_2 = create_df(subject_number=2)['acne']
-    df_subj_3 = create_df(subject_number=3)['acne']
-    df_subj_4 = create_df(subject_number=4)['acne']
-    df_subj_5 = create_df(subject_number=5)['acne']
-    df_subj_list = [df_subj_1,df_subj_2,df_subj_3,df_subj_4,df_subj_5]
-    get_average_list =[]
-    for i in range (5):
-        if choose_type == "intervention":
-            get_average_list.append(df_subj_list[i][:8].sum()/ len(df_subj_list[i][:8]))
-        elif choose_type == "baseline":
-            get_average_list.append(df_subj_list[i][8:].sum()/ len(df_subj_list[i][8:]))
-    return get_average_list
-
-def statistics_output():
+    return diaries.groupby(['subject', 'period'], observed=True)['acne'].mean().reset_index()
+
+
+def statistics_output(diaries=None):
     """
     H0 = "There is no significant more amount of spots"
     H1 = "There is significant more amount of spots"
+    return: Series, the paired test of the engine in config.yaml as a row of the result table of model.compare
     """
-    from scipy.stats import ttest_rel
-    a = get_average_acne_number("intervention")
-    b = get_average_acne_number("baseline")
-    _,p_value = ttest_rel(a,b,alternative= "greater")
-    return p_value
+    averages = get_average_acne_numbers(create_diaries() if diaries is None else diaries)
+
+    result = compare(averages, 'acne', 'period', 'intervention', 'baseline', pair='subject', test='paired',
+                     alternative='greater', **get_stats_settings())
+    return result.iloc[0]
 
 
 def acne_plot(df, subject_number):
 
-    # dividing the data frame according to masktype
-    df_surgical = df[df['masktype'] == 'surgical']
-    df_none = df[df['masktype'] == 'None']
+    # one source of the subject, the intervention, with a surgical mask, and the baseline are views of it
+    days = DecimatedSource(df[['date', 'acne', 'period']].astype({'period': object}), 'date', 'acne', by='period')
+    source = days.source
 
-                
     plot = figure(x_axis_type='datetime', x_axis_label="Date", y_axis_label="Acne number", plot_height=600,
                   plot_width=600, toolbar_location=None, y_range=(0, 10))
     plot.xaxis.major_label_orientation = "vertical"
     plot.xaxis.formatter = DatetimeTickFormatter(days=["%Y-%m-%d"], months=["%Y-%m-%d"], years=["%Y-%m-%d"])
     plot.title.text = 'Acne Count of Subject ' + subject_number
 
-    plot.line(x=df_surgical['date'], y=df_surgical['acne'], line_width=5, color='red', legend_label='Surgical Mask')
-    plot.line(x=df_none['date'], y=df_none['acne'], line_width=5, color='blue', legend_label='No Mask')
-    plot.circle(x=df_surgical.date, y=df_surgical['acne'], fill_color="green", size=8)
-    plot.circle(x=df_none.date, y=df_none['acne'], fill_color="orange", size=8)
+    plot.line(x='date', y=transform('acne', group_values(source, 'period', 'intervention')), source=source,
+              line_width=5, color='red', legend_label='Surgical Mask')
+    plot.line(x='date', y=transform('acne', group_values(source, 'period', 'baseline')), source=source,
+              line_width=5, color='blue', legend_label='No Mask')
+    plot.circle(x='date', y='acne', source=source, view=group_view(source, 'period', 'intervention'),
+                fill_color="green", size=8)
+    plot.circle(x='date', y='acne', source=source, view=group_view(source, 'period', 'baseline'),
+                fill_color="orange", size=8)
+    # long recordings are decimated to the visible range, see dashboard.decimation
+    link_ranges(plot, [days])
     plot.xgrid.grid_line_color = None
     plot.y_range.start = 0
 
-    subject1 = Panel(child=plot)
-    subject2 = Panel(child=plot)
-    subject3 = Panel(child=plot)
-    subject4 = Panel(child=plot)
-    subject5 = Panel(child=plot)
-    tabs = Tabs(tabs=[subject1, subject2, subject3, subject4, subject5])
-    return (tabs)
+    return plot
 
 
 def get_plot():
-    plot_1 = acne_plot(df=create_df(subject_number=1), subject_number='1')
-    plot_2 = acne_plot(df=create_df(subject_number=2), subject_number='2')
-    plot_3 = acne_plot(df=create_df(subject_number=3), subject_number='3')
-    plot_4 = acne_plot(df=create_df(subject_number=4), subject_number='4')
-    plot_5 = acne_plot(df=create_df(subject_number=5), subject_number='5')
-
-    tab_subj_1 = Panel(child=plot_1, title="subject 1")
-    tab_subj_2 = Panel(child=plot_2, title="subject 2")
-    tab_subj_3 = Panel(child=plot_3, title="subject 3")
-    tab_subj_4 = Panel(child=plot_4, title="subject 4")
-    tab_subj_5 = Panel(child=plot_5, title="subject 5")
-
-    tabs = Tabs(tabs=[tab_subj_1, tab_subj_2, tab_subj_3, tab_subj_4, tab_subj_5])
+    # the diaries are read once per process, every session builds its own plots of them
+    diaries = shared('spots_diaries', create_diaries)
+    tabs = []
+    for subject, df in diaries.groupby('subject', sort=False):
+        plot = acne_plot(df=df, subject_number=str(subject))
+        tabs.append(Panel(child=plot, title="subject {}".format(subject)))
+
+    tabs = Tabs(tabs=tabs)
     description = get_description()
-    statistics_result = statistics_output()
+    statistics_result = shared('spots_statistics', statistics_output, diaries)
 
-    statistics = pn.pane.Markdown("We use paired t-test. We reject alternative hypothesis because the p-value = {:.2f} is > 0.05. \n\nConclusion: There is no significant more amount of spots between wearing and without mask.".format(statistics_result))
+    test = 'paired permutation test' if statistics_result['engine'] == 'permutation' else 'paired t-test'
+    if statistics_result['reject']:
+        statistics = pn.pane.Markdown("We use " + test + ". We accept alternative hypothesis because the p-value = {:.2f} is < 0.05. \n\nConclusion: There is significant more amount of spots when wearing a mask.".format(statistics_result['p_value']))
+    else:
+        statistics = pn.pane.Markdown("We use " + test + ". We reject alternative hypothesis because the p-value = {:.2f} is > 0.05. \n\nConclusion: There is no significant more amount of spots between wearing and without mask.".format(statistics_result['p_value']))
 
     return pn.Row(pn.Column(description,statistics), tabs)
 
@@ -134,9 +150,12 @@ def get_description():
 
 class SpotsPage(Page):
 
+    title = 'Spots'
+    data = ['diaries']
+
     def __init__(self):
         self.pane = get_plot()
-        self.button = pn.widgets.Button(name='Spots')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
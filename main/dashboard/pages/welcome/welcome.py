@@ -18,10 +18,12 @@ picture = Path(Path(__file__).parent, 'facemask_wearer.jpg')
 
 class WelcomePage(Page):
 
+    title = 'Welcome'
+
     def __init__(self):
         self.pane = pn.Column(pn.pane.markup.Markdown(md), pn.Column(pn.pane.JPG(picture, height=500),
                                                                   pn.pane.Markdown('Photo by <a href="https://unsplash.com/@aminmoshrefi?utm_source=unsplash&utm_medium=referral&utm_content=creditCopyText">Amin Moshrefi</a> on <a href="https://unsplash.com/s/photos/corona?utm_source=unsplash&utm_medium=referral&utm_content=creditCopyText">Unsplash</a>')))
-        self.button = pn.widgets.Button(name='Welcome')
+        self.button = pn.widgets.Button(name=self.title)
 
     def get_contents(self):
         return self.pane, self.button
@@ -0,0 +1,202 @@
+"""This module saves the pages of the dashboard as static HTML files and finds the files that are still current.
+
+A page only changes when its data, the model, its module, the files next to it or the modules of the dashboard that
+the pages share, e.g. dashboard.views, change. The fingerprint of a page is the hash of the contents of those files,
+see model.get_data_paths for the data of a page. A build saves every page with embed=True, so the states of its
+widgets are part of the file, in a version directory named after the hash of all fingerprints:
+
+    build/pages/
+        3f2a9c0d41be/
+            manifest.json
+            spo2.html
+            ...
+        digests.json
+
+A page whose fingerprint did not change since an earlier build is copied from that build instead of built again.
+The dashboard serves a current file of a page as a static file in an iframe, without any computation per request,
+and only builds the pages live that changed since the build or cannot be saved, see Page.prerender.
+
+The contents of a file are only hashed again when its size or modification time changed, the digests are kept in
+digests.json.
+
+Djakim Latumalea:
+- Created static pages
+"""
+
+__author__ = 'Djakim Latumalea'
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import panel as pn
+
+import model
+from model import get_data_paths
+
+# the URL of the static files of the builds
+ROUTE = 'prerendered'
+VERSION_LENGTH = 12
+CHUNK_SIZE = 1 << 20
+
+
+def file_digest(path, known: Optional[dict] = None) -> str:
+    """Returns the SHA-256 of the contents of a file.
+
+    Keyword arguments:
+        path -- the path of the file.
+        known -- a dictionary of paths and their size, modification time and digest, the digest is reused while the
+                 size and modification time are the same and the dictionary is updated otherwise.
+    """
+    stat = os.stat(path)
+    key = str(Path(path).resolve())
+    version = [stat.st_size, stat.st_mtime_ns]
+    if known is not None and known.get(key, [None, None])[:2] == version:
+        return known[key][2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    if known is not None:
+        known[key] = version + [digest.hexdigest()]
+
+    return digest.hexdigest()
+
+
+def page_files(page) -> list:
+    """Returns the module of a page class and the other files in its directory, e.g. its markdown and images."""
+    directory = Path(inspect.getfile(page)).parent
+
+    return sorted(path for path in directory.iterdir() if path.is_file() and path.suffix != '.pyc')
+
+
+def model_files() -> list:
+    """Returns the modules of the model, which compute the data of the pages."""
+    return sorted(Path(inspect.getfile(model)).parent.glob('*.py'))
+
+
+def dashboard_files() -> list:
+    """Returns the modules of the dashboard package, e.g. the sources and views that the pages share."""
+    return sorted(Path(__file__).parent.glob('*.py'))
+
+
+def fingerprint(page, known: Optional[dict] = None) -> str:
+    """Returns the hash of the files of a page class, of the data it is built from and of the model of the data."""
+    paths = page_files(page) + dashboard_files() + (model_files() + get_data_paths(page.data) if page.data else [])
+
+    digest = hashlib.sha256(page.__name__.encode('utf8'))
+    for path in paths:
+        digest.update(file_digest(path, known).encode('ascii'))
+
+    return digest.hexdigest()
+
+
+def read_json(path, default):
+    try:
+        return json.loads(Path(path).read_text(encoding='utf8'))
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, value) -> None:
+    """Writes a .json file through a temporary file, so readers never see a partial file.
+
+    The temporary file has a unique name, so processes that write the same file at the same time do not mix.
+    """
+    descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=Path(path).parent)
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf8') as stream:
+            stream.write(json.dumps(value, indent=2))
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def get_fingerprints(pages: dict, root) -> Dict[str, str]:
+    """Returns the fingerprints of the pages that can be saved, by key, and updates digests.json of the root."""
+    known = read_json(Path(root, 'digests.json'), {})
+    fingerprints = {key: fingerprint(page, known) for key, page in pages.items() if page.prerender}
+
+    Path(root).mkdir(parents=True, exist_ok=True)
+    write_json(Path(root, 'digests.json'), known)
+
+    return fingerprints
+
+
+def find_current(fingerprints: Dict[str, str], root) -> Dict[str, Path]:
+    """Returns the files of the builds in the root whose page has the same fingerprint, by key, newest build first."""
+    manifests = sorted(Path(root).glob('*/manifest.json'), key=lambda path: path.stat().st_mtime_ns, reverse=True)
+
+    current = {}
+    for path in manifests:
+        for key, entry in read_json(path, {}).get('pages', {}).items():
+            file = Path(path.parent, entry['file'])
+            if key not in current and fingerprints.get(key) == entry['fingerprint'] and file.exists():
+                current[key] = file
+
+    return current
+
+
+def build(pages: dict, root, force: bool = False) -> Path:
+    """Saves the pages that can be saved in the version directory of their fingerprints and returns the directory.
+
+    Keyword arguments:
+        pages -- a dictionary of keys and Page classes.
+        root -- the directory of the builds.
+        force -- True builds every page again, also when an earlier build has a current file.
+    """
+    fingerprints = get_fingerprints(pages, root)
+    version = hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode('utf8')).hexdigest()[:VERSION_LENGTH]
+    directory = Path(root, version)
+    if directory.exists() and not force:
+        return directory
+
+    current = {} if force else find_current(fingerprints, root)
+    temporary = Path(root, version + '.tmp')
+    shutil.rmtree(temporary, ignore_errors=True)
+    temporary.mkdir(parents=True)
+
+    manifest = {'version': version, 'pages': {}}
+    for key, page_fingerprint in fingerprints.items():
+        file = '{}.html'.format(key)
+        if key in current:
+            shutil.copy2(current[key], Path(temporary, file))
+        else:
+            page = pages[key]
+            pane, _ = page().get_contents()
+            pane.save(str(Path(temporary, file)), title=page.title, embed=True, progress=False)
+        manifest['pages'][key] = {'fingerprint': page_fingerprint, 'file': file}
+    write_json(Path(temporary, 'manifest.json'), manifest)
+
+    # the version directory appears at once, with all its pages
+    shutil.rmtree(directory, ignore_errors=True)
+    temporary.replace(directory)
+
+    return directory
+
+
+def get_static_urls(pages: dict, root) -> Dict[str, str]:
+    """Returns the URLs of the current files of the pages by key, the other pages are left out and built live.
+
+    The files are served by the static route ROUTE of the root, see main.py.
+    """
+    current = find_current(get_fingerprints(pages, root), root)
+
+    return {key: '/{}/{}'.format(ROUTE, path.relative_to(Path(root)).as_posix()) for key, path in current.items()}
+
+
+def static_pane(url: str) -> pn.pane.HTML:
+    """Returns a pane that shows a static page."""
+    return pn.pane.HTML('<iframe src="{}" style="width: 100%; height: calc(100vh - 120px); border: none;"></iframe>'
+                        .format(url), sizing_mode='stretch_width')
@@ -0,0 +1,57 @@
+"""This module contains the state that is shared by all sessions of a dashboard process.
+
+Every session of the served dashboard builds its own template, pages and Bokeh models, so a widget, zoom or live
+update of one session never changes another session. The data the pages are built from does not change while the
+dashboard is served. It is computed once per process by the first session that asks for it and kept in
+pn.state.cache, later sessions only build their plots from it. Values in the cache must not be modified.
+
+With --num-procs the server forks after main.py warmed the cache, so the processes share the pages of the data in
+memory until one of them writes to it.
+
+Djakim Latumalea:
+- Created shared state
+"""
+
+__author__ = 'Djakim Latumalea'
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import threading
+from typing import Callable
+
+import panel as pn
+
+from model.timing import span
+
+_lock = threading.Lock()
+_key_locks = {}
+
+
+def shared(key: str, factory: Callable, *args, **kwargs):
+    """Returns the value of a key in pn.state.cache, the factory is called with the arguments when it is missing.
+
+    Sessions that ask for the same key at the same time wait for the one that calls the factory.
+
+    Keyword arguments:
+        key -- the key of the value in pn.state.cache.
+        factory -- a function that returns the value.
+    """
+    if key in pn.state.cache:
+        return pn.state.cache[key]
+
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+
+    with key_lock:
+        if key not in pn.state.cache:
+            with span('shared {}'.format(key)):
+                pn.state.cache[key] = factory(*args, **kwargs)
+
+    return pn.state.cache[key]
+
+
+def clear_shared() -> None:
+    """Removes all shared values, the next session computes them again."""
+    with _lock:
+        pn.state.cache.clear()
@@ -0,0 +1,39 @@
+"""Module that contains the views of shared ColumnDataSources.
+
+A page sends every column once: the glyphs of a subject, a period or a mask type share one ColumnDataSource and
+select their rows with a view. A CDSView with a GroupFilter does this for glyphs such as circles and bars. Bokeh does
+not filter connected glyphs such as lines, so a line reads its values through a transform that hides the values of
+the other groups, which breaks the line at those rows. The lines of a group share one transform.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from bokeh.models import CDSView, ColumnDataSource, CustomJSTransform, GroupFilter
+
+# keeps the values of the rows of the group, the others become NaN
+GROUP_VALUES = """
+const groups = source.data[column]
+return xs.map((x, i) => groups[i] == group ? x : NaN)
+"""
+
+
+def group_view(source: ColumnDataSource, column: str, group) -> CDSView:
+    """Returns a view of the rows of a source whose column equals the group."""
+    return CDSView(source=source, filters=[GroupFilter(column_name=column, group=str(group))])
+
+
+def group_values(source: ColumnDataSource, column: str, group) -> CustomJSTransform:
+    """Returns a transform that keeps the values of the rows whose column equals the group, for connected glyphs.
+
+    Use it as the field spec transform('y', values) of a glyph of the source.
+
+    Keyword arguments:
+        source -- the source of the glyphs.
+        column -- the column with the groups.
+        group -- the group to keep.
+    """
+    return CustomJSTransform(args={'source': source, 'column': column, 'group': str(group)}, v_func=GROUP_VALUES)
@@ -5,6 +5,25 @@ Djakim Latumalea:
 - Created main.py and corresponding logic.
 - Created all __init__ files.
 - Created architecture of the application.
+
+The pages are registered as classes, the dashboard creates a page on its first visit. Every session gets its own
+dashboard from create_dashboard, the data of the pages is shared by the sessions of a process, see dashboard.state.
+
+Development server:
+    python main.py --dev
+
+Production, with one process per core:
+    python main.py --port 50046 --num-procs 0 --allow-websocket-origin sigma.example.org
+    panel serve main.py --port 50046 --num-procs 4
+
+Static pages, see dashboard.prerender. The build saves the pages once, the server shows the saved pages that are still
+current and builds the other pages live:
+    python main.py --build build/pages
+    python main.py --num-procs 0 --prerendered build/pages
+    panel serve main.py --static-dirs prerendered=build/pages --args --prerendered build/pages
+
+Every process starts the sources of the live SpO2 stream once, for all its sessions. Only one process can bind a
+socket source, so it is served with one process, a file source is read by every process.
 """
 
 __author__ = 'Djakim Latumalea'
@@ -12,93 +31,109 @@ __copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh', 'Peter Riesebos', 'Kai L
 __license__ = 'Apache 2.0'
 __version__ = '0.1'
 
+import argparse
+import sys
+from functools import partial
+
+import panel as pn
+
 from dashboard import Dashboard
-from dashboard.pages import PaperPage, AboutPage, MicrobiomePage, SpO2Page, \
-    AlphaDiversityPage, AcnesPage, SpotsPage, IntroPage, ConclusionPage, WelcomePage, \
+from dashboard.prerender import ROUTE, build, get_static_urls, static_pane
+from dashboard.state import shared
+from dashboard.pages import PaperPage, AboutPage, MicrobiomePage, SpO2Page, LiveSpO2Page, \
+    AlphaDiversityPage, BetaDiversityPage, SpeciesPage, SpotsPage, IntroPage, ConclusionPage, WelcomePage, \
     DefinitionsPage, HypothesisPage, ContributionPage, StudyDesignPage
 from dashboard.modals import CreativeCommons
+from model import get_stream_settings
 
-# pages
-about_page = AboutPage()
-paper_page = PaperPage()
-biome_page = MicrobiomePage()
-spo2_page = SpO2Page()
-alpha_diversity_page = AlphaDiversityPage()
-acnes_page = AcnesPage()
-spots_page = SpotsPage()
-intro_page = IntroPage()
-concl_page = ConclusionPage()
-welcome_page = WelcomePage()
-definition_page = DefinitionsPage()
-hyp_page = HypothesisPage()
-contr_page = ContributionPage()
-design_page = StudyDesignPage()
-
-# modal
-cc = CreativeCommons()
-
-# page panes and buttons
-about_pane, about_btn = about_page.get_contents()
-paper_pane, paper_btn = paper_page.get_contents()
-biome_pane, biome_btn = biome_page.get_contents()
-spo2_pane, spo2_btn = spo2_page.get_contents()
-alpha_diversity_pane, alpha_diversity_btn = alpha_diversity_page.get_contents()
-acnes_pane, acnes_btn = acnes_page.get_contents()
-spots_pane, spots_btn = spots_page.get_contents()
-intro_pane, intro_btn = intro_page.get_contents()
-concl_pane, concl_btn = concl_page.get_contents()
-welcome_pane, welcome_btn = welcome_page.get_contents()
-definition_pane, definition_btn = definition_page.get_contents()
-hyp_pane, hyp_btn = hyp_page.get_contents()
-contr_pane, contr_btn = contr_page.get_contents()
-design_pane, design_btn = design_page.get_contents()
-
-# modal and button
-cc_modal, cc_btn = cc.get_contents()
-
-panes = {
-    'welcome': welcome_pane,
-    'introduction': intro_pane,
-    'definition': definition_pane,
-    'paper': paper_pane,
-    'about': about_pane,
-    'contribution': contr_pane,
-    'design': design_pane,
-    'hypothesis': hyp_pane,
-    'biome': biome_pane,
-    'spo2': spo2_pane,
-    'alpha_diversity': alpha_diversity_pane,
-    'acnes': acnes_pane,
-    'spots': spots_pane,
-    'conclusion': concl_pane
+# pages, in the order of their buttons
+pages = {
+    'welcome': WelcomePage,
+    'about': AboutPage,
+    'introduction': IntroPage,
+    'definition': DefinitionsPage,
+    'contribution': ContributionPage,
+    'design': StudyDesignPage,
+    'hypothesis': HypothesisPage,
+    'spo2': SpO2Page,
+    'spo2_live': LiveSpO2Page,
+    'biome': MicrobiomePage,
+    'alpha_diversity': AlphaDiversityPage,
+    'beta_diversity': BetaDiversityPage,
+    'species': SpeciesPage,
+    'spots': SpotsPage,
+    'conclusion': ConclusionPage,
+    'paper': PaperPage
 }
 
-modals = {
-    'cc': cc_modal
-}
+# pages of which the shared data is computed before the server forks its processes
+WARM_PAGES = [SpO2Page, SpotsPage, MicrobiomePage, AlphaDiversityPage]
 
-btns = {
-    'welcome': welcome_btn,
-    'about': about_btn,
-    'introduction': intro_btn,
-    'definition': definition_btn,
-    'contribution': contr_btn,
-    'design': design_btn,
-    'hypothesis': hyp_btn,
-    'spo2': spo2_btn,
-    'biome': biome_btn,
-    'alpha_diversity': alpha_diversity_btn,
-    'acnes': acnes_btn,
-    'spots': spots_btn,
-    'conclusion': concl_btn,
-    'paper': paper_btn,
-    'cc': cc_btn,
-}
 
+def get_parser():
+    parser = argparse.ArgumentParser(description="Serve the SIGMA dashboard.")
+    parser.add_argument('--port', type=int, default=50046, help='Port of the server.')
+    parser.add_argument('--address', help='Address of the server, defaults to all addresses.')
+    parser.add_argument('--num-procs', type=int, default=1, help='Number of processes, 0 starts one per core.')
+    parser.add_argument('--allow-websocket-origin', nargs='+', help='Hosts that can connect to the websocket.')
+    parser.add_argument('--no-warm', action='store_true', help='Compute the shared data on the first sessions.')
+    parser.add_argument('--dev', action='store_true', help='Serve one dashboard in one process and open a browser.')
+    parser.add_argument('--build', metavar='DIRECTORY', help='Save the pages as static files and exit.')
+    parser.add_argument('--force', action='store_true', help='Build every page again, also the current ones.')
+    parser.add_argument('--prerendered', metavar='DIRECTORY', help='Show the current static pages of a build.')
+
+    return parser
 
-if __name__ == '__main__':
-    dashboard = Dashboard(title='SIGMA', panes=panes, modal=modals, btns=btns, home_pane='welcome')
-    dashboard.serve(50046)
 
+def create_dashboard(static=None):
+    """Returns a new dashboard with its own pages, buttons and modal, for one session.
 
+    Keyword arguments:
+        static -- a dictionary of keys and URLs of the static pages to show instead of building the pages.
+    """
+    cc_modal, cc_btn = CreativeCommons().get_contents()
+
+    btns = {key: pn.widgets.Button(name=page.title) for key, page in pages.items()}
+    btns['cc'] = cc_btn
+
+    panes = dict(pages)
+    panes.update({key: partial(static_pane, url) for key, url in (static or {}).items()})
+
+    return Dashboard(title='SIGMA', panes=panes, modal={'cc': cc_modal}, btns=btns, home_pane='welcome')
+
+
+def warm(static=None):
+    """Computes the data that the sessions share, so forked processes inherit it instead of computing it again.
+
+    Keyword arguments:
+        static -- the static pages, their data is not computed.
+    """
+    for key, page in pages.items():
+        if page in WARM_PAGES and key not in (static or {}):
+            page()
+
+
+if __name__.startswith('bokeh'):
+    # panel serve main.py, runs once per session
+    options, _ = get_parser().parse_known_args(sys.argv[1:])
+    static = shared('static_urls', get_static_urls, pages, options.prerendered) if options.prerendered else None
+    create_dashboard(static).servable()
+
+
+if __name__ == '__main__':
+    parser = get_parser()
+    args = parser.parse_args()
 
+    if args.build:
+        print('Saved the pages in {}'.format(build(pages, args.build, args.force)))
+    elif args.dev:
+        create_dashboard().serve(args.port)
+    else:
+        if args.num_procs != 1 and get_stream_settings().get('source') == 'socket':
+            parser.error('A socket stream is bound by one process, serve it with --num-procs 1 or use a file stream.')
+        static = get_static_urls(pages, args.prerendered) if args.prerendered else {}
+        if not args.no_warm:
+            warm(static)
+        pn.serve(lambda: create_dashboard(static).base, port=args.port, address=args.address,
+                 websocket_origin=args.allow_websocket_origin, num_procs=args.num_procs, show=False, title='SIGMA',
+                 static_dirs={ROUTE: args.prerendered} if args.prerendered else {})
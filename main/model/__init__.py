@@ -1,2 +1,18 @@
-from .model import get_column, get_column_barcodes_intervention, get_column_barcodes_baseline, get_dataset
+from .model import get_column, get_columns, get_column_barcodes_intervention, get_column_barcodes_baseline, \
+    get_dataset, cache_info, cache_clear, get_count_index, get_subjects, get_barcodes, iter_dataset, \
+    fold_value_counts, get_spo2_means, get_beta_diversity, get_loader_settings, \
+    get_spo2_cohort, get_ingestor, get_stream_settings, get_stats_settings, get_species_catalog, \
+    get_study_design, get_periods, get_data_paths
 from .abstract import Page
+from .diversity import alpha_diversity, beta_diversity, condensed_index, METRICS, METRIC_NAMES, BETA_METRICS, \
+    BETA_METRIC_NAMES
+from .rarefaction import rarefaction, rarefied_diversity, get_depths
+from .bootstrap import bootstrap_delta
+from .spo2 import SpO2Cohort
+from .periods import StudyDesign, label_periods, PERIODS
+from .counts import CountIndex, SpeciesCatalog
+from .stream import Ingestor, Subscription, RunningStats, running_ttest
+from .stats import compare, ttest, adjust
+from .permutation import permutation_test
+from .decimation import lttb, decimate
+from .diskcache import DiskCache, results as results_cache
@@ -7,8 +7,28 @@ __version__ = '0.1'
 
 from abc import ABC, abstractmethod
 
+from .timing import timed
+
 
 class Page(ABC):
+    """A page of the dashboard with a pane and a button.
+
+    The dashboard creates a page on its first visit, so the title, the name of the button, is a class attribute.
+    The data is the list of data kinds the page is built from, see model.get_data_paths, and prerender tells whether
+    the page still works when it is saved as a static file, see dashboard.prerender.
+
+    The __init__ and get_contents of every page are timing spans, see model.timing.
+    """
+
+    title = ''
+    data = []
+    prerender = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in ['__init__', 'get_contents']:
+            if name in cls.__dict__:
+                setattr(cls, name, timed('{}.{}'.format(cls.__name__, name))(cls.__dict__[name]))
 
     @abstractmethod
     def get_contents(self):
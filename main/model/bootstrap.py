@@ -0,0 +1,106 @@
+"""Module that contains the bootstrap confidence intervals of alpha diversity deltas.
+
+A bootstrap replicate of a sample redraws its reads with replacement, which is a multinomial draw of the number of
+reads of the sample over its relative abundances. The replicates of a sample are drawn in batches as one matrix and
+all metrics are computed for the whole batch at once. The baseline and experiment replicates of a subject are paired
+by their draw number, so the replicates of the delta are the differences of the replicates of both samples.
+
+A replicate has fewer observed taxa than its sample, so the replicates of most metrics are biased. The interval is the
+basic bootstrap interval, which reflects the percentiles of the replicates around the delta, so the bias of the
+replicates moves the interval the other way instead of away from the delta. It can still exclude the delta when the
+replicates are skewed.
+
+Every sample gets its own random stream derived from the seed, so the result does not depend on the number of workers.
+"""
+
+__author__ = ['Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from functools import partial
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .diversity import alpha_diversity, as_csr
+from .diskcache import results
+from .timing import timed
+from .loader import map_ordered
+
+# number of replicates that is drawn at once
+BATCH_SIZE = 250
+
+
+def bootstrap_sample(task: tuple, metrics: List[str], n_draws: int, batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """Returns a n_draws x metrics array with the metrics of the bootstrap replicates of one sample.
+
+    Keyword arguments:
+        task -- the read counts of the observed taxa of the sample and its seed.
+        metrics -- the alpha diversity metrics to compute.
+        n_draws -- the number of replicates.
+        batch_size -- the number of replicates that is drawn at once.
+    """
+    counts, seed = task
+    rng = np.random.default_rng(seed)
+    result = np.full((n_draws, len(metrics)), np.nan)
+
+    total = int(counts.sum())
+    if total == 0:
+        return result
+
+    p = counts / total
+    for start in range(0, n_draws, batch_size):
+        size = min(batch_size, n_draws - start)
+        draws = rng.multinomial(total, p, size=size)
+        result[start:start + size] = alpha_diversity(draws, metrics).to_numpy()
+
+    return result
+
+
+@timed()
+@results.cached(ignore=['workers'])
+def bootstrap_delta(baseline, experiment, metrics: List[str], n_draws: int = 1000, seed: int = 0,
+                    confidence: float = 0.95, index: Optional[Sequence] = None,
+                    workers: Optional[int] = None) -> pd.DataFrame:
+    """Returns the delta between the experiment and the baseline with a basic bootstrap confidence interval.
+
+    The returned DataFrame has the columns sample, metric, delta, lower and upper.
+
+    Keyword arguments:
+        baseline -- a samples x taxa count matrix of the baseline, dense or sparse.
+        experiment -- a samples x taxa count matrix of the experiment, with the samples in the same order.
+        metrics -- the alpha diversity metrics to compute.
+        n_draws -- the number of bootstrap replicates per sample.
+        seed -- the seed of the random streams.
+        confidence -- the coverage of the interval.
+        index -- the labels of the samples.
+        workers -- the size of the process pool, 0 or 1 runs in this process.
+    """
+    matrices = [as_csr(baseline), as_csr(experiment)]
+    n_samples = matrices[0].shape[0]
+    if matrices[1].shape[0] != n_samples:
+        raise ValueError('Expects the same number of baseline and experiment samples.')
+
+    index = list(range(n_samples)) if index is None else list(index)
+    seeds = np.random.SeedSequence(seed).spawn(2 * n_samples)
+
+    # only the observed taxa of a sample are sent to the pool
+    tasks = [(np.asarray(matrix.data[matrix.indptr[i]:matrix.indptr[i + 1]], dtype=np.float64),
+              seeds[period * n_samples + i])
+             for period, matrix in enumerate(matrices) for i in range(n_samples)]
+    samples = map_ordered(partial(bootstrap_sample, metrics=metrics, n_draws=n_draws), tasks, workers, 'process')
+
+    # samples x draws x metrics
+    replicates = np.stack(samples[n_samples:]) - np.stack(samples[:n_samples])
+    observed = (alpha_diversity(matrices[1], metrics).to_numpy() - alpha_diversity(matrices[0], metrics).to_numpy())
+
+    # the basic interval is 2 * delta minus the upper and lower percentile
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(replicates, [tail, 100 - tail], axis=1)
+    lower, upper = 2 * observed - high, 2 * observed - low
+
+    return pd.DataFrame({'sample': np.repeat(index, len(metrics)), 'metric': np.tile(metrics, n_samples),
+                         'delta': observed.ravel(), 'lower': lower.ravel(), 'upper': upper.ravel()})
@@ -0,0 +1,168 @@
+"""Module that contains the in-process cache for parsed data files.
+
+Every page asks the model for the same diary and barcode files, often several times during a single build. The cache
+parses each file once and hands out the parsed frame on later calls, until the file changes on disk.
+
+The frames are shared by all callers and must not be modified, a caller that changes a frame asks for a copy. The
+cache keeps at most max_entries frames, the least recently used frames are dropped first.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from functools import partial
+from typing import Callable, List, Optional, Sequence
+
+import pandas as pd
+
+from .loader import map_ordered
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'currsize'])
+
+# largest number of cached frames
+MAX_ENTRIES = 256
+
+
+def normalize_columns(columns) -> Optional[tuple]:
+    """Returns the requested columns as a hashable tuple, or None when all columns are requested."""
+    if columns is None:
+        return None
+    if isinstance(columns, str):
+        return (columns,)
+
+    return tuple(columns)
+
+
+class FrameCache:
+    """Thread-safe cache of parsed DataFrames.
+
+    An entry is keyed on (path, mtime, size, requested columns), so an entry becomes stale as soon as the file is
+    rewritten. A new version of a file replaces the entries of all its older versions, whatever their columns.
+
+    Keyword arguments:
+        loader -- a function that takes a path and a list of columns (or None) and returns a DataFrame.
+        max_entries -- the largest number of cached frames.
+    """
+
+    def __init__(self, loader: Callable[[os.PathLike, Optional[list]], pd.DataFrame],
+                 max_entries: int = MAX_ENTRIES) -> None:
+        self.loader = loader
+        self.max_entries = max_entries
+
+        # least recently used first
+        self._entries = OrderedDict()
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, path: os.PathLike, columns: Optional[Sequence[str]] = None, copy: bool = False) -> pd.DataFrame:
+        """Returns the parsed file, only reading it when it is not cached or changed on disk.
+
+        Keyword arguments:
+            path -- the path of the file.
+            columns -- the columns to read, None reads all columns.
+            copy -- when False the shared cached frame is returned, which must not be modified by the caller, True
+                    returns a copy that can be modified.
+        """
+        columns = normalize_columns(columns)
+        stat = os.stat(path)
+        slot = (str(path), columns)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        frame = self._lookup(slot, version)
+        if frame is None:
+            # only one thread parses a given file, the others wait for its result
+            with self._slot_lock(slot):
+                frame = self._lookup(slot, version, count=False)
+                if frame is None:
+                    frame = self.loader(path, None if columns is None else list(columns))
+                    with self._lock:
+                        self._store(slot, version, frame)
+
+        return frame.copy() if copy else frame
+
+    def get_many(self, paths: Sequence[os.PathLike], columns: Optional[Sequence[str]] = None, copy: bool = False,
+                 workers: Optional[int] = None, executor: str = 'thread') -> List[pd.DataFrame]:
+        """Returns several parsed files in the order of the paths, parsing the missing files in parallel.
+
+        Keyword arguments:
+            paths -- the paths of the files.
+            columns -- the columns to read, None reads all columns.
+            copy -- when False the shared cached frames are returned, which must not be modified by the caller, True
+                    returns copies that can be modified.
+            workers -- the size of the pool, 0 or 1 reads the files one after another.
+            executor -- "thread" or "process", processes require a picklable loader.
+        """
+        if executor == 'thread':
+            # threads share the cache, so get() already parses every file only once
+            return map_ordered(lambda path: self.get(path, columns, copy), paths, workers, executor)
+
+        paths = list(paths)
+        columns = normalize_columns(columns)
+        slots = [(str(path), columns) for path in paths]
+        versions = [(stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, paths)]
+
+        missing = [i for i, (slot, version) in enumerate(zip(slots, versions)) if self._lookup(slot, version) is None]
+        loader = partial(self.loader, columns=None if columns is None else list(columns))
+        loaded = map_ordered(loader, [paths[i] for i in missing], workers, executor)
+
+        frames = {i: frame for i, frame in zip(missing, loaded)}
+        with self._lock:
+            for i, slot in enumerate(slots):
+                if i not in frames:
+                    frames[i] = self._entries[slot][1]
+            for i in missing:
+                self._store(slots[i], versions[i], frames[i])
+        frames = [frames[i] for i in range(len(slots))]
+
+        return [frame.copy() for frame in frames] if copy else frames
+
+    def info(self) -> CacheInfo:
+        """Returns the hit and miss counters and the number of cached frames."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, len(self._entries))
+
+    def clear(self) -> None:
+        """Removes all cached frames and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._locks.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def _lookup(self, slot: tuple, version: tuple, count: bool = True) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(slot)
+            hit = entry is not None and entry[0] == version
+
+            if count and hit:
+                self._hits += 1
+            elif count:
+                self._misses += 1
+            if hit:
+                self._entries.move_to_end(slot)
+
+            return entry[1] if hit else None
+
+    def _store(self, slot: tuple, version: tuple, frame: pd.DataFrame) -> None:
+        """Adds a frame and drops the older versions of its file and the least recently used frames, with the lock."""
+        for other in [other for other, entry in self._entries.items() if other[0] == slot[0] and entry[0] != version]:
+            del self._entries[other]
+            self._locks.pop(other, None)
+
+        self._entries[slot] = (version, frame)
+        self._entries.move_to_end(slot)
+        while len(self._entries) > self.max_entries:
+            other, _ = self._entries.popitem(last=False)
+            self._locks.pop(other, None)
+
+    def _slot_lock(self, slot: tuple) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(slot, threading.Lock())
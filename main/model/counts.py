@@ -0,0 +1,302 @@
+"""Module that contains the sample x species count index of the sequencing data.
+
+The index is a sparse matrix with one row per barcode and one column per species. It is built once from the per-read
+data, saved next to the parsed data and memory-mapped when it is loaded again, so the pages can read abundances
+without touching the per-read data.
+
+A saved index is never rewritten in place, because older index objects, e.g. of other processes, still map its files.
+Every save writes its arrays to a new version directory and then replaces meta.json, which names the version, so a
+load sees either the old or the new index. The old versions are unlinked, their mapped files stay readable until they
+are closed.
+
+The counts of one species over all barcodes are read from a compressed sparse column copy of the matrix, so looking up
+a species only touches its own counts, however many species there are. SpeciesCatalog searches the species of several
+indexes.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix, csr_matrix, vstack
+
+ARRAYS = ['data', 'indices', 'indptr', 'reads']
+
+
+class CountIndex:
+    """Sparse count matrix of one sequencing period.
+
+    Keyword arguments:
+        matrix -- a barcodes x species matrix with the number of reads.
+        barcodes -- the labels of the rows.
+        species -- the sorted species vocabulary, the labels of the columns.
+        reads -- the total number of reads per barcode, including reads without a species.
+        sources -- the (path, mtime, size) of the files the index was built from.
+    """
+
+    def __init__(self, matrix: csr_matrix, barcodes: list, species: list, reads: np.ndarray,
+                 sources: Optional[list] = None) -> None:
+        self.matrix = matrix
+        self.barcodes = list(barcodes)
+        self.species = np.asarray(species, dtype=object)
+        self.reads = reads
+        self.sources = sources or []
+
+        self.barcode_idx = {barcode: i for i, barcode in enumerate(self.barcodes)}
+        self.species_idx = {name: i for i, name in enumerate(self.species)}
+
+        # species x barcodes lookups, made on the first call of column
+        self.columns: Optional[csc_matrix] = None
+
+    @classmethod
+    def build(cls, frames: Dict[object, pd.Series], sources: Optional[list] = None) -> 'CountIndex':
+        """Builds the index from the species column of every barcode.
+
+        Keyword arguments:
+            frames -- a dictionary of barcodes and the species of each read.
+            sources -- the (path, mtime, size) of the files the frames were read from.
+        """
+        counts = {barcode: species.value_counts() for barcode, species in frames.items()}
+        reads = {barcode: len(species) for barcode, species in frames.items()}
+
+        return cls.from_counts(counts, reads, sources)
+
+    @classmethod
+    def from_counts(cls, counts: Dict[object, pd.Series], reads: Dict[object, int],
+                    sources: Optional[list] = None) -> 'CountIndex':
+        """Builds the index from the species counts of every barcode.
+
+        Keyword arguments:
+            counts -- a dictionary of barcodes and their read counts per species.
+            reads -- a dictionary of barcodes and their total number of reads.
+            sources -- the (path, mtime, size) of the files the counts were made from.
+        """
+        vocabulary = np.array(sorted(set().union(*[c.index for c in counts.values()])), dtype=object)
+
+        indptr = [0]
+        indices = []
+        data = []
+        for c in counts.values():
+            c = c.sort_index()
+            indices.append(np.searchsorted(vocabulary, c.index.to_numpy(dtype=object)))
+            data.append(c.to_numpy(dtype=np.int64))
+            indptr.append(indptr[-1] + len(c))
+
+        matrix = csr_matrix((np.concatenate(data) if data else np.empty(0, dtype=np.int64),
+                             np.concatenate(indices) if indices else np.empty(0, dtype=np.int32),
+                             np.array(indptr)), shape=(len(counts), len(vocabulary)))
+        reads = np.array([reads[barcode] for barcode in counts], dtype=np.int64)
+
+        return cls(matrix, list(counts.keys()), vocabulary.tolist(), reads, sources)
+
+    @classmethod
+    def load(cls, directory) -> 'CountIndex':
+        """Loads a saved index, memory-mapping the arrays."""
+        directory = Path(directory)
+        for attempt in range(2):
+            meta = json.loads(Path(directory, 'meta.json').read_text(encoding='utf8'))
+            # indexes saved before the version directories keep their arrays next to meta.json
+            version = Path(directory, meta.get('version', ''))
+            try:
+                arrays = {name: np.load(Path(version, '{}.npy'.format(name)), mmap_mode='r') for name in ARRAYS}
+                break
+            except FileNotFoundError:
+                # the version was replaced by a save between reading meta.json and the arrays
+                if attempt:
+                    raise
+
+        matrix = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                            shape=(len(meta['barcodes']), len(meta['species'])), copy=False)
+
+        return cls(matrix, meta['barcodes'], meta['species'], arrays['reads'], meta['sources'])
+
+    def save(self, directory) -> None:
+        """Saves the index as .npy arrays in a new version directory and a meta.json file that names it."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        version = Path(tempfile.mkdtemp(prefix='version-', dir=directory))
+
+        arrays = {'data': self.matrix.data, 'indices': self.matrix.indices,
+                  'indptr': self.matrix.indptr, 'reads': self.reads}
+        for name, array in arrays.items():
+            np.save(Path(version, '{}.npy'.format(name)), np.asarray(array))
+
+        meta = {'barcodes': self.barcodes, 'species': self.species.tolist(), 'sources': self.sources,
+                'version': version.name}
+        descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(descriptor, 'w', encoding='utf8') as stream:
+            stream.write(json.dumps(meta))
+        os.replace(temporary, Path(directory, 'meta.json'))
+
+        # the earlier versions are unlinked, not truncated, so their memory maps stay valid
+        for path in directory.iterdir():
+            if path.is_dir() and path.name.startswith('version-') and path != version:
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.suffix == '.npy':
+                path.unlink()
+
+    def counts(self, barcode=None) -> pd.Series:
+        """Returns the read counts per species of a barcode, ordered from most to least prevalent.
+
+        Keyword arguments:
+            barcode -- the barcode of the sample, None sums all barcodes.
+        """
+        values, positions = self._values(barcode)
+        series = pd.Series(values, index=self.species[positions])
+
+        return series.sort_values(ascending=False, kind='mergesort')
+
+    def top(self, barcode=None, n: int = 20) -> pd.Series:
+        """Returns the read counts of the n most prevalent species of a barcode, ordered from most to least prevalent.
+
+        Only the n largest counts are selected and sorted, so the cost does not grow with the number of species.
+        Species with the same count keep the order of the index, apart from a tie at the n-th place.
+
+        Keyword arguments:
+            barcode -- the barcode of the sample, None sums all barcodes.
+            n -- the number of species.
+        """
+        values, positions = self._values(barcode)
+        if n < len(values):
+            selected = np.argpartition(-values, n - 1)[:n] if n > 0 else np.array([], dtype=np.int64)
+        else:
+            selected = np.arange(len(values))
+        selected = selected[np.lexsort((selected, -values[selected]))]
+
+        return pd.Series(values[selected], index=self.species[positions[selected]])
+
+    def _values(self, barcode=None) -> Tuple[np.ndarray, np.ndarray]:
+        # the nonzero counts of a barcode and the positions of their species
+        if barcode is None:
+            totals = np.asarray(self.matrix.sum(axis=0)).ravel()
+            positions = np.flatnonzero(totals)
+            return totals[positions], positions
+
+        i = self.barcode_idx[barcode]
+        start, end = self.matrix.indptr[i], self.matrix.indptr[i + 1]
+
+        return np.asarray(self.matrix.data[start:end]), np.asarray(self.matrix.indices[start:end])
+
+    def column(self, name) -> np.ndarray:
+        """Returns the read counts of a species for every barcode, zeros for a species that is not in the index."""
+        counts = np.zeros(len(self.barcodes), dtype=np.int64)
+        j = self.species_idx.get(name)
+        if j is None:
+            return counts
+
+        if self.columns is None:
+            self.columns = self.matrix.tocsc()
+        start, end = self.columns.indptr[j], self.columns.indptr[j + 1]
+        counts[self.columns.indices[start:end]] = self.columns.data[start:end]
+
+        return counts
+
+    def prevalence(self, name) -> pd.Series:
+        """Returns the fraction of the reads of every barcode that belongs to a species."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return pd.Series(self.column(name) / np.asarray(self.reads), index=self.barcodes)
+
+    def totals(self) -> np.ndarray:
+        """Returns the number of reads of every species over all barcodes."""
+        return np.asarray(self.matrix.sum(axis=0)).ravel()
+
+    def total_reads(self, barcode=None) -> int:
+        """Returns the number of reads of a barcode, including reads without a species."""
+        if barcode is None:
+            return int(np.sum(self.reads))
+
+        return int(self.reads[self.barcode_idx[barcode]])
+
+    def rows(self, barcodes: list) -> csr_matrix:
+        """Returns the rows of the barcodes as a barcodes x species matrix."""
+        return self.matrix[[self.barcode_idx[barcode] for barcode in barcodes]]
+
+    def dense(self) -> np.ndarray:
+        """Returns the count matrix as a dense barcodes x species array."""
+        return self.matrix.toarray()
+
+    def is_current(self, sources: List[list]) -> bool:
+        """Checks if the index was built from the given (path, mtime, size) sources."""
+        return [list(source) for source in self.sources] == [list(source) for source in sources]
+
+
+class SpeciesCatalog:
+    """The species of several count indexes, ordered from most to least reads over all indexes.
+
+    Keyword arguments:
+        indexes -- a dictionary of periods and their count index.
+    """
+
+    def __init__(self, indexes: Dict[str, CountIndex]) -> None:
+        self.indexes = dict(indexes)
+
+        totals = pd.concat([pd.Series(index.totals(), index=index.species) for index in self.indexes.values()])
+        totals = totals.groupby(level=0).sum().sort_values(ascending=False, kind='mergesort')
+        self.species = totals.index.to_numpy(dtype=object)
+        self.reads = totals.to_numpy(dtype=np.int64)
+        self.lower = pd.Series(self.species, dtype=object).str.lower()
+
+    def __len__(self) -> int:
+        return len(self.species)
+
+    def __contains__(self, name) -> bool:
+        return any(name in index.species_idx for index in self.indexes.values())
+
+    def search(self, query: str = '', limit: int = 100) -> List[str]:
+        """Returns at most limit species that contain the query, ignoring case, the most prevalent species first.
+
+        Keyword arguments:
+            query -- a part of the species name, an empty query returns the most prevalent species.
+            limit -- the largest number of species.
+        """
+        query = query.strip().lower()
+        if not query:
+            return self.species[:limit].tolist()
+
+        matches = np.flatnonzero(self.lower.str.contains(query, regex=False).to_numpy(dtype=bool))
+
+        return self.species[matches[:limit]].tolist()
+
+    def prevalence(self, name) -> pd.DataFrame:
+        """Returns the reads of a species and their fraction of all reads per period and barcode.
+
+        The result has the columns period, barcode, count, reads and prevalence.
+        """
+        frames = []
+        for period, index in self.indexes.items():
+            reads = np.asarray(index.reads, dtype=np.int64)
+            counts = index.column(name)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                prevalence = counts / reads
+            frames.append(pd.DataFrame({'period': period, 'barcode': index.barcodes, 'count': counts,
+                                        'reads': reads, 'prevalence': prevalence}))
+
+        return pd.concat(frames, ignore_index=True)
+
+
+def stack_rows(parts: List[Tuple[CountIndex, list]]) -> Tuple[csr_matrix, np.ndarray]:
+    """Returns the rows of several indexes as one matrix over their joint species vocabulary.
+
+    Keyword arguments:
+        parts -- a list of indexes and the barcodes to take from each index.
+    """
+    vocabulary = np.array(sorted(set().union(*[index.species.tolist() for index, _ in parts])), dtype=object)
+
+    blocks = []
+    for index, barcodes in parts:
+        rows = index.rows(barcodes).tocoo()
+        columns = np.searchsorted(vocabulary, index.species)[rows.col]
+        blocks.append(csr_matrix((rows.data, (rows.row, columns)), shape=(len(barcodes), len(vocabulary))))
+
+    return vstack(blocks, format='csr'), vocabulary
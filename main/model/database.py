@@ -0,0 +1,219 @@
+"""Module that contains the optional SQLite backend of the model.
+
+All diaries and reads are stored in one database file with the tables:
+    diary -- one row per diary day, with a 'subject' column.
+    reads -- one row per read, with a 'barcode' number and 'period' column. The 'barcode' labels of the parsed
+             files are stored as 'barcode_label'.
+
+Frames returned by the queries have the same columns as the parsed files.
+
+The reads are indexed on (barcode, period, species) and the diary on (subject, date), so the get_* functions of the
+model become indexed queries and aggregations are computed by SQLite.
+
+The database is built from the parsed files with:
+    cd main
+    python -m model.database
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .store import iter_frame, resolve
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS reads_barcode_period_species ON reads (barcode, period, species)',
+    'CREATE INDEX IF NOT EXISTS diary_subject_date ON diary (subject, date)'
+]
+
+SPO2_COLUMNS = ['spo2_m1_r', 'spo2_m1_l', 'spo2_m2_r', 'spo2_m2_l', 'spo2_m3_r', 'spo2_m3_l']
+
+
+def quote(identifier: str) -> str:
+    """Returns a quoted SQL identifier."""
+    return '"{}"'.format(identifier.replace('"', '""'))
+
+
+def select_list(columns: Optional[List[str]], renames: Optional[Dict[str, str]] = None) -> str:
+    """Returns the select list of the columns, renames maps a column name to its name in the table."""
+    if columns is None:
+        return '*'
+
+    renames = renames or {}
+    return ', '.join('{} AS {}'.format(quote(renames.get(column, column)), quote(column)) for column in columns)
+
+
+def restore_reads(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+    """Returns the reads with the columns of the parsed files."""
+    if columns is not None:
+        return df
+
+    return df.drop(columns=['barcode', 'period']).rename(columns={'barcode_label': 'barcode'})
+
+
+def restore_diary(df: pd.DataFrame, columns: Optional[List[str]]) -> pd.DataFrame:
+    """Returns the diary with the columns of the parsed files."""
+    if columns is not None:
+        return df
+
+    return df.drop(columns=['subject'])
+
+
+READ_RENAMES = {'barcode': 'barcode_label'}
+
+
+class Database:
+    """Read access to the SQLite store, every thread uses its own read-only connection.
+
+    Keyword arguments:
+        path -- the path of the database file.
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = sqlite3.connect('file:{}?mode=ro'.format(self.path.as_posix()), uri=True)
+
+        return self._local.connection
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        return pd.read_sql_query(sql, self.connection, params=params)
+
+    def get_diary(self, subject: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Returns the diary of a subject in the order it was parsed."""
+        sql = 'SELECT {} FROM diary WHERE subject = ? ORDER BY rowid'.format(select_list(columns))
+
+        return restore_diary(self.query(sql, (int(subject),)), columns)
+
+    def get_reads(self, period: str, barcode: Optional[int] = None,
+                  columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Returns the reads of a period, or of one barcode of a period."""
+        select = select_list(columns, READ_RENAMES)
+        if barcode is None:
+            sql = 'SELECT {} FROM reads WHERE period = ? ORDER BY barcode, rowid'.format(select)
+            return restore_reads(self.query(sql, (period,)), columns)
+
+        sql = 'SELECT {} FROM reads WHERE barcode = ? AND period = ? ORDER BY rowid'.format(select)
+        return restore_reads(self.query(sql, (int(barcode), period)), columns)
+
+    def iter_reads(self, period: str, barcode: int, columns: Optional[List[str]] = None,
+                   chunksize: Optional[int] = None, where: Optional[dict] = None) -> Iterator[pd.DataFrame]:
+        """Yields the reads of a barcode in chunks.
+
+        Keyword arguments:
+            period -- "baseline" or "intervention".
+            barcode -- the number of the barcode.
+            columns -- the columns to select, None selects all columns.
+            chunksize -- the number of rows per chunk, None yields all reads as one chunk.
+            where -- a dictionary of columns and the values to keep, evaluated by SQLite.
+        """
+        conditions = ['barcode = ?', 'period = ?']
+        params = [int(barcode), period]
+        for column, values in (where or {}).items():
+            values = list(values)
+            conditions.append('{} IN ({})'.format(quote(READ_RENAMES.get(column, column)),
+                                                  ', '.join('?' * len(values))))
+            params.extend(values)
+
+        sql = 'SELECT {} FROM reads WHERE {} ORDER BY rowid'.format(select_list(columns, READ_RENAMES),
+                                                                    ' AND '.join(conditions))
+        if chunksize is None:
+            yield restore_reads(self.query(sql, tuple(params)), columns)
+        else:
+            for df in pd.read_sql_query(sql, self.connection, params=tuple(params), chunksize=chunksize):
+                yield restore_reads(df, columns)
+
+    def get_subjects(self) -> List[int]:
+        return self.query('SELECT DISTINCT subject FROM diary ORDER BY subject')['subject'].tolist()
+
+    def get_barcodes(self, period: str) -> List[int]:
+        sql = 'SELECT DISTINCT barcode FROM reads WHERE period = ? ORDER BY barcode'
+        return self.query(sql, (period,))['barcode'].tolist()
+
+    def species_counts(self, period: str) -> pd.DataFrame:
+        """Returns the number of reads per barcode and species of a period, with the columns barcode, species, n."""
+        sql = ('SELECT barcode, species, COUNT(*) AS n FROM reads '
+               'WHERE period = ? AND species IS NOT NULL GROUP BY barcode, species')
+
+        return self.query(sql, (period,))
+
+    def read_totals(self, period: str) -> pd.Series:
+        """Returns the number of reads per barcode of a period, including reads without a species."""
+        sql = 'SELECT barcode, COUNT(*) AS n FROM reads WHERE period = ? GROUP BY barcode'
+
+        return self.query(sql, (period,)).set_index('barcode')['n']
+
+    def spo2_means(self) -> pd.DataFrame:
+        """Returns the mean SpO2 per subject with and without a mask, with the columns subject, masktype, mean.
+
+        The measurements are rounded to two decimals and a day only counts when all six measurements are present,
+        like the daily mean of the SpO2 page.
+        """
+        day_mean = '({}) / 6.0'.format(' + '.join('ROUND({}, 2)'.format(quote(column)) for column in SPO2_COLUMNS))
+        sql = ("SELECT subject, CASE WHEN masktype = 'None' THEN 'None' ELSE 'surgical' END AS masktype, "
+               "AVG({}) AS mean FROM diary GROUP BY 1, 2 ORDER BY 1, 2").format(day_mean)
+
+        return self.query(sql)
+
+
+def build(path, diaries: Dict[int, Path], barcodes: Dict[str, Dict[int, Path]], chunksize: int = 100000) -> None:
+    """Builds the database from the parsed files, replacing an existing database.
+
+    Keyword arguments:
+        path -- the path of the database file.
+        diaries -- a dictionary of subjects and the paths of their diaries.
+        barcodes -- a dictionary of periods and dictionaries of barcodes and the paths of their reads.
+        chunksize -- the number of reads that is inserted at once.
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+
+    with sqlite3.connect(path) as connection:
+        for subject, diary in diaries.items():
+            for df in iter_frame(resolve(diary)):
+                df = df.loc[:, ~df.columns.str.startswith('Unnamed:')]
+                df.insert(0, 'subject', subject)
+                df.to_sql('diary', connection, if_exists='append', index=False)
+
+        for period, paths in barcodes.items():
+            for barcode, reads in paths.items():
+                for df in iter_frame(resolve(reads), chunksize=chunksize):
+                    df = df.loc[:, ~df.columns.str.startswith('Unnamed:')]
+                    # the barcode column of the files holds labels such as 'barcode01'
+                    df = df.rename(columns={'barcode': 'barcode_label'})
+                    df.insert(0, 'barcode', barcode)
+                    df.insert(1, 'period', period)
+                    df.to_sql('reads', connection, if_exists='append', index=False)
+
+        for sql in INDEXES:
+            connection.execute(sql)
+
+
+if __name__ == '__main__':
+    from .model import config, root_path, subjects, barcodes_baseline, barcodes_intervention
+
+    parser = argparse.ArgumentParser(description="Build the SQLite store from the parsed files.")
+    parser.add_argument('-o', '--output', default=Path(root_path, config.get('database') or 'data/sigma.sqlite'),
+                        help='Path of the database file, defaults to the database in config.yaml.')
+
+    args = parser.parse_args()
+
+    build(args.output, dict(subjects), {'baseline': dict(barcodes_baseline),
+                                        'intervention': dict(barcodes_intervention)})
+    print(args.output)
@@ -0,0 +1,95 @@
+"""Module that contains the decimation of long time series for the plots.
+
+A plot never needs more points than it has pixels. A series with more points than MAX_POINTS is reduced with
+largest-triangle-three-buckets (LTTB), which keeps the first and last point and from every bucket in between the point
+that forms the largest triangle with the point kept from the previous bucket and the mean of the next bucket. Peaks
+and dips survive the reduction, unlike with every n-th point.
+
+Only the points in the visible x range are decimated. The plots of the dashboard query the points of a series again
+after every zoom or pan, see dashboard.decimation.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# largest number of points of a series that is sent to the browser
+MAX_POINTS = 1000
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int = MAX_POINTS) -> np.ndarray:
+    """Returns the sorted indices of the n_out points that largest-triangle-three-buckets keeps of a series.
+
+    Keyword arguments:
+        x -- the sorted x values as numbers.
+        y -- the y values without missing values.
+        n_out -- the number of points to keep, at least 3.
+    """
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError('Expects n_out of at least 3.')
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # the first and last point are buckets of their own, the other points are split over n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x, next_y = mean_x[i + 1], mean_y[i + 1]
+        # twice the area of the triangles between the last kept point, the candidates and the mean of the next bucket
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[i + 1] = a
+
+    return kept
+
+
+def to_numbers(x) -> np.ndarray:
+    """Returns x as floats, dates become milliseconds since the epoch like the ranges of a datetime axis."""
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return (x - pd.Timestamp(0)).dt.total_seconds().to_numpy() * 1000
+
+    return x.to_numpy(dtype=np.float64)
+
+
+def decimate(x: np.ndarray, y: np.ndarray, start: Optional[float] = None, end: Optional[float] = None,
+             n_out: int = MAX_POINTS) -> np.ndarray:
+    """Returns the indices of at most n_out points of the series between start and end.
+
+    The points just outside the range are kept so lines continue to the edges of the plot. Missing values are left out
+    when a series is decimated.
+
+    Keyword arguments:
+        x -- the sorted x values as numbers, see to_numbers.
+        y -- the y values.
+        start -- the start of the visible range, None for the first point.
+        end -- the end of the visible range, None for the last point.
+        n_out -- the largest number of points.
+    """
+    low = 0 if start is None else max(int(np.searchsorted(x, start, side='left')) - 1, 0)
+    high = len(x) if end is None else min(int(np.searchsorted(x, end, side='right')) + 1, len(x))
+    indices = np.arange(low, high)
+    if len(indices) <= n_out:
+        return indices
+
+    indices = indices[~np.isnan(y[low:high])]
+
+    return indices[lttb(x[indices], y[indices], n_out)]
@@ -0,0 +1,251 @@
+"""Module that contains the on-disk cache of computed results, e.g. bootstrap intervals and permutation tests.
+
+The result of a call is stored under a key that is the hash of the function, the sources of the modules of its
+package, the versions of numpy and pandas and the contents of its arguments. A DataFrame, array or sparse matrix is
+hashed by its values, so a call with the same data finds the result of an earlier call, also in another process or
+after a restart. A function of the model calls other modules of the model, e.g. bootstrap_delta calls diversity, so a
+change of any module of its package makes its old results unreachable, they are evicted in time.
+
+Every result is a pickle file in the directory of the cache. A file is written to a temporary file first and then
+renamed, so a reader never sees a partial file. A hit touches the file, and when the files take more than max_size
+bytes the least recently used files are removed.
+
+Arguments that do not change the result, e.g. the number of workers, are left out of the key with ignore. A call with
+an argument that cannot be hashed is not cached.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .cache import CacheInfo
+
+# largest size of the files of a cache in bytes
+MAX_SIZE = 256 * 1024 * 1024
+SUFFIX = '.pkl'
+
+
+def update_hash(digest, value) -> None:
+    """Adds the type and contents of a value to a hashlib digest, raises TypeError for values that cannot be hashed."""
+    digest.update(type(value).__name__.encode('utf8'))
+
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, np.generic)):
+        digest.update(repr(value).encode('utf8'))
+    elif isinstance(value, (list, tuple)):
+        digest.update(str(len(value)).encode('ascii'))
+        for item in value:
+            update_hash(digest, item)
+    elif isinstance(value, dict):
+        digest.update(str(len(value)).encode('ascii'))
+        for key in sorted(value, key=repr):
+            update_hash(digest, key)
+            update_hash(digest, value[key])
+    elif isinstance(value, np.ndarray):
+        if value.dtype == object:
+            update_hash(digest, value.tolist())
+        else:
+            digest.update('{}{}'.format(value.dtype.str, value.shape).encode('ascii'))
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif sparse.issparse(value):
+        matrix = sparse.csr_matrix(value, copy=True)
+        matrix.sort_indices()
+        update_hash(digest, (matrix.shape, matrix.data, matrix.indices, matrix.indptr))
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        update_hash(digest, (value.shape, [str(dtype) for dtype in np.atleast_1d(value.dtypes)],
+                             list(getattr(value, 'columns', [value.name]))))
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        update_hash(digest, value.to_numpy())
+    else:
+        raise TypeError('Cannot hash a value of type {}.'.format(type(value).__name__))
+
+
+def code_version(func: Callable, version: str = '') -> str:
+    """Returns the hash of a function, the sources of the modules of its package and the versions of numpy and pandas.
+
+    The modules of the package are the .py files in the directory of the module of the function.
+    """
+    digest = hashlib.sha256()
+    update_hash(digest, [func.__module__, func.__qualname__, version, np.__version__, pd.__version__])
+    try:
+        for path in sorted(Path(inspect.getsourcefile(func)).parent.glob('*.py')):
+            update_hash(digest, path.name)
+            digest.update(path.read_bytes())
+    except (OSError, TypeError):
+        digest.update(func.__code__.co_code)
+
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Cache of pickled results in a directory, with least recently used eviction above a size.
+
+    A cache without a directory calls the functions without caching, see configure.
+
+    Keyword arguments:
+        directory -- the directory of the pickle files, None disables the cache.
+        max_size -- the largest size of the files in bytes.
+    """
+
+    def __init__(self, directory=None, max_size: int = MAX_SIZE) -> None:
+        self.directory = None if directory is None else Path(directory)
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def configure(self, directory=None, max_size: int = MAX_SIZE) -> None:
+        """Sets the directory and size of the cache, None disables the cache."""
+        self.directory = None if directory is None else Path(directory)
+        self.max_size = max_size
+
+    def path(self, key: str) -> Path:
+        return Path(self.directory, key + SUFFIX)
+
+    def get(self, key: str) -> Tuple[bool, object]:
+        """Returns whether the key was found and its result, an unreadable file is removed."""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as stream:
+                value = pickle.load(stream)
+        except FileNotFoundError:
+            return False, None
+        except Exception:
+            # written by another version of a library or damaged, it is computed again
+            self.remove(path)
+            return False, None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return True, value
+
+    def set(self, key: str, value) -> None:
+        """Writes the result of a key and evicts the least recently used results above the size of the cache."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                pickle.dump(value, stream, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            self.remove(temporary)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used results until the files take at most max_size bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self) -> None:
+        """Removes all results of the cache."""
+        if self.directory is not None and self.directory.exists():
+            for path in self.directory.glob('*' + SUFFIX):
+                self.remove(path)
+
+    def info(self) -> CacheInfo:
+        """Returns the hits and misses of this process and the number of results on disk."""
+        size = len(list(self.directory.glob('*' + SUFFIX))) if self.directory is not None and \
+            self.directory.exists() else 0
+
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, size)
+
+    def cached(self, version: str = '', ignore: Sequence[str] = ()) -> Callable:
+        """Returns a decorator that keeps the results of a function in this cache.
+
+        Keyword arguments:
+            version -- a version of the function, change it when a result changes without a change of its package.
+            ignore -- the arguments that do not change the result, e.g. workers.
+        """
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+            code = code_version(func, version)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self.directory is None:
+                    return func(*args, **kwargs)
+
+                key = self.make_key(signature, code, ignore, args, kwargs)
+                if key is None:
+                    return func(*args, **kwargs)
+
+                found, value = self.get(key)
+                with self._lock:
+                    if found:
+                        self._hits += 1
+                    else:
+                        self._misses += 1
+                if found:
+                    return value
+
+                value = func(*args, **kwargs)
+                self.set(key, value)
+
+                return value
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def make_key(signature: inspect.Signature, code: str, ignore: Sequence[str], args, kwargs) -> Optional[str]:
+        """Returns the key of a call, or None when an argument cannot be hashed."""
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+
+        digest = hashlib.sha256(code.encode('ascii'))
+        try:
+            update_hash(digest, {name: value for name, value in bound.arguments.items() if name not in ignore})
+        except TypeError:
+            return None
+
+        return digest.hexdigest()
+
+
+# the cache of the model, its directory is set from config.yaml by model.model
+results = DiskCache()
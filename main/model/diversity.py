@@ -0,0 +1,232 @@
+"""Module that contains the alpha and beta diversity engines.
+
+All metrics are computed for every sample of a samples x taxa count matrix at once. The matrix is handled in sparse
+form, so the cost grows with the number of observed taxa and not with the size of the vocabulary.
+
+The alpha diversity definitions follow scikit-bio:
+    simpson -- 1 - sum(p^2).
+    shannon -- -sum(p * log2(p)).
+    observed -- the number of observed taxa.
+    chao1 -- bias-corrected Chao1, S_obs + F1 * (F1 - 1) / (2 * (F2 + 1)).
+    pielou_e -- Pielou's evenness, the natural Shannon entropy divided by ln(S_obs).
+    goods_coverage -- 1 - F1 / N.
+where p are the relative abundances, F1 and F2 the number of singletons and doubletons and N the number of reads.
+
+The beta diversity distances between two samples x and y are:
+    braycurtis -- sum(|x - y|) / sum(x + y).
+    jaccard -- 1 - |X and Y| / |X or Y|, with X and Y the observed taxa.
+    aitchison -- the Euclidean distance between the centred log-ratios of x + 1 and y + 1.
+"""
+
+__author__ = ['Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix, issparse
+from scipy.spatial.distance import pdist
+
+METRICS = ['simpson', 'shannon', 'observed', 'chao1', 'pielou_e', 'goods_coverage']
+
+METRIC_NAMES = {
+    'simpson': 'Simpsons Diversity Index',
+    'shannon': 'Shannon Diversity Index',
+    'observed': 'Observed Richness',
+    'chao1': 'Chao1 Richness Estimator',
+    'pielou_e': 'Pielou Evenness',
+    'goods_coverage': "Good's Coverage"
+}
+
+
+BETA_METRICS = ['braycurtis', 'jaccard', 'aitchison']
+
+BETA_METRIC_NAMES = {
+    'braycurtis': 'Bray-Curtis Dissimilarity',
+    'jaccard': 'Jaccard Distance',
+    'aitchison': 'Aitchison Distance'
+}
+
+# number of taxa that is made dense at once for the Bray-Curtis distance
+BLOCK_SIZE = 2048
+
+
+def as_csr(counts) -> csr_matrix:
+    """Returns the counts as a CSR matrix without explicit zeros."""
+    matrix = csr_matrix(counts) if not issparse(counts) else counts.tocsr()
+    if matrix.nnz and np.any(matrix.data == 0):
+        matrix = matrix.copy()
+        matrix.eliminate_zeros()
+
+    return matrix
+
+
+def alpha_diversity(counts, metrics: Optional[List[str]] = None, index: Optional[Sequence] = None) -> pd.DataFrame:
+    """Returns a DataFrame with one row per sample and one column per metric.
+
+    Keyword arguments:
+        counts -- a samples x taxa count matrix, dense or sparse.
+        metrics -- the metrics to compute, defaults to all metrics.
+        index -- the labels of the samples.
+    """
+    metrics = METRICS if metrics is None else metrics
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise ValueError('Expects metrics from: {}'.format(', '.join(METRICS)))
+
+    matrix = as_csr(counts)
+    n_samples = matrix.shape[0]
+    # row of every stored value
+    rows = np.repeat(np.arange(n_samples), np.diff(matrix.indptr))
+    data = np.asarray(matrix.data, dtype=np.float64)
+
+    def per_sample(values):
+        return np.bincount(rows, weights=values, minlength=n_samples)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = per_sample(data)
+        p = data / total[rows]
+        observed = np.bincount(rows, minlength=n_samples).astype(np.float64)
+        singles = per_sample((data == 1).astype(np.float64))
+        doubles = per_sample((data == 2).astype(np.float64))
+        entropy = -per_sample(p * np.log(p))
+
+        results = {
+            'simpson': 1 - per_sample(p ** 2),
+            'shannon': entropy / np.log(2),
+            'observed': observed,
+            'chao1': observed + singles * (singles - 1) / (2 * (doubles + 1)),
+            'pielou_e': entropy / np.log(observed),
+            'goods_coverage': 1 - singles / total
+        }
+
+    df = pd.DataFrame({metric: results[metric] for metric in metrics}, index=index)
+    # metrics are undefined for samples without reads
+    df.loc[total == 0, [metric for metric in metrics if metric != 'observed']] = np.nan
+
+    return df
+
+
+def condense(square: np.ndarray) -> np.ndarray:
+    """Returns the upper triangle of a square distance matrix in the order of scipy's pdist."""
+    i, j = np.triu_indices(square.shape[0], k=1)
+    return square[i, j]
+
+
+def braycurtis(matrix: csr_matrix) -> np.ndarray:
+    # sum(|x - y|) is a sum over the taxa, so it is accumulated over blocks of taxa
+    n_taxa = matrix.shape[1]
+    matrix = matrix.tocsc()
+    numerator = np.zeros(matrix.shape[0] * (matrix.shape[0] - 1) // 2)
+    for start in range(0, n_taxa, BLOCK_SIZE):
+        block = matrix[:, start:start + BLOCK_SIZE].toarray().astype(np.float64)
+        numerator += pdist(block, 'cityblock')
+
+    total = np.asarray(matrix.sum(axis=1), dtype=np.float64).ravel()
+    denominator = condense(total[:, None] + total[None, :])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator / denominator
+
+
+def jaccard(matrix: csr_matrix) -> np.ndarray:
+    present = matrix.copy()
+    present.data = np.ones_like(present.data, dtype=np.float64)
+    observed = np.asarray(present.sum(axis=1)).ravel()
+
+    intersection = condense((present @ present.T).toarray())
+    union = condense(observed[:, None] + observed[None, :]) - intersection
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - intersection / union
+
+
+def aitchison(matrix: csr_matrix) -> np.ndarray:
+    # log(x + 1) is zero where x is zero, so it stays sparse. For the centred log-ratios c = l - mean(l):
+    # |c_x - c_y|^2 = |l_x - l_y|^2 - D * (mean(l_x) - mean(l_y))^2
+    n_taxa = matrix.shape[1]
+    logs = matrix.astype(np.float64)
+    logs.data = np.log1p(logs.data)
+
+    squares = np.asarray(logs.multiply(logs).sum(axis=1)).ravel()
+    means = np.asarray(logs.sum(axis=1)).ravel() / n_taxa
+    gram = (logs @ logs.T).toarray()
+
+    distance = squares[:, None] + squares[None, :] - 2 * gram - n_taxa * (means[:, None] - means[None, :]) ** 2
+
+    return np.sqrt(np.clip(condense(distance), 0, None))
+
+
+def beta_diversity(counts, metric: str) -> np.ndarray:
+    """Returns the condensed distance matrix between all samples, in the order of scipy's pdist.
+
+    Keyword arguments:
+        counts -- a samples x taxa count matrix, dense or sparse.
+        metric -- one of "braycurtis", "jaccard", "aitchison".
+    """
+    if metric not in BETA_METRICS:
+        raise ValueError('Expects one of the values: {}'.format(', '.join(BETA_METRICS)))
+
+    functions = {
+        'braycurtis': braycurtis,
+        'jaccard': jaccard,
+        'aitchison': aitchison
+    }
+
+    return functions[metric](as_csr(counts))
+
+
+def fingerprint(matrix: csr_matrix, *parts) -> str:
+    """Returns a hash of a sparse matrix and extra parts such as the metric."""
+    matrix = as_csr(matrix).sorted_indices()
+    digest = hashlib.sha256()
+    digest.update(np.asarray(matrix.shape, dtype=np.int64).tobytes())
+    for array in [matrix.indptr, matrix.indices]:
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(matrix.data, dtype=np.float64).tobytes())
+    for part in parts:
+        digest.update(str(part).encode('utf8'))
+
+    return digest.hexdigest()
+
+
+def cached_beta_diversity(counts, metric: str, directory) -> np.ndarray:
+    """Returns the condensed distance matrix, reading it from a directory when the same counts were seen before.
+
+    Keyword arguments:
+        counts -- a samples x taxa count matrix, dense or sparse.
+        metric -- one of "braycurtis", "jaccard", "aitchison".
+        directory -- the directory with the cached matrices, named after the hash of the counts and metric.
+    """
+    path = Path(directory, '{}.npy'.format(fingerprint(counts, metric)))
+    if path.exists():
+        return np.load(path, mmap_mode='r')
+
+    condensed = beta_diversity(counts, metric)
+
+    # a unique temporary file, so processes that compute the same matrix do not write into each other's file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(descriptor, 'wb') as stream:
+            np.save(stream, condensed)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+    return condensed
+
+
+def condensed_index(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Returns the positions of the pairs (i, j), with i != j, in a condensed matrix of n samples."""
+    i, j = np.minimum(i, j), np.maximum(i, j)
+    return n * i - i * (i + 1) // 2 + j - i - 1
@@ -0,0 +1,39 @@
+"""Module that contains the parallel file loader of the model.
+
+Reading and parsing a file is independent of all other files, so a list of files can be fanned out over a pool of
+threads or processes. The results are always returned in the order of the input.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor
+}
+
+
+def map_ordered(func: Callable, items: Iterable, workers: Optional[int] = None, executor: str = 'thread') -> List:
+    """Applies a function to every item in a pool and returns the results in the order of the items.
+
+    Keyword arguments:
+        func -- the function to apply, it must be picklable when processes are used.
+        items -- the items, e.g. file paths.
+        workers -- the size of the pool, 0 or 1 runs serially, None lets the executor decide.
+        executor -- "thread" or "process".
+    """
+    if executor not in EXECUTORS:
+        raise ValueError('Expects executor "thread" or "process".')
+
+    items = list(items)
+    if (workers is not None and workers <= 1) or len(items) <= 1:
+        return [func(item) for item in items]
+
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        return list(pool.map(func, items))
@@ -14,20 +14,32 @@ __copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
 __license__ = 'Apache 2.0'
 __version__ = '0.1'
 
+import os
+import threading
 from pathlib import Path
 
 import yaml
 import pandas as pd
-import numpy as np
+
+from .cache import FrameCache
+from .diskcache import results
+from .timing import span, timed
+from .store import read_frame, resolve, iter_frame
+from .counts import CountIndex, SpeciesCatalog, stack_rows
+from .diversity import cached_beta_diversity
+from .registry import Registry
+from .database import Database, SPO2_COLUMNS
+from .spo2 import SpO2Cohort
+from .periods import StudyDesign, label_periods
+from .stream import Ingestor
+
+CHUNKSIZE = 100000
 
 cwd = str(Path.cwd())
 root_idx = cwd.index('main')
 root_path = cwd[:root_idx + len('main')]
 
-N = 5
-BARCODES = np.arange(1, N + 1, 1)
-
-with open(Path(root_path, 'config.yaml'), 'r') as stream:
+with span('config.yaml'), open(Path(root_path, 'config.yaml'), 'r') as stream:
     config = yaml.safe_load(stream)
 
 
@@ -52,70 +64,439 @@ def path_to_intervention_barcodes(config, root_path, subject_file):
     return path
 
 
-subjects = {
-    1: path_to_diary(config, root_path, 'subject_1.csv'),
-    2: path_to_diary(config, root_path, 'subject_2.csv'),
-    3: path_to_diary(config, root_path, 'subject_3.csv'),
-    4: path_to_diary(config, root_path, 'subject_4.csv'),
-    5: path_to_diary(config, root_path, 'subject_5.csv')
-}
+def make_registry(directory, prefix, column):
+    """Returns a registry of the numbered files in a directory, or of a manifest column when a manifest is configured.
+    """
+    if config.get('manifest'):
+        return Registry.from_manifest(Path(root_path, config['manifest']), column, root_path)
 
-barcodes_baseline = {
-    1: path_to_baseline_barcodes(config, root_path, 'barcode01.csv'),
-    2: path_to_baseline_barcodes(config, root_path, 'barcode02.csv'),
-    3: path_to_baseline_barcodes(config, root_path, 'barcode03.csv'),
-    4: path_to_baseline_barcodes(config, root_path, 'barcode04.csv'),
-    5: path_to_baseline_barcodes(config, root_path, 'barcode05.csv')
-}
+    return Registry.from_directory(directory, prefix)
 
-barcodes_intervention = {
-    1: path_to_intervention_barcodes(config, root_path, 'barcode01.csv'),
-    2: path_to_intervention_barcodes(config, root_path, 'barcode02.csv'),
-    3: path_to_intervention_barcodes(config, root_path, 'barcode03.csv'),
-    4: path_to_intervention_barcodes(config, root_path, 'barcode04.csv'),
-    5: path_to_intervention_barcodes(config, root_path, 'barcode05.csv')
-}
 
+subjects = make_registry(path_to_diary(config, root_path, ''), 'subject_', 'diary')
+barcodes_baseline = make_registry(path_to_baseline_barcodes(config, root_path, ''), 'barcode', 'baseline')
+barcodes_intervention = make_registry(path_to_intervention_barcodes(config, root_path, ''), 'barcode', 'intervention')
 
-def get_column(subject, column=None):
-    df_diary = pd.read_csv(subjects[subject])
-    if column != None:
-        selected = df_diary[column]
+
+# the parsed files are shared by all callers of the functions below and must not be modified
+cache = FrameCache(read_frame)
+
+# the SQLite store replaces the parsed files when it is configured
+database = Database(Path(root_path, config['database'])) if config.get('database') else None
+
+# the bootstrap, rarefaction and permutation results are kept on disk, so a restart or another process reuses them
+results_settings = config.get('results_cache') or {}
+if results_settings.get('enabled', True):
+    results.configure(Path(root_path, config['datadir'], 'cache', 'results'),
+                      int(results_settings.get('max_size', 256)) * 1024 * 1024)
+
+
+def get_loader_settings(workers=None, executor=None):
+    settings = config.get('loader') or {}
+
+    return {
+        'workers': settings.get('workers') if workers is None else workers,
+        'executor': settings.get('executor', 'thread') if executor is None else executor
+    }
+
+
+def get_stats_settings():
+    """Returns the keyword arguments of compare for the test engine in config.yaml, the t-test without one.
+
+    A permutation test uses the process pool of the loader workers.
+    """
+    settings = config.get('stats') or {}
+    if settings.get('engine', 'ttest') != 'permutation':
+        return {'engine': 'ttest'}
+
+    return {
+        'engine': 'permutation',
+        'n_permutations': settings.get('permutations', 100000),
+        'seed': settings.get('seed', 0),
+        'workers': get_loader_settings()['workers']
+    }
+
+
+def get_stream_settings():
+    """Returns the stream block of config.yaml, empty without a stream."""
+    return config.get('stream') or {}
+
+
+def get_ingestor():
+    """Returns an Ingestor that reads the live SpO2 readings of the stream in config.yaml, or None without a stream.
+
+    The sources are started on the call, a process creates one ingestor for all its sessions, see dashboard.state.
+    """
+    settings = get_stream_settings()
+    source = settings.get('source')
+    if source is None:
+        return None
+
+    ingestor = Ingestor()
+    if source == 'file':
+        ingestor.add_file(Path(root_path, settings.get('file', 'data/stream/readings.jsonl')))
+    elif source == 'socket':
+        ingestor.add_socket(settings.get('host', 'localhost'), settings.get('port', 50050))
+    elif source == 'simulator':
+        ingestor.add_simulator(get_subjects(), settings.get('interval', 1.0))
     else:
-        selected = df_diary
-    return selected
+        raise ValueError('Expects stream source "file", "socket" or "simulator".')
 
+    return ingestor
 
-def get_column_barcodes_baseline(barcode, column=None):
-    df_barcode = pd.read_csv(barcodes_baseline[barcode])
+
+def cache_info():
+    """Returns the hits, misses and size of the DataFrame cache."""
+    return cache.info()
+
+
+def cache_clear():
+    """Removes all parsed files from the DataFrame cache."""
+    cache.clear()
+
+
+def as_list(column):
+    if isinstance(column, str):
+        return [column]
+
+    return column
+
+
+def select(df, column=None):
     if column != None:
-        selected = df_barcode[column]
+        selected = df[column]
     else:
-        selected = df_barcode
+        selected = df
     return selected
 
 
-def get_dataset(period):
+def select_column(path, column=None):
+    return select(cache.get(resolve(path), column), column)
+
+
+def select_reads(period, barcode, column=None):
+    if database is not None:
+        return select(database.get_reads(period, barcode, as_list(column)), column)
+
+    return select_column(get_period_paths(period)[barcode], column)
+
+
+def get_column(subject, column=None):
+    if database is not None:
+        return select(database.get_diary(subject, as_list(column)), column)
+
+    return select_column(subjects[subject], column)
+
+
+def get_column_barcodes_baseline(barcode, column=None):
+    return select_reads('baseline', barcode, column)
+
+
+def get_data_paths(kinds):
+    """Returns the files that the data of the kinds is read from, with config.yaml when any data is read.
+
+    Keyword arguments:
+        kinds -- a list of "diaries" and "barcodes".
+    """
+    if not kinds:
+        return []
+
+    paths = [Path(root_path, 'config.yaml')]
+    if database is not None:
+        return paths + [Path(database.path)]
+
+    if 'diaries' in kinds:
+        paths.extend(resolve(path) for path in subjects.values())
+    if 'barcodes' in kinds:
+        for period in ['baseline', 'intervention']:
+            paths.extend(resolve(path) for path in get_period_paths(period).values())
+
+    return paths
+
+
+def get_subjects():
+    """Returns the numbers of the subjects with a diary."""
+    if database is not None:
+        return database.get_subjects()
+
+    return list(subjects)
+
+
+def get_barcodes(period=None):
+    """Returns the barcodes of a period, or the barcodes present in both periods when no period is given."""
+    if period is None:
+        intervention = set(get_barcodes('intervention'))
+        return [barcode for barcode in get_barcodes('baseline') if barcode in intervention]
+
+    if database is not None:
+        check_period(period)
+        return database.get_barcodes(period)
+
+    return list(get_period_paths(period))
+
+
+def check_period(period):
     if period not in ['baseline', 'intervention']:
         raise ValueError('Expects period "baseline" or "intervention".')
 
-    collection = []
-    for barcode in BARCODES:
 
-        if period == 'baseline':
-            df = pd.read_csv(barcodes_baseline[barcode])
-        else:
-            df = pd.read_csv(barcodes_intervention[barcode])
+def get_period_paths(period):
+    check_period(period)
 
-        collection.append(df)
+    return barcodes_baseline if period == 'baseline' else barcodes_intervention
+
+
+@timed()
+def get_dataset(period, workers=None, executor=None):
+    """Returns the data of all barcodes of a period, the files are read in parallel.
+
+    Keyword arguments:
+        period -- "baseline" or "intervention".
+        workers -- the size of the pool, defaults to the loader settings in config.yaml.
+        executor -- "thread" or "process", defaults to the loader settings in config.yaml.
+    """
+    if database is not None:
+        check_period(period)
+        return database.get_reads(period)
+
+    paths = [resolve(path) for path in get_period_paths(period).values()]
+    collection = cache.get_many(paths, **get_loader_settings(workers, executor))
 
     return pd.concat(collection)
 
 
-def get_column_barcodes_intervention(barcode, column=None):
-    df_barcode = pd.read_csv(barcodes_intervention[barcode])
+@timed()
+def get_columns(subject_numbers, column=None, workers=None, executor=None):
+    """Returns a dictionary of subjects and their diary data, the files are read in parallel.
+
+    Keyword arguments:
+        subject_numbers -- the subjects to read.
+        column -- the column or columns to select, None selects all columns.
+        workers -- the size of the pool, defaults to the loader settings in config.yaml.
+        executor -- "thread" or "process", defaults to the loader settings in config.yaml.
+    """
+    subject_numbers = list(subject_numbers)
+    if database is not None:
+        return {subject: get_column(subject, column) for subject in subject_numbers}
+
+    paths = [resolve(subjects[subject]) for subject in subject_numbers]
+    frames = cache.get_many(paths, column, **get_loader_settings(workers, executor))
+
     if column != None:
-        selected = df_barcode[column]
-    else:
-        selected = df_barcode
-    return selected
+        frames = [df[column] for df in frames]
+
+    return dict(zip(subject_numbers, frames))
+
+
+def get_column_barcodes_intervention(barcode, column=None):
+    return select_reads('intervention', barcode, column)
+
+
+def iter_dataset(period, columns=None, barcodes=None, chunksize=None, where=None):
+    """Yields the data of a period without loading it at once, per barcode or in chunks of a fixed number of rows.
+
+    The files are streamed from disk and not kept in the cache. With the SQLite store the predicates are evaluated by
+    SQLite.
+
+    Keyword arguments:
+        period -- "baseline" or "intervention".
+        columns -- the columns to read, None reads all columns.
+        barcodes -- the barcodes to read, the files of other barcodes are skipped.
+        chunksize -- the number of rows per chunk, None yields one frame per barcode.
+        where -- a dictionary of columns and the values to keep, e.g. {'species': {'Cutibacterium acnes'}}.
+    """
+    paths = get_period_paths(period)
+    where = where or {}
+
+    read_columns = columns
+    if columns is not None:
+        read_columns = list(columns) + [column for column in where if column not in columns]
+
+    for barcode in get_barcodes(period):
+        if barcodes is not None and barcode not in barcodes:
+            continue
+
+        if database is not None:
+            chunks = database.iter_reads(period, barcode, read_columns, chunksize, where)
+        else:
+            chunks = iter_frame(resolve(paths[barcode]), read_columns, chunksize)
+
+        for chunk in chunks:
+            for column, values in where.items():
+                chunk = chunk[chunk[column].isin(values)]
+            if where and chunk.empty:
+                continue
+            if columns is not None:
+                chunk = chunk[columns]
+
+            yield chunk
+
+
+def fold_value_counts(period, column, **kwargs):
+    """Returns the value counts of a column of a period, counted chunk by chunk so only one chunk is in memory.
+
+    Keyword arguments:
+        period -- "baseline" or "intervention".
+        column -- the column to count.
+        kwargs -- the barcodes, chunksize and where arguments of iter_dataset.
+    """
+    kwargs.setdefault('chunksize', CHUNKSIZE)
+    total = pd.Series(dtype='int64')
+
+    for chunk in iter_dataset(period, [column], **kwargs):
+        total = total.add(chunk[column].value_counts(), fill_value=0)
+
+    return total.astype('int64').sort_values(ascending=False, kind='mergesort')
+
+
+count_indexes = {}
+count_lock = threading.Lock()
+
+
+@timed()
+def get_count_index(period):
+    """Returns the barcode x species count index of a period.
+
+    The index is saved in a counts/ directory next to the parsed barcode files and only rebuilt when those files
+    change. With the SQLite store the counts are aggregated by SQLite and the index is kept in memory.
+    """
+    if database is not None:
+        return get_database_count_index(period)
+
+    paths = {int(barcode): resolve(path) for barcode, path in get_period_paths(period).items()}
+    if not paths:
+        return CountIndex.from_counts({}, {})
+    sources = [[str(path), os.stat(path).st_mtime_ns, os.stat(path).st_size] for path in paths.values()]
+    directory = Path(next(iter(paths.values())).parent, 'counts')
+
+    with count_lock:
+        index = count_indexes.get(period)
+        if index is not None and index.is_current(sources):
+            return index
+
+        try:
+            index = CountIndex.load(directory)
+        except (OSError, ValueError, KeyError):
+            index = None
+
+        if index is None or not index.is_current(sources):
+            counts = {}
+            reads = {}
+            # the reads are counted chunk by chunk, so the per-read data is never loaded at once
+            for barcode in paths:
+                counts[barcode] = pd.Series(dtype='int64')
+                reads[barcode] = 0
+                for chunk in iter_dataset(period, ['species'], barcodes={barcode}, chunksize=CHUNKSIZE):
+                    counts[barcode] = counts[barcode].add(chunk['species'].value_counts(), fill_value=0)
+                    reads[barcode] += len(chunk)
+
+            index = CountIndex.from_counts(counts, reads, sources)
+            index.save(directory)
+
+        count_indexes[period] = index
+
+    return index
+
+
+def get_database_count_index(period):
+    check_period(period)
+    stat = os.stat(database.path)
+    sources = [[str(database.path), stat.st_mtime_ns, stat.st_size]]
+
+    with count_lock:
+        index = count_indexes.get(period)
+        if index is None or not index.is_current(sources):
+            reads = database.read_totals(period).to_dict()
+            species_counts = database.species_counts(period)
+            counts = {barcode: pd.Series(dtype='int64') for barcode in reads}
+            for barcode, group in species_counts.groupby('barcode'):
+                counts[barcode] = group.set_index('species')['n']
+
+            index = CountIndex.from_counts(counts, reads, sources)
+            count_indexes[period] = index
+
+    return index
+
+
+species_catalogs = {}
+
+
+@timed()
+def get_species_catalog():
+    """Returns the searchable species of the baseline and intervention count indexes.
+
+    The catalog is kept until one of the indexes is rebuilt, so switching species does not read any files.
+    """
+    indexes = {period: get_count_index(period) for period in ['baseline', 'intervention']}
+
+    with count_lock:
+        catalog = species_catalogs.get('periods')
+        if catalog is None or any(catalog.indexes[period] is not index for period, index in indexes.items()):
+            catalog = SpeciesCatalog(indexes)
+            species_catalogs['periods'] = catalog
+
+    return catalog
+
+
+def get_spo2_means():
+    """Returns the mean SpO2 per subject with ('surgical') and without ('None') a mask.
+
+    The returned DataFrame has the columns subject, masktype and mean. The measurements are rounded to two decimals
+    and a day only counts when all six measurements are present.
+    """
+    if database is not None:
+        return database.spo2_means()
+
+    return get_spo2_cohort().mask_means()
+
+
+def get_study_design():
+    """Returns the StudyDesign of the study block in config.yaml, or None without a study block."""
+    settings = config.get('study')
+    if not settings:
+        return None
+
+    return StudyDesign.from_config(settings, get_subjects())
+
+
+def get_periods(df):
+    """Returns the period of every row of the diaries, see model.periods.
+
+    Keyword arguments:
+        df -- a DataFrame with the columns subject, date and masktype.
+    """
+    return label_periods(df, get_study_design())
+
+
+@timed()
+def get_spo2_cohort(subject_numbers=None):
+    """Returns the SpO2 measurements of the subjects as a SpO2Cohort, the diaries are read once and in parallel.
+
+    Keyword arguments:
+        subject_numbers -- the subjects to read, defaults to all subjects.
+    """
+    subject_numbers = get_subjects() if subject_numbers is None else subject_numbers
+
+    frames = get_columns(subject_numbers, ['date', 'masktype'] + SPO2_COLUMNS)
+
+    return SpO2Cohort.from_frames(frames, get_study_design())
+
+
+@timed()
+def get_beta_diversity(metric, barcodes=None):
+    """Returns the samples and the condensed distance matrix between all baseline and intervention samples.
+
+    The samples are a DataFrame with the columns barcode and period, the baseline samples come first. The matrix is
+    cached in data/cache/beta/, keyed by the hash of the counts.
+
+    Keyword arguments:
+        metric -- one of "braycurtis", "jaccard", "aitchison".
+        barcodes -- the barcodes to compare, defaults to the barcodes present in both periods.
+    """
+    barcodes = get_barcodes() if barcodes is None else list(barcodes)
+    counts, _ = stack_rows([(get_count_index('baseline'), barcodes), (get_count_index('intervention'), barcodes)])
+    samples = pd.DataFrame({'barcode': barcodes * 2,
+                            'period': ['baseline'] * len(barcodes) + ['intervention'] * len(barcodes)})
+
+    directory = Path(root_path, config['datadir'], 'cache', 'beta')
+    return samples, cached_beta_diversity(counts, metric, directory)
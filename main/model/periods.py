@@ -0,0 +1,136 @@
+"""Module that contains the periods of the study design, e.g. the baseline and the intervention.
+
+A period is a range of dates, the start and end date are part of the period. All subjects follow the periods of the
+study, unless they are in an arm with its own periods or have periods of their own. The periods are read from the
+study block of config.yaml:
+
+    study:
+      periods:
+        baseline: ["2021-11-01", "2021-11-14"]
+        intervention: ["2021-11-15", "2021-11-22"]
+      arms:
+        late:
+          subjects: [4, 5]
+          periods:
+            baseline: ["2021-11-08", "2021-11-21"]
+            intervention: ["2021-11-22", "2021-11-29"]
+      subjects:
+        3:
+          baseline: ["2021-11-02", "2021-11-15"]
+          intervention: ["2021-11-16", "2021-11-23"]
+
+The rows of a diary are labelled with their period in one interval join of all subjects and dates, so the pages can
+aggregate the periods with a groupby. Without a study design the days with a mask are the intervention and the days
+without a mask the baseline.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+# the periods of a study without a study design
+PERIODS = ['baseline', 'intervention']
+
+PERIOD_COLUMNS = ['subject', 'period', 'start', 'end']
+
+
+def mask_periods(masktype) -> pd.Categorical:
+    """Returns the periods of days by their mask type, the days with a mask are the intervention.
+
+    Days without a mask type get no period.
+    """
+    masktype = pd.Series(masktype, dtype=object).reset_index(drop=True)
+    labels = np.where(masktype == 'None', 'baseline', 'intervention').astype(object)
+    labels[masktype.isna().to_numpy()] = None
+
+    return pd.Categorical(labels, categories=PERIODS)
+
+
+class StudyDesign:
+    """The periods of the study per subject.
+
+    Keyword arguments:
+        periods -- a DataFrame with the columns subject, period, start and end, the end date is part of the period.
+    """
+
+    def __init__(self, periods: pd.DataFrame) -> None:
+        periods = periods[PERIOD_COLUMNS].copy()
+        periods['start'] = pd.to_datetime(periods['start'])
+        periods['end'] = pd.to_datetime(periods['end'])
+        if (periods['end'] < periods['start']).any():
+            raise ValueError('Expects periods that end after their start.')
+
+        # a period ends at midnight after its end date
+        periods['stop'] = periods['end'].dt.normalize() + pd.Timedelta(days=1)
+        periods = periods.sort_values(['subject', 'start'], kind='mergesort').reset_index(drop=True)
+
+        same_subject = periods['subject'].to_numpy()[1:] == periods['subject'].to_numpy()[:-1]
+        if (same_subject & (periods['start'].to_numpy()[1:] < periods['stop'].to_numpy()[:-1])).any():
+            raise ValueError('Expects periods of a subject that do not overlap.')
+
+        self.periods = periods
+        # the periods in order of their first start
+        self.names: List[str] = periods.groupby('period', sort=False)['start'].min().sort_values().index.tolist()
+
+    @classmethod
+    def from_config(cls, settings: dict, subjects: list) -> 'StudyDesign':
+        """Returns the design of the study block of config.yaml for the subjects.
+
+        The periods of a subject are its own periods, else those of its arm, else those of the study.
+        """
+        arms = {subject: arm.get('periods') or {} for arm in (settings.get('arms') or {}).values()
+                for subject in arm.get('subjects') or []}
+        own = settings.get('subjects') or {}
+
+        rows = []
+        for subject in subjects:
+            periods = own.get(subject, arms.get(subject, settings.get('periods') or {}))
+            rows.extend([subject, name, start, end] for name, (start, end) in periods.items())
+
+        return cls(pd.DataFrame(rows, columns=PERIOD_COLUMNS))
+
+    def label(self, subjects, dates) -> pd.Categorical:
+        """Returns the period of every subject and date, missing outside the periods.
+
+        Keyword arguments:
+            subjects -- the subject of every row.
+            dates -- the date or time of every row.
+        """
+        rows = pd.DataFrame({'subject': np.asarray(subjects), 'date': pd.to_datetime(np.asarray(dates)),
+                             'row': np.arange(len(subjects))})
+        rows = rows[rows['date'].notna()].sort_values('date', kind='mergesort')
+
+        # the last period that started before every date, the date is in it when it is before the stop
+        matched = pd.merge_asof(rows, self.periods.sort_values('start', kind='mergesort'), left_on='date',
+                                right_on='start', by='subject', direction='backward')
+        inside = (matched['date'] < matched['stop']).to_numpy()
+
+        labels = np.full(len(subjects), None, dtype=object)
+        labels[matched['row'].to_numpy()[inside]] = matched['period'].to_numpy()[inside]
+
+        return pd.Categorical(labels, categories=self.names)
+
+
+def label_periods(df: pd.DataFrame, design: Optional[StudyDesign] = None, subject: str = 'subject',
+                  date: str = 'date') -> pd.Categorical:
+    """Returns the period of every row of a diary, by the dates of the design or by the mask type without one.
+
+    Keyword arguments:
+        df -- a DataFrame with the subject, date and masktype columns, the subject can be an index level.
+        design -- the study design, None labels the rows by their mask type.
+        subject -- the column or index level with the subjects.
+        date -- the column with the dates.
+    """
+    if design is None:
+        return mask_periods(df['masktype'])
+
+    subjects = df[subject] if subject in df.columns else df.index.get_level_values(subject)
+
+    return design.label(subjects, df[date])
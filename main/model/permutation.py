@@ -0,0 +1,247 @@
+"""Module that contains the permutation tests, an alternative to the t-tests that does not assume normality.
+
+The statistic is the difference between the means of a and b. Under the null hypothesis the labels are exchangeable:
+    independent -- the values of a and b are shuffled over both groups.
+    paired -- the sign of the difference of every pair is flipped at random.
+
+When the number of distinct permutations is at most the requested number of permutations, all of them are enumerated
+and the p-value is exact. Otherwise random permutations are drawn as batches of index or sign matrices and evaluated
+at once. The batches are spread over a process pool in rounds, every batch has its own random stream derived from the
+seed, so the result does not depend on the number of workers. The test stops after a round when the Clopper-Pearson
+interval of the p-value lies completely above or below alpha. In a family of m tests whose p-values are corrected
+afterwards, a test stops below alpha / m or above alpha. Its decision is then the same under the Bonferroni, Holm and
+Benjamini-Hochberg corrections, see stats.compare.
+
+The two-sided p-value is twice the smallest one-sided p-value.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import threading
+from concurrent.futures import Executor
+from functools import partial
+from itertools import combinations, islice
+from math import comb
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.stats import beta
+
+from .loader import EXECUTORS
+
+TESTS = ['independent', 'paired']
+ALTERNATIVES = ['two-sided', 'less', 'greater']
+
+# number of permutations of a batch and number of batches of a round, after which the stopping rule is checked
+BATCH_SIZE = 2000
+ROUND_BATCHES = 8
+
+
+class LazyProcessPool(Executor):
+    """A process pool that only starts its processes when the first task is submitted.
+
+    A family of tests shares one pool, which is never started when all tests are exact.
+
+    Keyword arguments:
+        max_workers -- the number of processes, None starts one per core.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        self.max_workers = max_workers
+
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pool is None:
+                self._pool = EXECUTORS['process'](max_workers=self.max_workers)
+
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait, **kwargs)
+                self._pool = None
+
+
+def mean_difference(x: np.ndarray, n_a: int, indices: np.ndarray) -> np.ndarray:
+    """Returns the difference between the means of the first n_a values and the other values of every row."""
+    sums = x[indices[:, :n_a]].sum(axis=1)
+    return sums / n_a - (x.sum() - sums) / (len(x) - n_a)
+
+
+def flipped_mean(d: np.ndarray, signs: np.ndarray) -> np.ndarray:
+    """Returns the mean of the differences after flipping their signs, one row per permutation."""
+    return (signs * d).mean(axis=1)
+
+
+def count_extreme(statistics: np.ndarray, observed: float) -> np.ndarray:
+    """Returns the number of statistics that are at most and at least the observed statistic."""
+    # permutations that give the observed statistic may differ in the last bits
+    tolerance = 1e-12 * max(1.0, abs(observed))
+
+    return np.array([np.count_nonzero(statistics <= observed + tolerance),
+                     np.count_nonzero(statistics >= observed - tolerance)], dtype=np.int64)
+
+
+def tail(counts: np.ndarray, alternative: str) -> Tuple[int, int]:
+    """Returns the count of the tail of the alternative and the factor of its p-value.
+
+    The two-sided p-value is twice the smallest one-sided p-value, like scipy's permutation_test.
+    """
+    if alternative == 'less':
+        return int(counts[0]), 1
+    if alternative == 'greater':
+        return int(counts[1]), 1
+
+    return int(counts.min()), 2
+
+
+def random_batch(task: tuple, x: np.ndarray, n_a: int, test: str, observed: float) -> np.ndarray:
+    """Returns the counts of count_extreme of a batch of random permutations.
+
+    Keyword arguments:
+        task -- the seed and the number of permutations of the batch.
+    """
+    seed, size = task
+    rng = np.random.default_rng(seed)
+    if test == 'paired':
+        statistics = flipped_mean(x, rng.choice([-1.0, 1.0], size=(size, len(x))))
+    else:
+        indices = rng.permuted(np.tile(np.arange(len(x)), (size, 1)), axis=1)
+        statistics = mean_difference(x, n_a, indices)
+
+    return count_extreme(statistics, observed)
+
+
+def n_distinct(n: int, n_a: int, test: str) -> int:
+    """Returns the number of distinct permutations."""
+    return 2 ** n if test == 'paired' else comb(n, n_a)
+
+
+def exact_count(x: np.ndarray, n_a: int, test: str, observed: float) -> Tuple[np.ndarray, int]:
+    """Returns the counts of count_extreme and the number of permutations when all permutations are enumerated."""
+    n = len(x)
+    extreme = np.zeros(2, dtype=np.int64)
+    if test == 'paired':
+        total = 2 ** n
+        for start in range(0, total, BATCH_SIZE):
+            codes = np.arange(start, min(start + BATCH_SIZE, total))
+            signs = ((codes[:, None] >> np.arange(n)) & 1) * 2.0 - 1
+            extreme += count_extreme(flipped_mean(x, signs), observed)
+
+        return extreme, total
+
+    groups = combinations(range(n), n_a)
+    total = 0
+    while True:
+        batch = np.array(list(islice(groups, BATCH_SIZE)), dtype=np.int64).reshape(-1, n_a)
+        if len(batch) == 0:
+            return extreme, total
+
+        # the other columns are not used by mean_difference, only the first n_a
+        extreme += count_extreme(mean_difference(x, n_a, batch), observed)
+        total += len(batch)
+
+
+def clopper_pearson(k: int, n: int, confidence: float) -> Tuple[float, float]:
+    """Returns the Clopper-Pearson interval of a proportion of k in n."""
+    half = (1 - confidence) / 2
+    low = beta.ppf(half, k, n - k + 1) if k > 0 else 0.0
+    high = beta.ppf(1 - half, k + 1, n - k) if k < n else 1.0
+
+    return float(low), float(high)
+
+
+def permutation_test(a, b, test: str = 'independent', alternative: str = 'two-sided', n_permutations: int = 100000,
+                     seed=0, alpha: Optional[float] = 0.05, confidence: float = 0.99,
+                     workers: Optional[int] = None, pool: Optional[Executor] = None, n_tests: int = 1) -> dict:
+    """Returns a permutation test of the difference between the means of a and b.
+
+    The result has the keys statistic, p_value, n_permutations, exact, ci_low and ci_high, the interval is the
+    Clopper-Pearson interval of a Monte-Carlo p-value and equal to the p-value of an exact test.
+
+    Keyword arguments:
+        a -- the values of the first group, missing values are left out.
+        b -- the values of the second group, paired to a by position for a paired test.
+        test -- "independent" or "paired".
+        alternative -- "two-sided", "less" (the mean of a is lower) or "greater".
+        n_permutations -- the largest number of random permutations, at least 1.
+        seed -- the seed of the random streams, an int or a sequence of ints.
+        alpha -- the significance level of the stopping rule, None never stops early.
+        confidence -- the coverage of the interval of the stopping rule.
+        workers -- the size of the process pool, 0 or 1 runs in this process.
+        pool -- a process pool to use instead of starting one, it is not shut down, e.g. of a family of tests.
+        n_tests -- the number of tests of a family that is corrected for multiple testing, the test stops below
+                   alpha / n_tests or above alpha.
+    """
+    if alternative not in ALTERNATIVES:
+        raise ValueError('Expects one of the alternatives: {}'.format(', '.join(ALTERNATIVES)))
+    if n_permutations < 1:
+        raise ValueError('Expects at least 1 permutation.')
+
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if test == 'paired':
+        if a.shape != b.shape:
+            raise ValueError('Expects a and b of the same length for a paired test.')
+        x = a - b
+        x = x[~np.isnan(x)]
+        n_a = len(x)
+        observed = x.mean() if len(x) else np.nan
+    elif test == 'independent':
+        a, b = a[~np.isnan(a)], b[~np.isnan(b)]
+        x = np.concatenate([a, b])
+        n_a = len(a)
+        observed = a.mean() - b.mean() if len(a) and len(b) else np.nan
+    else:
+        raise ValueError('Expects one of the tests: {}'.format(', '.join(TESTS)))
+
+    result = {'statistic': observed, 'p_value': np.nan, 'n_permutations': 0, 'exact': False,
+              'ci_low': np.nan, 'ci_high': np.nan}
+    if np.isnan(observed):
+        return result
+
+    if n_distinct(len(x), n_a, test) <= n_permutations:
+        counts, total = exact_count(x, n_a, test, observed)
+        extreme, factor = tail(counts, alternative)
+        p_value = min(factor * extreme / total, 1.0)
+        result.update(p_value=p_value, n_permutations=total, exact=True, ci_low=p_value, ci_high=p_value)
+        return result
+
+    sizes = [BATCH_SIZE] * (n_permutations // BATCH_SIZE)
+    if n_permutations % BATCH_SIZE:
+        sizes.append(n_permutations % BATCH_SIZE)
+    tasks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+    func = partial(random_batch, x=x, n_a=n_a, test=test, observed=observed)
+
+    own_pool = pool is None and (workers is None or workers > 1)
+    if own_pool:
+        pool = EXECUTORS['process'](max_workers=workers)
+    counts, total = np.zeros(2, dtype=np.int64), 0
+    try:
+        for start in range(0, len(tasks), ROUND_BATCHES):
+            round_tasks = tasks[start:start + ROUND_BATCHES]
+            counts += sum(pool.map(func, round_tasks) if pool is not None else map(func, round_tasks))
+            total += sum(size for _, size in round_tasks)
+
+            extreme, factor = tail(counts, alternative)
+            low, high = clopper_pearson(extreme, total, confidence)
+            low, high = min(factor * low, 1.0), min(factor * high, 1.0)
+            if alpha is not None and (high < alpha / n_tests or low > alpha):
+                break
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    # the observed labels count as one of the permutations
+    p_value = min(factor * (extreme + 1) / (total + 1), 1.0)
+    result.update(p_value=p_value, n_permutations=total, ci_low=low, ci_high=high)
+
+    return result
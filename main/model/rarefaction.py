@@ -0,0 +1,110 @@
+"""Module that contains the rarefaction of count matrices.
+
+Samples with more reads show more species, so diversity can only be compared between samples at the same read depth.
+Rarefying draws subsamples of a fixed number of reads without replacement from every sample. All draws of a sample
+are made at once with a multivariate hypergeometric distribution, and the samples are divided over a process pool.
+Every sample gets its own random stream derived from the seed, so the result does not depend on the number of workers.
+"""
+
+__author__ = ['Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from functools import partial
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .diversity import alpha_diversity, as_csr
+from .diskcache import results
+from .timing import timed
+from .loader import map_ordered
+
+
+def get_depths(max_depth: int, n_steps: int = 10) -> np.ndarray:
+    """Returns a ladder of n_steps evenly spaced depths up to max_depth."""
+    return np.unique(np.linspace(1, max_depth, n_steps).astype(np.int64))
+
+
+def rarefy(counts: np.ndarray, depth: int, n_draws: int, rng: np.random.Generator) -> np.ndarray:
+    """Returns n_draws subsamples of depth reads of one sample, as a n_draws x taxa matrix.
+
+    Keyword arguments:
+        counts -- the read counts per taxon of the sample.
+        depth -- the number of reads per subsample, at most the number of reads of the sample.
+        n_draws -- the number of subsamples.
+        rng -- the random generator.
+    """
+    return rng.multivariate_hypergeometric(np.asarray(counts, dtype=np.int64), depth, size=n_draws)
+
+
+def rarefy_sample(task: tuple, depths: Sequence[int], n_draws: int, metrics: List[str]) -> np.ndarray:
+    """Returns a depths x metrics x 2 array with the mean and standard deviation of the metrics of one sample.
+
+    Depths above the number of reads of the sample are NaN.
+    """
+    counts, seed = task
+    rng = np.random.default_rng(seed)
+    result = np.full((len(depths), len(metrics), 2), np.nan)
+
+    for i, depth in enumerate(depths):
+        if depth > counts.sum():
+            break
+
+        diversity = alpha_diversity(rarefy(counts, depth, n_draws, rng), metrics).to_numpy()
+        result[i, :, 0] = diversity.mean(axis=0)
+        result[i, :, 1] = diversity.std(axis=0)
+
+    return result
+
+
+@timed()
+@results.cached(ignore=['workers'])
+def rarefaction(counts, depths: Sequence[int], metrics: List[str], n_draws: int = 20, seed: int = 0,
+                index: Optional[Sequence] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """Returns the mean and standard deviation of the metrics of every sample at every depth.
+
+    The returned DataFrame has the columns sample, depth, metric, mean and std.
+
+    Keyword arguments:
+        counts -- a samples x taxa count matrix, dense or sparse.
+        depths -- the numbers of reads to subsample.
+        metrics -- the alpha diversity metrics to compute.
+        n_draws -- the number of subsamples per sample and depth.
+        seed -- the seed of the random streams.
+        index -- the labels of the samples.
+        workers -- the size of the process pool, 0 or 1 runs in this process.
+    """
+    matrix = as_csr(counts)
+    depths = [int(depth) for depth in depths]
+    index = list(range(matrix.shape[0])) if index is None else list(index)
+    seeds = np.random.SeedSequence(seed).spawn(matrix.shape[0])
+
+    # only the observed taxa of a sample are sent to the pool
+    tasks = [(np.asarray(matrix.data[matrix.indptr[i]:matrix.indptr[i + 1]]), seeds[i])
+             for i in range(matrix.shape[0])]
+    draws = map_ordered(partial(rarefy_sample, depths=depths, n_draws=n_draws, metrics=metrics), tasks,
+                        workers, 'process')
+
+    frames = []
+    for sample, result in zip(index, draws):
+        for j, metric in enumerate(metrics):
+            frames.append(pd.DataFrame({'sample': [sample] * len(depths), 'depth': depths, 'metric': metric,
+                                        'mean': result[:, j, 0], 'std': result[:, j, 1]}))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def rarefied_diversity(counts, depth: int, metrics: List[str], n_draws: int = 20, seed: int = 0,
+                       index: Optional[Sequence] = None, workers: Optional[int] = None) -> pd.DataFrame:
+    """Returns a DataFrame with one row per sample and the mean of every metric at an even depth.
+
+    Samples with fewer reads than the depth are NaN.
+    """
+    df = rarefaction(counts, [depth], metrics, n_draws, seed, index, workers)
+    df = df.pivot(index='sample', columns='metric', values='mean')
+
+    return df.reindex(index=df.index if index is None else list(index), columns=metrics)
@@ -0,0 +1,110 @@
+"""Module that contains the registry of subjects and barcodes.
+
+A registry maps the number of a subject or barcode to the path of its parsed file. The numbers are discovered from the
+file names in a directory, or read from a manifest, the first time the registry is used. The files themselves are
+not opened.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import csv
+import re
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Callable, Dict
+
+from .store import COLUMNAR_SUFFIX
+
+SUFFIXES = ['.csv', COLUMNAR_SUFFIX]
+
+
+def scan_directory(directory, prefix: str) -> Dict[int, Path]:
+    """Returns the numbered files in a directory, e.g. {1: subject_1.csv} for the prefix 'subject_'.
+
+    When a file is stored as .csv and as Parquet the .csv path is registered, the model resolves it to Parquet.
+    """
+    pattern = re.compile(r'^{}(\d+)$'.format(re.escape(prefix)))
+    found = {}
+
+    for path in Path(directory).glob('{}*'.format(prefix)):
+        match = pattern.match(path.stem)
+        if match is None or path.suffix not in SUFFIXES:
+            continue
+
+        number = int(match.group(1))
+        if number not in found or path.suffix == '.csv':
+            found[number] = path
+
+    return found
+
+
+def read_manifest(manifest, column: str, root) -> Dict[int, Path]:
+    """Returns the files of one column of a manifest.
+
+    The manifest is a .csv file with a 'subject' column and one column of paths, relative to the root, per kind of
+    file ('diary', 'baseline', 'intervention'). Empty cells are skipped.
+    """
+    with open(manifest, newline='', encoding='utf8') as stream:
+        rows = list(csv.DictReader(stream))
+
+    return {int(row['subject']): Path(root, row[column]) for row in rows if row.get(column)}
+
+
+class Registry(Mapping):
+    """Lazily discovered mapping of subject or barcode numbers to file paths.
+
+    Keyword arguments:
+        discover -- a function without arguments that returns a dictionary of numbers and paths.
+    """
+
+    def __init__(self, discover: Callable[[], Dict[int, Path]]) -> None:
+        self.discover = discover
+
+        self._paths = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory, prefix: str) -> 'Registry':
+        return cls(lambda: scan_directory(directory, prefix))
+
+    @classmethod
+    def from_manifest(cls, manifest, column: str, root) -> 'Registry':
+        return cls(lambda: read_manifest(manifest, column, root))
+
+    @property
+    def paths(self) -> Dict[int, Path]:
+        if self._paths is None:
+            with self._lock:
+                if self._paths is None:
+                    found = self.discover()
+                    self._paths = {number: found[number] for number in sorted(found)}
+
+        return self._paths
+
+    def refresh(self) -> None:
+        """Forgets the discovered files, they are discovered again on the next access."""
+        with self._lock:
+            self._paths = None
+
+    def __getitem__(self, number) -> Path:
+        try:
+            return self.paths[number]
+        except KeyError:
+            raise KeyError('Subject or barcode {} is not registered.'.format(number)) from None
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __repr__(self) -> str:
+        if self._paths is None:
+            return '{}(<not discovered>)'.format(type(self).__name__)
+
+        return '{}({})'.format(type(self).__name__, self._paths)
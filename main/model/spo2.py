@@ -0,0 +1,219 @@
+"""Module that contains the SpO2 measurements of the whole cohort.
+
+Every diary day has six SpO2 measurements, one of the right and one of the left index finger at three moments. The
+cohort stores them once in long format, with one row per subject, day, moment and hand. The means per moment, per
+hand and per day are computed for all subjects at once with a groupby. A mean is missing when one of its measurements
+is missing, like the means of the SpO2 page.
+
+Every day is labelled once with its period of the study design, see model.periods.
+
+Live readings are appended to the cohort. The rows of every day that received readings are kept in a buffer of that
+day, so a batch of readings only concatenates and summarizes the rows of the days it touches, whatever the length of
+the diaries.
+"""
+
+__author__ = ['Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.core.groupby import SeriesGroupBy
+
+from .database import SPO2_COLUMNS
+from .periods import StudyDesign, label_periods
+
+MOMENTS = [1, 2, 3]
+HANDS = ['r', 'l']
+
+# moment and hand of every measurement column
+COLUMN_MOMENTS = np.array([int(column[6]) for column in SPO2_COLUMNS], dtype=np.int8)
+COLUMN_HANDS = np.array([HANDS.index(column[-1]) for column in SPO2_COLUMNS], dtype=np.int8)
+
+
+def strict_mean(grouped: SeriesGroupBy) -> pd.Series:
+    """Returns the mean of every group, or NaN when a value of the group is missing."""
+    return grouped.mean().where(grouped.count() == grouped.size())
+
+
+def summarize(long: pd.DataFrame) -> pd.DataFrame:
+    """Returns one row per subject and day with the measurements and their means, indexed by subject and day.
+
+    A measurement that was read several times, e.g. by a live pulse oximeter, is the mean of its readings.
+    """
+    keys = ['subject', 'day']
+
+    measurements = strict_mean(long.groupby(keys + ['moment', 'hand'], observed=True)['spo2'])
+    measurements = measurements.unstack(['moment', 'hand'])
+    measurements.columns = ['spo2_m{}_{}'.format(moment, hand) for moment, hand in measurements.columns]
+
+    moments = strict_mean(long.groupby(keys + ['moment'], observed=True)['spo2']).unstack('moment')
+    moments.columns = ['spo2_m{}_mean'.format(moment) for moment in moments.columns]
+
+    hands = strict_mean(long.groupby(keys + ['hand'], observed=True)['spo2']).unstack('hand')
+    hands.columns = ['spo2_{}_mean'.format(hand) for hand in hands.columns]
+
+    grouped = long.groupby(keys, observed=True)
+    days = grouped[['date', 'masktype']].first()
+    days['masktype'] = days['masktype'].astype(object)
+
+    measurements = measurements.reindex(columns=SPO2_COLUMNS)
+    moments = moments.reindex(columns=['spo2_m{}_mean'.format(moment) for moment in MOMENTS])
+    hands = hands.reindex(columns=['spo2_{}_mean'.format(hand) for hand in HANDS])
+
+    df = pd.concat([days, measurements, moments, strict_mean(grouped['spo2']).rename('mean'), hands], axis=1)
+    # the subjects of the index are plain values, so days of different summaries can be combined
+    df.index = pd.MultiIndex.from_arrays([np.asarray(df.index.get_level_values('subject')),
+                                          df.index.get_level_values('day')], names=keys)
+
+    return df
+
+
+class SpO2Cohort:
+    """The SpO2 measurements of all subjects in long format.
+
+    The long frame has the columns subject, day, date, masktype, moment, hand and spo2. Subject, masktype and hand
+    are categorical and day is the position of the day in the diary of the subject.
+
+    Keyword arguments:
+        long -- the measurements in long format.
+        design -- the study design that labels the days with their period, None labels them by their mask type.
+    """
+
+    def __init__(self, long: pd.DataFrame, design: Optional[StudyDesign] = None) -> None:
+        self.long = long
+        self.design = design
+        self.days = self.get_days()
+
+        # the rows of the days that received live readings, by subject and day, and the positions of the days in long
+        self.buffers: Dict[tuple, pd.DataFrame] = {}
+        self._positions = None
+
+    @classmethod
+    def from_frames(cls, frames: Dict[int, pd.DataFrame], design: Optional[StudyDesign] = None) -> 'SpO2Cohort':
+        """Returns the cohort of the diaries of the subjects.
+
+        Keyword arguments:
+            frames -- a dictionary of subjects and their diaries, with the columns date, masktype and the six SpO2
+                      measurements.
+            design -- the study design, None labels the days by their mask type.
+        """
+        df = pd.concat({subject: df.reset_index(drop=True) for subject, df in frames.items()},
+                       names=['subject', 'day']).reset_index()
+        df['date'] = pd.to_datetime(df['date'])
+        # medical masks are surgical masks
+        df['masktype'] = df['masktype'].replace('Medical', 'surgical')
+
+        long = df.melt(id_vars=['subject', 'day', 'date', 'masktype'], value_vars=SPO2_COLUMNS,
+                       var_name='measurement', value_name='spo2')
+        codes = pd.Categorical(long.pop('measurement'), categories=SPO2_COLUMNS).codes
+
+        long['subject'] = pd.Categorical(long['subject'], categories=list(frames.keys()))
+        long['masktype'] = long['masktype'].astype('category')
+        long['moment'] = COLUMN_MOMENTS[codes]
+        long['hand'] = pd.Categorical.from_codes(COLUMN_HANDS[codes], categories=HANDS)
+        long['spo2'] = long['spo2'].round(decimals=2)
+
+        return cls(long, design)
+
+    @property
+    def subjects(self) -> List[int]:
+        subjects = list(self.long['subject'].cat.categories)
+
+        return subjects + sorted({subject for subject, _ in self.buffers if subject not in subjects})
+
+    def get_days(self) -> pd.DataFrame:
+        """Returns one row per subject and day with the measurements, their means and the period, indexed by subject
+        and day."""
+        return self.summarize(self.long)
+
+    def summarize(self, long: pd.DataFrame) -> pd.DataFrame:
+        """Returns the days of the measurements in long format, see summarize, labelled with their period."""
+        days = summarize(long)
+        days['period'] = label_periods(days, self.design)
+
+        return days
+
+    def append(self, readings: pd.DataFrame) -> pd.DataFrame:
+        """Appends live readings to the cohort and returns the days that changed.
+
+        A reading belongs to the day of its subject with the same date, or starts a new day. The readings are added to
+        the buffers of their days and only those days are summarized again, long keeps the measurements of the
+        diaries.
+
+        Keyword arguments:
+            readings -- a DataFrame with the columns subject, time, masktype, moment, hand and spo2.
+        """
+        if len(readings) == 0:
+            return self.days.iloc[:0]
+
+        rows = readings.drop(columns=['time']).assign(date=pd.to_datetime(readings['time']).dt.normalize())
+
+        # the day of every reading, new dates of a subject continue after its last day
+        known = self.days['date'].reset_index()
+        rows = rows.merge(known, on=['subject', 'date'], how='left')
+        new = rows.loc[rows['day'].isna(), ['subject', 'date']].drop_duplicates()
+        if len(new):
+            last = known.groupby('subject')['day'].max()
+            new['day'] = (new['subject'].map(last).fillna(-1).astype(np.int64)
+                          + new.groupby('subject')['date'].rank(method='dense').astype(np.int64))
+            rows = rows.drop(columns=['day']).merge(pd.concat([known, new]), on=['subject', 'date'], how='left')
+        rows['day'] = rows['day'].astype(np.int64)
+        rows['moment'] = rows['moment'].astype(np.int8)
+        rows['spo2'] = rows['spo2'].round(decimals=2)
+
+        if self._positions is None:
+            self._positions = self.long.groupby(['subject', 'day'], observed=True).indices
+
+        # a buffer starts with the measurements of its day in the diary
+        touched = []
+        for key, group in rows[self.long.columns].groupby(['subject', 'day'], sort=False):
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.long.iloc[self._positions.get(key, [])].astype(
+                    {'subject': object, 'masktype': object, 'hand': object})
+            self.buffers[key] = pd.concat([buffer, group], ignore_index=True)
+            touched.append(key)
+
+        # only the days that received readings are summarized again
+        changed = self.summarize(pd.concat([self.buffers[key] for key in touched], ignore_index=True))
+        self.days = pd.concat([self.days.drop(index=touched, errors='ignore'), changed]).sort_index()
+
+        return changed
+
+    def frame(self, subject: int) -> pd.DataFrame:
+        """Returns the days of a subject indexed by date, with the measurements and their means."""
+        return self.days.xs(subject, level='subject').set_index('date')
+
+    def means(self, masked: Optional[bool] = None, subject: Optional[int] = None) -> pd.Series:
+        """Returns the daily means of all subjects or of one subject.
+
+        Keyword arguments:
+            masked -- True selects the days with a mask, False the days without a mask and None all days.
+            subject -- the subject, None selects all subjects.
+        """
+        days = self.days if subject is None else self.days.xs(subject, level='subject', drop_level=False)
+        if masked is not None:
+            days = days[(days['masktype'] != 'None') == masked]
+
+        return days['mean']
+
+    def mask_means(self) -> pd.DataFrame:
+        """Returns the mean SpO2 per subject with ('surgical') and without ('None') a mask.
+
+        The returned DataFrame has the columns subject, masktype and mean.
+        """
+        masktype = self.days['masktype'].where(self.days['masktype'] == 'None', 'surgical')
+        subjects = self.days.index.get_level_values('subject')
+
+        return self.days['mean'].groupby([subjects, masktype.rename('masktype')]).mean().reset_index()
+
+    def period_means(self) -> pd.DataFrame:
+        """Returns the mean SpO2 per subject and period, with the columns subject, period and mean."""
+        subjects = self.days.index.get_level_values('subject')
+
+        return self.days['mean'].groupby([subjects, self.days['period']], observed=True).mean().reset_index()
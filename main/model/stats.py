@@ -0,0 +1,260 @@
+"""Module that contains the hypothesis tests of the dashboard.
+
+A family of tests is run in one call. The values of every comparison are put in the rows of a NaN-padded matrix, so
+all t-tests of the family are computed at once with array operations instead of one scipy call per comparison.
+Missing values are left out of their comparison.
+
+The tests are:
+    welch -- Welch's t-test for two independent groups with unequal variances.
+    student -- Student's t-test for two independent groups with equal variances, like scipy's ttest_ind.
+    paired -- the paired t-test, like scipy's ttest_rel.
+
+With the permutation engine every comparison is a permutation test of the difference between the means instead, see
+model.permutation. The welch and student tests become independent permutation tests. The tests of a family share one
+process pool, which is only started when a test draws random permutations.
+
+The p-values of a family are corrected for multiple testing with:
+    bonferroni -- p * m.
+    holm -- Holm's step-down method, which controls the family-wise error rate.
+    fdr_bh -- the Benjamini-Hochberg method, which controls the false discovery rate.
+"""
+
+__author__ = ['Kai Lin', 'Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import t as t_distribution
+
+from .diskcache import results
+from .timing import timed
+from .permutation import LazyProcessPool, permutation_test
+
+TESTS = ['welch', 'student', 'paired']
+ALTERNATIVES = ['two-sided', 'less', 'greater']
+CORRECTIONS = ['bonferroni', 'holm', 'fdr_bh']
+ENGINES = ['ttest', 'permutation']
+
+RESULT_COLUMNS = ['test', 'engine', 'alternative', 'n_a', 'n_b', 'mean_a', 'mean_b', 'statistic', 'df', 'p_value',
+                  'p_adjusted', 'reject']
+
+
+def describe(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the number of values, mean and sample variance of every row, ignoring NaN."""
+    present = ~np.isnan(x)
+    n = present.sum(axis=-1)
+    values = np.where(present, x, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = values.sum(axis=-1) / n
+        squares = np.where(present, (x - mean[..., None]) ** 2, 0).sum(axis=-1)
+        var = squares / (n - 1)
+
+    return n, mean, var
+
+
+def p_values(statistic: np.ndarray, df: np.ndarray, alternative: str = 'two-sided') -> np.ndarray:
+    """Returns the p-values of t statistics."""
+    if alternative == 'two-sided':
+        return np.minimum(2 * t_distribution.sf(np.abs(statistic), df), 1)
+    if alternative == 'less':
+        return t_distribution.cdf(statistic, df)
+    if alternative == 'greater':
+        return t_distribution.sf(statistic, df)
+
+    raise ValueError('Expects one of the alternatives: {}'.format(', '.join(ALTERNATIVES)))
+
+
+def ttest(a, b, test: str = 'welch', alternative: str = 'two-sided') -> dict:
+    """Returns the t-tests between the rows of a and b as a dictionary of arrays.
+
+    Keyword arguments:
+        a -- a comparisons x values matrix of the first group, padded with NaN.
+        b -- a comparisons x values matrix of the second group, with the pairs in the same columns for a paired test.
+        test -- "welch", "student" or "paired".
+        alternative -- "two-sided", "less" (the mean of a is lower) or "greater".
+    """
+    a = np.atleast_2d(np.asarray(a, dtype=np.float64))
+    b = np.atleast_2d(np.asarray(b, dtype=np.float64))
+    n_a, mean_a, var_a = describe(a)
+    n_b, mean_b, var_b = describe(b)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if test == 'paired':
+            if a.shape != b.shape:
+                raise ValueError('Expects a and b of the same shape for a paired test.')
+            n, mean, var = describe(a - b)
+            statistic = mean / np.sqrt(var / n)
+            df = n - 1.0
+        elif test == 'welch':
+            se_a, se_b = var_a / n_a, var_b / n_b
+            statistic = (mean_a - mean_b) / np.sqrt(se_a + se_b)
+            df = (se_a + se_b) ** 2 / (se_a ** 2 / (n_a - 1) + se_b ** 2 / (n_b - 1))
+        elif test == 'student':
+            df = (n_a + n_b - 2).astype(np.float64)
+            pooled = ((n_a - 1) * var_a + (n_b - 1) * var_b) / df
+            statistic = (mean_a - mean_b) / np.sqrt(pooled * (1 / n_a + 1 / n_b))
+        else:
+            raise ValueError('Expects one of the tests: {}'.format(', '.join(TESTS)))
+
+    return {
+        'n_a': n_a, 'n_b': n_b, 'mean_a': mean_a, 'mean_b': mean_b,
+        'statistic': statistic, 'df': df, 'p_value': p_values(statistic, df, alternative)
+    }
+
+
+@timed()
+@results.cached(ignore=['workers'])
+def permutation_tests(a, b, test: str = 'welch', alternative: str = 'two-sided', n_permutations: int = 100000,
+                      seed: int = 0, alpha: Optional[float] = 0.05, workers: Optional[int] = None,
+                      correction: Optional[str] = None) -> dict:
+    """Returns the permutation tests between the rows of a and b, with the keys of ttest and a NaN df.
+
+    Every row gets its own seed derived from the seed, the rows share one process pool. A test stops early when its
+    p-value is clearly above alpha, or clearly below alpha divided by the number of rows when the p-values are
+    corrected, None runs all permutations.
+    """
+    a = np.atleast_2d(np.asarray(a, dtype=np.float64))
+    b = np.atleast_2d(np.asarray(b, dtype=np.float64))
+    kind = 'paired' if test == 'paired' else 'independent'
+    if test not in TESTS:
+        raise ValueError('Expects one of the tests: {}'.format(', '.join(TESTS)))
+
+    if n_permutations < 1:
+        raise ValueError('Expects at least 1 permutation.')
+
+    n_tests = 1 if correction is None else len(a)
+    pool = LazyProcessPool(workers) if workers is None or workers > 1 else None
+    try:
+        results = [permutation_test(row_a, row_b, kind, alternative, n_permutations, [seed, i], alpha,
+                                    workers=workers, pool=pool, n_tests=n_tests)
+                   for i, (row_a, row_b) in enumerate(zip(a, b))]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if test == 'paired':
+        # only complete pairs are tested
+        present = ~np.isnan(a - b)
+        a, b = np.where(present, a, np.nan), np.where(present, b, np.nan)
+    (n_a, mean_a, _), (n_b, mean_b, _) = describe(a), describe(b)
+
+    return {
+        'n_a': n_a, 'n_b': n_b, 'mean_a': mean_a, 'mean_b': mean_b,
+        'statistic': np.array([result['statistic'] for result in results], dtype=np.float64),
+        'df': np.full(len(results), np.nan),
+        'p_value': np.array([result['p_value'] for result in results], dtype=np.float64)
+    }
+
+
+def adjust(p, method: Optional[str] = 'fdr_bh') -> np.ndarray:
+    """Returns the p-values corrected for multiple testing, missing p-values are not counted.
+
+    Keyword arguments:
+        p -- the p-values of a family of tests.
+        method -- "bonferroni", "holm", "fdr_bh" or None for no correction.
+    """
+    p = np.asarray(p, dtype=np.float64)
+    if method is None:
+        return p.copy()
+    if method not in CORRECTIONS:
+        raise ValueError('Expects one of the corrections: {}'.format(', '.join(CORRECTIONS)))
+
+    adjusted = np.full(p.shape, np.nan)
+    valid = ~np.isnan(p)
+    values = p[valid]
+    m = len(values)
+    order = np.argsort(values, kind='mergesort')
+    ranked = values[order]
+
+    if method == 'bonferroni':
+        result = ranked * m
+    elif method == 'holm':
+        result = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    else:
+        result = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+
+    unsorted = np.empty(m)
+    unsorted[order] = np.minimum(result, 1)
+    adjusted[valid] = unsorted
+
+    return adjusted
+
+
+def to_matrices(df: pd.DataFrame, value: str, group: str, a, b, by: List[str],
+                pair: Optional[str] = None) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """Returns the keys of the comparisons and the NaN-padded matrices of both groups.
+
+    The values of a comparison are placed in the columns of their pair, or in order of appearance without pairs.
+    """
+    rows = df.loc[df[group].isin([a, b]), by + [group, value] + ([pair] if pair else [])]
+    position = rows[pair] if pair else rows.groupby(by + [group], observed=True).cumcount()
+    rows = rows.assign(_position=position.to_numpy())
+
+    wide = rows.set_index(by + [group, '_position'])[value].unstack([group, '_position'])
+    columns = wide.columns.get_level_values('_position').unique()
+
+    def matrix(name):
+        if name not in wide.columns.get_level_values(group):
+            return np.full((len(wide), len(columns) if pair else 0), np.nan)
+        values = wide.xs(name, axis=1, level=group)
+        return (values.reindex(columns=columns) if pair else values).to_numpy(dtype=np.float64)
+
+    keys = wide.index.to_frame(index=False)
+
+    return keys, matrix(a), matrix(b)
+
+
+@timed()
+def compare(df: pd.DataFrame, value: str, group: str, a, b, by: Optional[List[str]] = None,
+            pair: Optional[str] = None, test: str = 'welch', alternative: str = 'two-sided',
+            correction: Optional[str] = 'fdr_bh', alpha: float = 0.05, engine: str = 'ttest',
+            n_permutations: int = 100000, seed: int = 0, workers: Optional[int] = None) -> pd.DataFrame:
+    """Returns a tidy table with one t-test between the groups a and b for every combination of the by columns.
+
+    The p-values of all rows form one family and are corrected together.
+
+    Keyword arguments:
+        df -- a DataFrame in long format.
+        value -- the column with the values.
+        group -- the column with the groups.
+        a -- the first group, the alternative "less" tests whether its mean is lower.
+        b -- the second group.
+        by -- the columns that define the comparisons, None compares all rows at once.
+        pair -- the column that pairs the values of a and b in a paired test, e.g. subject.
+        test -- "welch", "student" or "paired".
+        alternative -- "two-sided", "less" or "greater".
+        correction -- "bonferroni", "holm", "fdr_bh" or None.
+        alpha -- the significance level of the adjusted p-values and of the stopping rule of the permutation tests.
+        engine -- "ttest" or "permutation".
+        n_permutations -- the largest number of permutations of a permutation test.
+        seed -- the seed of the permutation tests.
+        workers -- the size of the process pool of a permutation test, 0 or 1 runs in this process.
+    """
+    if engine not in ENGINES:
+        raise ValueError('Expects one of the engines: {}'.format(', '.join(ENGINES)))
+
+    by = list(by or [])
+    if by:
+        keys, matrix_a, matrix_b = to_matrices(df, value, group, a, b, by, pair)
+    else:
+        keys, matrix_a, matrix_b = to_matrices(df.assign(_family=0), value, group, a, b, ['_family'], pair)
+        keys = keys.drop(columns=['_family'])
+
+    if engine == 'permutation':
+        result = pd.DataFrame(permutation_tests(matrix_a, matrix_b, test, alternative, n_permutations, seed, alpha,
+                                                workers, correction))
+    else:
+        result = pd.DataFrame(ttest(matrix_a, matrix_b, test, alternative))
+    result.insert(0, 'test', test)
+    result.insert(1, 'engine', engine)
+    result.insert(2, 'alternative', alternative)
+    result['p_adjusted'] = adjust(result['p_value'], correction)
+    result['reject'] = result['p_adjusted'] < alpha
+
+    return pd.concat([keys, result[RESULT_COLUMNS]], axis=1)
@@ -0,0 +1,126 @@
+"""Module that contains the columnar storage backend of the parsed data.
+
+Parsed files are stored as Parquet next to their .csv counterpart (data/diary/parsed/subject_1.parquet next to
+subject_1.csv). When a Parquet file is present and up to date only the requested columns are decoded, otherwise the
+.csv file is used.
+
+Existing trees can be converted once with:
+    cd main
+    python -m model.store
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from .timing import span
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+COLUMNAR_SUFFIX = '.parquet'
+
+
+def columnar_path(path) -> Path:
+    """Returns the path of the Parquet counterpart of a .csv file."""
+    return Path(path).with_suffix(COLUMNAR_SUFFIX)
+
+
+def resolve(path) -> Path:
+    """Returns the file that should be read for the given .csv path.
+
+    The Parquet counterpart is preferred when it is at least as recent as the .csv file.
+    """
+    path = Path(path)
+    columnar = columnar_path(path)
+
+    if not HAS_PARQUET or not columnar.exists():
+        return path
+    if not path.exists() or columnar.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+        return columnar
+
+    return path
+
+
+def read_frame(path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Reads a Parquet or .csv file, only decoding the requested columns.
+
+    Keyword arguments:
+        path -- the path of the file.
+        columns -- the columns to read, None reads all columns.
+    """
+    with span('store.read_frame', path=Path(path).name):
+        if Path(path).suffix == COLUMNAR_SUFFIX:
+            return pd.read_parquet(path, columns=columns)
+
+        return pd.read_csv(path, usecols=columns)
+
+
+def iter_frame(path, columns: Optional[List[str]] = None, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Yields a Parquet or .csv file in chunks, only decoding the requested columns.
+
+    Keyword arguments:
+        path -- the path of the file.
+        columns -- the columns to read, None reads all columns.
+        chunksize -- the number of rows per chunk, None yields the whole file as one chunk.
+    """
+    if chunksize is None:
+        yield read_frame(path, columns)
+    elif Path(path).suffix == COLUMNAR_SUFFIX:
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def convert(path) -> Path:
+    """Converts a .csv file into its Parquet counterpart and returns the path of the new file."""
+    df = pd.read_csv(path)
+    # drop the index columns that were written by to_csv
+    df = df.loc[:, ~df.columns.str.startswith('Unnamed:')]
+    # the parsers write the dates of the Parquet files as datetimes
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    target = columnar_path(path)
+    df.to_parquet(target, index=False)
+
+    return target
+
+
+def convert_tree(directory) -> List[Path]:
+    """Converts all .csv files in a directory and returns the paths of the new files."""
+    return [convert(path) for path in sorted(Path(directory).glob('*.csv'))]
+
+
+if __name__ == '__main__':
+    from .model import config, root_path
+
+    diary_dir = Path(root_path, config['diarydir'], 'parsed')
+    barcodes_dir = Path(root_path, config['barcodesdir'])
+    default_dirs = [diary_dir] + sorted(barcodes_dir.glob('parsed_*'))
+
+    parser = argparse.ArgumentParser(description="Convert parsed .csv files into Parquet files.")
+    parser.add_argument('directories', nargs='*', default=default_dirs,
+                        help='Directories with .csv files, defaults to the parsed diary and barcode directories.')
+
+    args = parser.parse_args()
+
+    if not HAS_PARQUET:
+        raise SystemExit('Converting requires pyarrow, install it with "pip install pyarrow".')
+
+    for directory in args.directories:
+        for target in convert_tree(directory):
+            print(target)
@@ -0,0 +1,320 @@
+"""Module that contains the live ingestion of SpO2 readings.
+
+A reading is one line of JSON with the fields subject, time, masktype, moment, hand and spo2, e.g.
+    {"subject": 1, "time": "2021-11-15T09:00:00", "masktype": "None", "moment": 1, "hand": "r", "spo2": 0.97}
+
+Readings arrive from a file that is appended to (tail) or from a local TCP socket, one reading per line. Sources run
+in their own thread and put every reading on the queue of each subscription. One ingestor serves all sessions of a
+process, every session subscribes and drains its own queue in its own update loop.
+
+The simulator writes readings of a study day to a file or a socket, for testing:
+    cd main
+    python -m model.stream --output data/stream/readings.jsonl
+    python -m model.stream --port 50050
+"""
+
+__author__ = ['Azadeh Pirzadeh', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import argparse
+import json
+import queue
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ttest_ind_from_stats
+
+READING_FIELDS = ['subject', 'time', 'masktype', 'moment', 'hand', 'spo2']
+
+MASKTYPES = ['surgical', 'None']
+
+
+def parse_reading(line) -> dict:
+    """Returns the reading of a line of JSON, raises a ValueError when the line is not a valid reading."""
+    try:
+        data = json.loads(line)
+        reading = {
+            'subject': int(data['subject']),
+            'time': pd.Timestamp(data['time']),
+            'masktype': str(data['masktype']),
+            'moment': int(data['moment']),
+            'hand': str(data['hand']),
+            'spo2': float(data['spo2'])
+        }
+    except (KeyError, TypeError, ValueError) as error:
+        raise ValueError('Invalid reading: {!r}'.format(line)) from error
+
+    if reading['hand'] not in ('r', 'l') or reading['moment'] not in (1, 2, 3):
+        raise ValueError('Invalid reading: {!r}'.format(line))
+
+    return reading
+
+
+def format_reading(reading: dict) -> str:
+    """Returns a reading as a line of JSON."""
+    return json.dumps(dict(reading, time=pd.Timestamp(reading['time']).isoformat())) + '\n'
+
+
+def tail_file(path, stop: threading.Event, poll: float = 0.5, from_start: bool = False) -> Iterator[str]:
+    """Yields the lines that are appended to a file until stop is set.
+
+    Keyword arguments:
+        path -- the path of the file, it is waited for when it does not exist yet.
+        stop -- the event that ends the tail.
+        poll -- the number of seconds to wait for new lines.
+        from_start -- when False only the lines written after the start are yielded.
+    """
+    path = Path(path)
+    while not path.exists():
+        if stop.wait(poll):
+            return
+
+    with open(path) as file:
+        if not from_start:
+            file.seek(0, 2)
+
+        partial = ''
+        while not stop.is_set():
+            line = file.readline()
+            if not line:
+                stop.wait(poll)
+                continue
+
+            # a line without a newline is still being written
+            partial += line
+            if partial.endswith('\n'):
+                yield partial
+                partial = ''
+
+
+class Subscription:
+    """The readings of an Ingestor for one consumer, e.g. one session of the dashboard.
+
+    Keyword arguments:
+        ingestor -- the ingestor that puts the readings on the queue of the subscription.
+    """
+
+    def __init__(self, ingestor: 'Ingestor') -> None:
+        self.ingestor = ingestor
+        self._queue = queue.SimpleQueue()
+
+    def put(self, reading: dict) -> None:
+        self._queue.put(reading)
+
+    def drain(self) -> pd.DataFrame:
+        """Returns all readings that arrived since the last call, with the columns of READING_FIELDS."""
+        readings = []
+        while True:
+            try:
+                readings.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return pd.DataFrame(readings, columns=READING_FIELDS)
+
+    def close(self) -> None:
+        """Stops receiving readings."""
+        self.ingestor.unsubscribe(self)
+
+
+class Ingestor:
+    """Collects readings from any number of sources and passes every reading to all subscriptions.
+
+    Readings that arrive while there are no subscriptions are dropped.
+
+    Keyword arguments:
+        poll -- the number of seconds a file source waits for new lines.
+    """
+
+    def __init__(self, poll: float = 0.5) -> None:
+        self.poll = poll
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self._stop = threading.Event()
+        self._servers = []
+        self._threads = []
+
+    def subscribe(self) -> Subscription:
+        """Returns a new subscription that receives the readings from now on, close it when it is no longer used."""
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscriptions.append(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def put(self, line) -> None:
+        """Parses a line and passes the reading to all subscriptions, invalid lines are counted and skipped."""
+        try:
+            reading = parse_reading(line)
+        except ValueError:
+            self.rejected += 1
+            return
+
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(reading)
+
+    def add_file(self, path, from_start: bool = False) -> None:
+        """Starts reading the lines that are appended to a file."""
+        def run():
+            for line in tail_file(path, self._stop, self.poll, from_start):
+                self.put(line)
+
+        self._start(run)
+
+    def add_socket(self, host: str = 'localhost', port: int = 50050) -> None:
+        """Starts a TCP server that receives readings, one per line."""
+        put = self.put
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    put(line.decode('utf8'))
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        self._servers.append(server)
+        self._start(server.serve_forever)
+
+    def add_simulator(self, subjects: List[int], interval: float = 1.0, seed: int = 0) -> None:
+        """Starts a simulator that puts readings of the subjects on the queue."""
+        def run():
+            for reading in simulate(subjects, interval, seed, self._stop):
+                self.put(format_reading(reading))
+
+        self._start(run)
+
+    def stop(self) -> None:
+        """Stops all sources."""
+        self._stop.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def _start(self, target: Callable) -> None:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+
+def simulate(subjects: List[int], interval: float = 1.0, seed: int = 0,
+             stop: Optional[threading.Event] = None) -> Iterator[dict]:
+    """Yields readings of the right and left hand of every subject, one round every interval seconds.
+
+    The subjects with an even number wear a surgical mask. Their SpO2 is slightly lower, so the mask statistics
+    have something to find.
+    """
+    rng = np.random.default_rng(seed)
+    stop = threading.Event() if stop is None else stop
+    moment = 0
+
+    while not stop.is_set():
+        now = pd.Timestamp.now()
+        moment = moment % 3 + 1
+        for subject in subjects:
+            masktype = 'surgical' if subject % 2 == 0 else 'None'
+            for hand in ('r', 'l'):
+                spo2 = rng.normal(0.968 if masktype == 'surgical' else 0.972, 0.008)
+                yield {'subject': subject, 'time': now, 'masktype': masktype, 'moment': moment, 'hand': hand,
+                       'spo2': round(float(np.clip(spo2, 0.9, 1.0)), 3)}
+
+        stop.wait(interval)
+
+
+class RunningStats:
+    """The number of values, mean and variance of a stream of values, updated one batch at a time.
+
+    Batches are merged with the parallel algorithm of Chan et al., so the values do not have to be kept.
+    """
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = np.nan
+        self._m2 = 0.0
+
+    def update(self, values) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        n, mean = len(values), values.mean()
+        m2 = np.sum((values - mean) ** 2)
+        if self.n == 0:
+            self.n, self.mean, self._m2 = n, mean, m2
+            return
+
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    @property
+    def var(self) -> float:
+        return self._m2 / (self.n - 1) if self.n > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.var))
+
+
+def running_ttest(a: RunningStats, b: RunningStats, alternative: str = 'less') -> float:
+    """Returns the p-value of Welch's t-test between two running statistics."""
+    if a.n < 2 or b.n < 2:
+        return np.nan
+
+    _, p_value = ttest_ind_from_stats(a.mean, a.std, a.n, b.mean, b.std, b.n, equal_var=False,
+                                      alternative=alternative)
+
+    return p_value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate SpO2 readings for the live SpO2 page.")
+    parser.add_argument('-s', '--subjects', type=int, nargs='+', default=[1, 2, 3, 4, 5],
+                        help='Numbers of the subjects.')
+    parser.add_argument('-i', '--interval', type=float, default=1.0, help='Seconds between two rounds of readings.')
+    parser.add_argument('-n', '--rounds', type=int, default=None, help='Number of rounds, runs forever by default.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the simulated readings.')
+    parser.add_argument('-o', '--output', help='File that the readings are appended to.')
+    parser.add_argument('--host', default='localhost', help='Host of the socket source.')
+    parser.add_argument('-p', '--port', type=int, help='Port of the socket source.')
+
+    args = parser.parse_args()
+    if (args.output is None) == (args.port is None):
+        parser.error('Expects either --output or --port.')
+
+    if args.output is not None:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        sink = open(args.output, 'a')
+        write = sink.write
+    else:
+        sink = socket.create_connection((args.host, args.port))
+        write = lambda line: sink.sendall(line.encode('utf8'))
+
+    n_readings = len(args.subjects) * 2
+    with sink:
+        for i, reading in enumerate(simulate(args.subjects, args.interval, args.seed)):
+            write(format_reading(reading))
+            if (i + 1) % n_readings == 0:
+                if hasattr(sink, 'flush'):
+                    sink.flush()
+                if args.rounds is not None and (i + 1) // n_readings >= args.rounds:
+                    break
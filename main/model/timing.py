@@ -0,0 +1,190 @@
+"""Module that contains the timing spans of the dashboard, e.g. of the config, file reads, statistics and pages.
+
+A span measures a block of code with a context manager or a decorated function:
+
+    with span('spo2 cohort'):
+        ...
+
+    @timed()
+    def get_count_index(period):
+        ...
+
+Spans are only recorded when the environment variable SIGMA_TIMING is set to a value other than 0, otherwise a span
+costs one check. Spans nest per thread, a span started in a worker thread has no parent. The recorded spans can be
+printed as a tree with the total and own time of every path of names, or written as a Chrome trace that opens in
+chrome://tracing or Perfetto. With SIGMA_TIMING_FILE every process writes its spans to the file at exit, a {pid} in
+the name is replaced by the process id. See benchmarks/startup.py for the report.
+"""
+
+__author__ = ['Peter Riesebos', 'Djakim Latumalea']
+__copyright__ = ['Djakim Latumalea', 'Azadeh Pirzadeh',
+                 'Peter Riesebos', 'Kai Lin', 'Hossain Shahadat']
+__license__ = 'Apache 2.0'
+__version__ = '0.1'
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ENABLED = os.environ.get('SIGMA_TIMING', '0') not in ('', '0')
+OUTPUT = os.environ.get('SIGMA_TIMING_FILE')
+
+# a finished span, the path contains the names of its parents and its own name, times are in nanoseconds
+Span = namedtuple('Span', ['path', 'start', 'duration', 'pid', 'thread', 'args'])
+
+_spans: List[Span] = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(enabled: bool = True) -> None:
+    """Starts or stops recording spans, e.g. for a report that is not started with SIGMA_TIMING."""
+    global ENABLED
+    ENABLED = enabled
+
+
+def record(name: str, start: int, end: int, **args) -> None:
+    """Records a span that was measured with time.perf_counter_ns, as a child of the current span of the thread."""
+    if not ENABLED:
+        return
+
+    item = Span(tuple(getattr(_local, 'stack', ())) + (name,), start, end - start, os.getpid(),
+                threading.get_ident(), args)
+    with _lock:
+        _spans.append(item)
+
+
+@contextmanager
+def _span(name: str, args: dict):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    start = time.perf_counter_ns()
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+        record(name, start, time.perf_counter_ns(), **args)
+
+
+def span(name: str, **args):
+    """Returns a context manager that records the time of its block, the arguments are kept for the Chrome trace."""
+    if not ENABLED:
+        return nullcontext()
+
+    return _span(name, args)
+
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Returns a decorator that records a span of every call, named after the module and function by default."""
+
+    def decorator(func: Callable) -> Callable:
+        label = name or '{}.{}'.format(func.__module__.split('.')[-1], func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+
+            with _span(label, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def get_spans() -> List[Span]:
+    with _lock:
+        return list(_spans)
+
+
+def clear() -> None:
+    with _lock:
+        _spans.clear()
+
+
+def summarize(spans: List[Span]) -> Dict[tuple, dict]:
+    """Returns the number of spans, total and own time in milliseconds of every path of names."""
+    nodes = {}
+    for item in spans:
+        node = nodes.setdefault(tuple(item.path), {'count': 0, 'total': 0.0, 'children': 0.0})
+        node['count'] += 1
+        node['total'] += item.duration / 1e6
+        if len(item.path) > 1:
+            parent = nodes.setdefault(tuple(item.path[:-1]), {'count': 0, 'total': 0.0, 'children': 0.0})
+            parent['children'] += item.duration / 1e6
+
+    for node in nodes.values():
+        node['self'] = max(node['total'] - node.pop('children'), 0.0)
+
+    return nodes
+
+
+def format_tree(spans: List[Span], before: Optional[Dict[tuple, dict]] = None, min_ms: float = 0.0) -> str:
+    """Returns the tree of the paths of the spans, the children of a path sorted by their total time.
+
+    Keyword arguments:
+        spans -- the spans.
+        before -- a summary of an earlier run, see summarize, to compare the total times with.
+        min_ms -- paths with a lower total time are left out.
+    """
+    nodes = summarize(spans)
+    children = {}
+    for path in nodes:
+        children.setdefault(path[:-1], []).append(path)
+
+    lines = ['{:>10} {:>10} {:>6} {:>10} {:>7}  {}'.format('total ms', 'self ms', 'count', 'before', 'ratio', 'span')]
+
+    def add(parent):
+        for path in sorted(children.get(parent, []), key=lambda path: -nodes[path]['total']):
+            node = nodes[path]
+            if node['total'] < min_ms:
+                continue
+            previous = (before or {}).get(path, {}).get('total')
+            lines.append('{:>10.1f} {:>10.1f} {:>6} {:>10} {:>7}  {}{}'.format(
+                node['total'], node['self'], node['count'],
+                '{:.1f}'.format(previous) if previous else '-',
+                '{:.2f}'.format(node['total'] / previous) if previous else '-',
+                '  ' * (len(path) - 1), path[-1]))
+            add(path)
+
+    add(())
+
+    return '\n'.join(lines)
+
+
+def to_chrome_trace(spans: List[Span]) -> dict:
+    """Returns the spans as complete events of the Chrome trace format, with times in microseconds."""
+    events = [{'name': item.path[-1], 'cat': item.path[0], 'ph': 'X', 'ts': item.start / 1e3,
+               'dur': item.duration / 1e3, 'pid': item.pid, 'tid': item.thread,
+               'args': {key: str(value) for key, value in item.args.items()}} for item in spans]
+
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def save(path, spans: Optional[List[Span]] = None) -> None:
+    """Writes the spans to a .json file, see load."""
+    spans = get_spans() if spans is None else spans
+    Path(path).write_text(json.dumps([item._asdict() for item in spans], default=str), encoding='utf8')
+
+
+def load(path) -> List[Span]:
+    return [Span(**dict(item, path=tuple(item['path']))) for item in json.loads(Path(path).read_text(encoding='utf8'))]
+
+
+def save_at_exit() -> None:
+    if ENABLED and OUTPUT:
+        save(OUTPUT.replace('{pid}', str(os.getpid())))
+
+
+atexit.register(save_at_exit)
@@ -68,6 +68,8 @@ class Parser:
         subset[float_cols] = subset[float_cols].apply(self.clean_floats)
         subset[spo2_cols] = subset[spo2_cols].applymap(lambda x: x * 100 if x < 1 else x)
         subset['date'] = subset['date'].apply(lambda x: x.replace(year=2021) if x.year < 2021 else x)
+        # one dtype, so the .csv and Parquet files hold the same dates
+        subset['date'] = pd.to_datetime(subset['date'])
 
         return subset
 
@@ -87,4 +89,6 @@ if __name__ == '__main__':
 
     # TODO 
     # specify output name
-    file.to_csv(Path('../../data/cleaned.csv'))
+    # the .csv file and its columnar copy, read by the model when present, hold the same columns
+    file.to_csv(Path('../../data/cleaned.csv'), index=False)
+    file.to_parquet(Path('../../data/cleaned.parquet'), index=False)
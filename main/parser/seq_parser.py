@@ -57,4 +57,7 @@ if __name__ == '__main__':
     files = parser.split_files(subjects=subjects)
 
     for i, file in enumerate(files):
-        file.to_csv(Path('../data/sequencing/parsed/{}.csv'.format(subjects[i])))
+        path = Path('../data/sequencing/parsed/{}.csv'.format(subjects[i]))
+        # the .csv file and its columnar copy, read by the model when present, hold the same columns
+        file.to_csv(path, index=False)
+        file.to_parquet(path.with_suffix('.parquet'), index=False)